@@ -0,0 +1,169 @@
+import ast
+from typing import List, Optional
+from lu_errors import ArgumentError, Error, ReturnError, SyntaxError
+from lu_token import IDENTIFIER
+
+# Keyword closing each kind of routine.
+ROUTINE_ENDS = {'FUNCTION': 'ENDFUNCTION', 'PROCEDURE': 'ENDPROCEDURE'}
+ROUTINE_END_KEYWORDS = frozenset(ROUTINE_ENDS.values())
+
+def returns_value(body: List[ast.stmt]) -> bool:
+    """Check if `body` has a RETURN with a value, outside any routine nested in it."""
+    stack = list(body)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.Return) and node.value is not None:
+            return True
+        if not isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            stack.extend(ast.iter_child_nodes(node))
+    return False
+
+class keyword_function:
+    def parse_routine(self) -> List[ast.stmt]:
+        """
+        Parse a FUNCTION or PROCEDURE, up to its ENDFUNCTION or ENDPROCEDURE, into a `def`.
+
+        The header is `FUNCTION Name(a : INTEGER, b) RETURNS INTEGER` or
+        `PROCEDURE Name(a, b)`; the parameter list may be left out when
+        there are none, and parameter and return types become annotations.
+        Names assigned in the body are local to it, as in Python.
+        """
+        keyword = self.advance()
+        start = self.current
+        try:
+            name, params, returns = self.routine_header(keyword)
+        except Error as e:
+            if not self.recover:
+                raise
+            # Stand in an empty header, so the body and closing keyword still pair up.
+            self.record_error(e)
+            self.synchronize(start)
+            name, params, returns = '_', [], None
+
+        end = ROUTINE_ENDS[keyword]
+        errors = len(self.diagnostics)
+        self.routines.append(keyword)
+        try:
+            body = []
+            while self.peek_value() != end:
+                if self.is_at_file_end():
+                    raise SyntaxError(f"Unexpected end of file: {keyword} {name} is never closed", self.peek(),
+                                      expected=end)
+                if self.peek_value() in ROUTINE_END_KEYWORDS:
+                    # In recovery mode the wrong closing keyword still closes the routine.
+                    self.report(SyntaxError(f"{self.peek_value()} inside {keyword} {name}", self.peek(),
+                                            expected=end))
+                    break
+                start = self.current
+                if self.is_at_block_end():
+                    self.report(SyntaxError(f"{self.peek_value()} inside {keyword} {name}", self.peek(),
+                                            expected=end))
+                    self.advance()
+                else:
+                    body.extend(self.parse_recovering(self.parse_line))
+                if self.current == start:
+                    # Nothing was parsed; without this the loop would never move past the token.
+                    self.report(SyntaxError(f"Unexpected token: {self.peek_value()}", self.peek()))
+                    self.advance()
+        finally:
+            self.routines.pop()
+        if keyword == 'FUNCTION' and len(self.diagnostics) == errors and not returns_value(body):
+            self.report(ReturnError(f"FUNCTION {name} never returns a value", self.peek()))
+        self.advance()  # consume the closing keyword
+
+        arguments = ast.arguments(posonlyargs=[], args=params, vararg=None, kwonlyargs=[], kw_defaults=[],
+                                  kwarg=None, defaults=[])
+        return [ast.FunctionDef(name=name, args=arguments, body=body or [ast.Pass()], decorator_list=[],
+                                returns=returns, type_params=[])]
+
+    def report(self, error: Error):
+        """Raise `error`, or in recovery mode record it and carry on."""
+        if not self.recover:
+            raise error
+        self.record_error(error)
+
+    def routine_header(self, keyword: str):
+        """Parse the name, parameters and return type after FUNCTION or PROCEDURE, and the line end after them."""
+        if self.peek_kind() != IDENTIFIER:
+            raise SyntaxError(f"Expected a name after {keyword}, but got {self.peek_value()!r}", self.peek(),
+                              expected="identifier")
+        name = self.advance()
+        params = self.parse_parameters(name) if self.peek_value() == '(' else []
+        returns = None
+        if keyword == 'FUNCTION' and self.peek_value() == 'RETURNS':
+            self.advance()
+            returns = self.type_annotation()
+        self.end_header(f"{keyword} {name}")
+        return name, params, returns
+
+    def parse_parameters(self, routine: str) -> List[ast.arg]:
+        """Parse `([BYVAL] name [: TYPE], ...)` after a routine's name."""
+        self.advance()  # consume '('
+        params = []
+        while self.peek_value() != ')':
+            if self.peek_value() in ('BYVAL', 'BYREF'):
+                if self.peek_value() == 'BYREF':
+                    raise ArgumentError(f"BYREF parameters are not supported, in {routine}", self.peek())
+                self.advance()
+            if self.peek_kind() != IDENTIFIER:
+                raise SyntaxError(f"Expected a parameter name in {routine}, but got {self.peek_value()!r}",
+                                  self.peek(), expected="identifier")
+            if any(param.arg == self.peek_value() for param in params):
+                raise ArgumentError(f"Parameter '{self.peek_value()}' is repeated in {routine}", self.peek())
+            param = ast.arg(arg=self.advance(), annotation=None)
+            if self.peek_value() == ':':
+                self.advance()
+                param.annotation = self.type_annotation()
+            params.append(param)
+            if self.peek_value() == ',':
+                self.advance()
+            elif self.peek_value() != ')':
+                raise SyntaxError(f"Expected ',' or ')' in the parameters of {routine}", self.peek(),
+                                  expected="',' or ')'")
+        self.advance()  # consume ')'
+        return params
+
+    def type_annotation(self) -> Optional[ast.expr]:
+        """
+        Parse a parameter or return type, returning its annotation.
+
+        Record and enumerated types are annotated by name; arrays and
+        types with no Python counterpart get no annotation.
+        """
+        if self.peek_kind() != IDENTIFIER:
+            raise SyntaxError(f"Expected a type, but got {self.peek_value()!r}", self.peek(), expected="type")
+        value = self.advance()
+        if value == 'ARRAY':
+            if self.peek_value() == '[':
+                for _ in range(self.matching_bracket() + 1):
+                    self.advance()
+            self.expect('OF')
+            self.type_annotation()
+            return None
+        datatype = self.convert_datatype(value) if value in self.datatypes else value
+        return None if datatype == 'UnknownType' else ast.Name(id=datatype, ctx=ast.Load())
+
+    def parse_return(self) -> List[ast.stmt]:
+        """Parse `RETURN [value]`, which must be inside a FUNCTION (with a value) or a PROCEDURE (without)."""
+        token = self.peek()
+        self.advance()  # consume 'RETURN'
+        if not self.routines:
+            raise ReturnError("RETURN outside a FUNCTION or PROCEDURE", token)
+        if self.is_at_statement_end():
+            if self.routines[-1] == 'FUNCTION':
+                raise ReturnError("RETURN in a FUNCTION needs a value", token)
+            return [ast.Return(value=None)]
+        if self.routines[-1] == 'PROCEDURE':
+            raise ReturnError("A PROCEDURE cannot RETURN a value", token)
+        return [ast.Return(value=self.parse_expression())]
+
+    def parse_call(self) -> List[ast.stmt]:
+        """Parse `CALL Name[(arguments)]`."""
+        self.advance()  # consume 'CALL'
+        if self.peek_kind() != IDENTIFIER:
+            raise SyntaxError(f"Expected a procedure name after CALL, but got {self.peek_value()!r}", self.peek(),
+                              expected="identifier")
+        call = self.parse_postfix()
+        if not isinstance(call, ast.Call):
+            call = ast.Call(func=call, args=[], keywords=[])
+        return [ast.Expr(value=call)]
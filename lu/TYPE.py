@@ -1,54 +1,89 @@
 import ast
+from typing import List
+from lu_errors import SyntaxError
+from lu_token import IDENTIFIER, KEYWORD
+
+# Defaults for record fields, by their Python annotation.
+FIELD_DEFAULTS = {'int': 0, 'float': 0.0, 'bool': False, 'str': ''}
+
+NO_ARGUMENTS = ast.arguments(posonlyargs=[], args=[], vararg=None, kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[])
 
 class keyword_type:
-    def parse_type(self) -> str:
+    def parse_type(self) -> List[ast.stmt]:
         """Parse a TYPE statement and return the corresponding Python code."""
         self.advance()  # Consume 'TYPE'
-        identifier = self.advance().value
+        identifier = self.advance()
 
         if self.is_at_line_end():
             self.advance()  # Consume newline
-            self.indent += 1
             return self.record(identifier)
         else:
             self.advance()  # Consume '='
             return self.enumerated(identifier)
 
     # Non-composite data type - Enumerated
-    def enumerated(self, identifier: str) -> str:
-        """Parse an enumerated type and return Python Enum class code."""
-        args = self.collect_arguments()
-        en = ''
-        
-        # Attempt to parse the arguments as a tuple
-        try:
-            result_tuple = ast.literal_eval(args)
-        except ValueError:
-            modified_args = args.replace("(", "(\"").replace(",", "\",\"").replace(")", "\")")
-            modified_args = modified_args.replace("[\"", "[").replace("\"]", "]")
-            result_tuple = ast.literal_eval(modified_args)
-
-        if "from enum import Enum" not in self.imports:
-            en += ('    ' * self.indent) + "from enum import Enum\n"
-        
-        en += ('    ' * self.indent) + f"class {identifier}(Enum):\n"
-        self.indent += 1
-        for i, v in enumerate(result_tuple):
-            en += ('    ' * self.indent) + f"{v} = {i}\n"
-        self.indent -= 1
-
-        return en
+    def enumerated(self, identifier: str) -> List[ast.stmt]:
+        """Parse an enumerated type's `(A, B, ...)` member list and return a Python Enum class."""
+        self.expect('(')
+        names = []
+        while self.peek_value() != ')':
+            if self.peek_kind() not in (IDENTIFIER, KEYWORD):
+                raise SyntaxError(f"Expected a member name in TYPE {identifier}", self.peek(), expected="identifier")
+            names.append(self.advance())
+            if self.peek_value() == ',':
+                self.advance()
+            elif self.peek_value() != ')':
+                raise SyntaxError(f"Expected ',' or ')' in TYPE {identifier}", self.peek(), expected="',' or ')'")
+        self.advance()  # Consume ')'
+        self.require_import("enum", "Enum")
+
+        members = [ast.Assign(targets=[ast.Name(id=name, ctx=ast.Store())], value=ast.Constant(value=i))
+                   for i, name in enumerate(names)]
+        return [ast.ClassDef(name=identifier, bases=[ast.Name(id="Enum", ctx=ast.Load())], keywords=[],
+                             body=members or [ast.Pass()], decorator_list=[], type_params=[])]
 
     # Composite data type - Record
-    def record(self, identifier: str) -> str:
-        """Placeholder for record type parsing, to be implemented."""
-        self.imports.append("from dataclasses import dataclass")
+    def record(self, identifier: str) -> List[ast.stmt]:
+        """
+        Parse a record type into a `@dataclass(slots=True)` class.
 
-        en = f'@dataclass\nclass {identifier}:\n'
+        Slots keep each instance to a fixed set of fields with no per-instance
+        `__dict__`. Every field gets a default (array fields through a
+        `default_factory`), so `identifier()` builds an empty record, which
+        ARRAY OF a record type relies on.
+        """
+        self.require_import("dataclasses", "dataclass")
 
-        while self.peek().value != 'ENDTYPE':
-            en += ('    '*self.indent) + self.parse_declare() + "\n"
-            self.advance()
+        fields = []
+        while self.peek_value() != 'ENDTYPE':
+            if self.is_at_file_end():
+                raise SyntaxError(f"Unexpected end of file: TYPE {identifier} is never closed", self.peek(), expected="ENDTYPE")
+            if self.is_at_line_end():
+                self.advance()  # blank or comment-only line
+                continue
+            fields.extend(self.parse_recovering(lambda: self.record_field(identifier)))
         self.advance()
-        self.indent -= 1
-        return en
+
+        for field in fields:
+            if not isinstance(field, ast.AnnAssign):
+                continue
+            if field.value is None:
+                field.value = ast.Constant(value=FIELD_DEFAULTS.get(field.annotation.id))
+            else:
+                self.require_import("dataclasses", "field")
+                field.value = ast.Call(func=ast.Name(id="field", ctx=ast.Load()), args=[], keywords=[
+                    ast.keyword(arg="default_factory", value=ast.Lambda(args=NO_ARGUMENTS, body=field.value))])
+
+        decorator = ast.Call(func=ast.Name(id="dataclass", ctx=ast.Load()), args=[],
+                             keywords=[ast.keyword(arg="slots", value=ast.Constant(value=True))])
+        return [ast.ClassDef(name=identifier, bases=[], keywords=[], body=fields or [ast.Pass()],
+                             decorator_list=[decorator], type_params=[])]
+
+    def record_field(self, identifier: str) -> List[ast.stmt]:
+        """Parse one `DECLARE name : type` line inside TYPE `identifier`."""
+        if self.peek_value() != 'DECLARE':
+            raise SyntaxError(f"Expected DECLARE inside TYPE {identifier}, but got {self.peek_value()!r}", self.peek(),
+                              expected="DECLARE")
+        fields = self.parse_declare()
+        self.end_statement()
+        return fields
@@ -1,34 +1,136 @@
-from typing import List, Tuple, Union
+from typing import List, Tuple
 import ast
-import re
 from lu_errors import SyntaxError
+from lu_token import IDENTIFIER
+from expr import constant_int
+
+MAX_ARRAY_DIMENSIONS = 2
+
+Bounds = Tuple[ast.expr, ast.expr]  # the lower and upper bound of one array dimension
+
+def array_extent(lower: ast.expr, upper: ast.expr) -> ast.expr:
+    """Build the number of elements from `lower` to `upper`, a constant when both bounds are."""
+    lower_value, upper_value = constant_int(lower), constant_int(upper)
+    if lower_value is not None and upper_value is not None:
+        return ast.Constant(value=upper_value - lower_value + 1)
+    if lower_value == 1:
+        return upper
+    if lower_value == 0:
+        return ast.BinOp(left=upper, op=ast.Add(), right=ast.Constant(value=1))
+    difference = ast.BinOp(left=upper, op=ast.Sub(), right=lower)
+    return ast.BinOp(left=difference, op=ast.Add(), right=ast.Constant(value=1))
 
 class elements:
-    def parse_declare(self) -> str:
-        """Parse a DECLARE statement and return the Python representation."""
+    def parse_declare(self) -> List[ast.stmt]:
+        """Parse `DECLARE name : type` or `DECLARE name : ARRAY[lower:upper[, lower:upper]] OF type`."""
         self.advance()  # Consume 'DECLARE'
-        identifier = self.advance().value
-        self.advance()  # Consume ':'
+        if self.peek_kind() != IDENTIFIER:
+            raise SyntaxError(f"Expected a name after DECLARE, but got {self.peek_value()!r}", self.peek(),
+                              expected="identifier")
+        identifier = self.advance()
+        self.expect(':')
+        if self.peek_kind() != IDENTIFIER:
+            raise SyntaxError(f"Expected a type for {identifier}, but got {self.peek_value()!r}", self.peek(),
+                              expected="type")
 
-        expr = ('  ' * self.indent) + f"{identifier} : "
         datatype = self.convert_datatype()
-        expr += datatype
         self.advance()  # Consume type
+        value = None
 
-        if datatype == 'list' and not self.is_at_line_end():
-            args = self.collect_arguments()
-            array = self.parse_array_declaration("ARRAY" + args)
-            dimensions = array["dimensions"]
-            data_type = self.convert_datatype(array["data_type"])
-
-            if len(dimensions) == 1:
-                lower1, upper1 = dimensions[0]
-                expr += f" = [{data_type}()] * ({upper1 - lower1 + 1})"
+        if datatype == 'list':
+            dimensions, element_type = self.array_type()
+            if element_type not in self.datatypes:
+                value = self.record_array(element_type, dimensions)
+                if self.array_backend != 'list':
+                    datatype = 'RecordArray'
+            elif self.array_backend != 'list':
+                datatype = 'LuArray'
+                value = self.lu_array(element_type, dimensions)
             else:
-                lower1, upper1 = dimensions[0]
-                lower2, upper2 = dimensions[1]
-                expr += f" = [[{data_type}()] * ({upper2 - lower2 + 1}) for _ in range({upper1 - lower1 + 1})]"
-        return expr
+                data_type = self.convert_datatype(element_type)
+                value = self.array_row(data_type, array_extent(*dimensions[0]))
+                if len(dimensions) > 1:
+                    value = ast.ListComp(
+                        elt=self.array_row(data_type, array_extent(*dimensions[1])),
+                        generators=[ast.comprehension(
+                            target=ast.Name(id='_', ctx=ast.Store()),
+                            iter=ast.Call(func=ast.Name(id='range', ctx=ast.Load()),
+                                          args=[array_extent(*dimensions[0])], keywords=[]),
+                            ifs=[], is_async=0)])
+
+        return [ast.AnnAssign(target=ast.Name(id=identifier, ctx=ast.Store()),
+                              annotation=ast.Name(id=datatype, ctx=ast.Load()),
+                              value=value, simple=1)]
+
+    def array_type(self) -> Tuple[List[Bounds], str]:
+        """Parse `[lower:upper[, lower:upper]] OF type` after ARRAY, returning the dimensions and element type."""
+        self.expect('[')
+        dimensions = [self.array_dimension()]
+        while self.peek_value() == ',':
+            if len(dimensions) == MAX_ARRAY_DIMENSIONS:
+                raise SyntaxError(f"Arrays have at most {MAX_ARRAY_DIMENSIONS} dimensions", self.peek())
+            self.advance()
+            dimensions.append(self.array_dimension())
+        self.expect(']')
+        self.expect('OF')
+        if self.peek_kind() != IDENTIFIER:
+            raise SyntaxError(f"Expected an element type after OF, but got {self.peek_value()!r}", self.peek(),
+                              expected="type")
+        return dimensions, self.advance()
+
+    def array_dimension(self) -> Bounds:
+        """
+        Parse one `lower:upper` pair of array bounds.
+
+        Bounds may be any expression, such as `ARRAY[1:n]`; they are
+        evaluated when the DECLARE runs.
+        """
+        lower = self.parse_expression()
+        self.expect(':')
+        return lower, self.parse_expression()
+
+    def lu_array(self, data_type: str, dimensions: List[Bounds]) -> ast.expr:
+        """Build `LuArray(data_type, bounds, backend)`, which keeps the declared bounds."""
+        self.require_import('lu_functions', 'LuArray')
+        return ast.Call(func=ast.Name(id='LuArray', ctx=ast.Load()),
+                        args=[ast.Constant(value=data_type), self.array_bounds(dimensions),
+                              ast.Constant(value=self.array_backend)],
+                        keywords=[])
+
+    def array_bounds(self, dimensions: List[Bounds]) -> ast.expr:
+        """Build the `[(lower, upper), ...]` bounds list of an array."""
+        return ast.List(elts=[ast.Tuple(elts=[lower, upper], ctx=ast.Load()) for lower, upper in dimensions],
+                        ctx=ast.Load())
+
+    def record_array(self, record: str, dimensions: List[Bounds]) -> ast.expr:
+        """
+        Build an ARRAY OF a record type.
+
+        The list backend builds one record per element, `[record() for _ in range(n)]`;
+        the other backends build `RecordArray(record, bounds, backend)`, which
+        stores each field as its own typed column.
+        """
+        if self.array_backend != 'list':
+            self.require_import('lu_functions', 'RecordArray')
+            return ast.Call(func=ast.Name(id='RecordArray', ctx=ast.Load()),
+                            args=[ast.Name(id=record, ctx=ast.Load()), self.array_bounds(dimensions),
+                                  ast.Constant(value=self.array_backend)],
+                            keywords=[])
+        value = ast.Call(func=ast.Name(id=record, ctx=ast.Load()), args=[], keywords=[])
+        for lower, upper in reversed(dimensions):
+            value = ast.ListComp(
+                elt=value,
+                generators=[ast.comprehension(
+                    target=ast.Name(id='_', ctx=ast.Store()),
+                    iter=ast.Call(func=ast.Name(id='range', ctx=ast.Load()),
+                                  args=[array_extent(lower, upper)], keywords=[]),
+                    ifs=[], is_async=0)])
+        return value
+
+    def array_row(self, data_type: str, size: ast.expr) -> ast.expr:
+        """Build `[data_type()] * size`."""
+        default = ast.Call(func=ast.Name(id=data_type, ctx=ast.Load()), args=[], keywords=[])
+        return ast.BinOp(left=ast.List(elts=[default], ctx=ast.Load()), op=ast.Mult(), right=size)
 
     def convert_datatype(self, value: str = None) -> str:
         """Convert a pseudocode datatype to Python datatype."""
@@ -48,29 +150,3 @@ class elements:
                 return 'object'
             case _:
                 return 'UnknownType'
-
-    def parse_array_declaration(self, declaration: str) -> Union[dict, str]:
-        """Parse an array declaration and return its structure."""
-        match = re.match(
-            r'ARRAY\s*\[(\d+):(\d+)(?:,(\d+):(\d+))?\]\s*OF\s*(\w+)', 
-            declaration
-        )
-
-        if not match:
-            return "Invalid array declaration format."
-
-        lower1, upper1 = int(match.group(1)), int(match.group(2))
-        lower2, upper2 = (int(match.group(3)), int(match.group(4))) if match.group(3) and match.group(4) else (None, None)
-        data_type = match.group(5)
-
-        if data_type not in self.datatypes:
-            raise SyntaxError(f"Invalid data type '{data_type}'.")
-
-        dimensions = [(lower1, upper1)]
-        if lower2 is not None and upper2 is not None:
-            dimensions.append((lower2, upper2))
-
-        return {
-            "dimensions": dimensions,
-            "data_type": data_type
-        }
@@ -1,134 +1,458 @@
 from typing import Tuple, Optional, List
-from lu_errors import SyntaxError
+import ast
+from lu_errors import Error, SyntaxError
+from lu_token import BOOLEAN, CHAR, INTEGER, IDENTIFIER, ATTRIBUTE, OPERATOR, REAL, STRING
+from lu_functions import BUILTINS, FILE_MODES
+from FUNCTION import ROUTINE_END_KEYWORDS
 
-class Expr:
-    def parse_conditions(self) -> str:
-        condition = self.advance().value.lower()
-        if condition in ('if','else','elif','else if'):
-            return self.parse_if_else(condition)
-
-    def parse_if_else(self,keyword):
-        indent_ = self.indent
-        if keyword in ('if','elif','else if'):
-            head=('    ' * self.indent) + keyword +' '
-            condition = []
-            while self.peek().value.lower() != "then":
-                if self.is_at_line_end():
-                    SyntaxError("expected 'THEN' at line end",expected="then")
-                condition.append(self.advance().value)
-            self.advance() # consume 'THEN'
-            head+= ''.join(condition) + ':\n'
-            self.advance() # next line
-        elif keyword == 'else':
-            head= ('    ' * self.indent) + keyword + ':\n'
-            self.advance()  # Move to the next line after ELSE
+# Binary operator precedence levels, loosest first.
+BINARY_OPERATORS = [
+    {'|': ast.BitOr},
+    {'^': ast.BitXor},
+    {'&': ast.BitAnd},
+    {'<<': ast.LShift, '>>': ast.RShift},
+    {'+': ast.Add, '-': ast.Sub},
+    {'*': ast.Mult, '/': ast.Div, '%': ast.Mod, 'MOD': ast.Mod, 'DIV': ast.FloorDiv},
+]
+OPERATOR_KINDS = (OPERATOR, IDENTIFIER)  # MOD and DIV are lexed as identifiers
+
+COMPARISON_OPERATORS = {
+    '=': ast.Eq, '==': ast.Eq, '<>': ast.NotEq, '!=': ast.NotEq,
+    '<': ast.Lt, '<=': ast.LtE, '>': ast.Gt, '>=': ast.GtE,
+}
+
+UNARY_OPERATORS = {'-': ast.USub, '+': ast.UAdd, '~': ast.Invert}
+
+ASSIGNMENT_OPERATORS = ('<-', '←', '=')
+
+# Runtime functions that are also statements, e.g. `OPENFILE "data.txt" FOR READ`.
+FILE_STATEMENTS = frozenset({'OPENFILE', 'READFILE', 'WRITEFILE', 'CLOSEFILE'})
+
+# Keyword closing each kind of block.
+BLOCK_ENDS = {'IF': 'ENDIF', 'WHILE': 'ENDWHILE', 'FOR': 'NEXT', 'REPEAT': 'UNTIL'}
+BLOCK_END_KEYWORDS = frozenset(BLOCK_ENDS.values())
+MAX_LOOP_NESTING = 20  # Python's limit on statically nested loops in one function
+
+def constant_int(node: ast.expr) -> Optional[int]:
+    """Return the value of an integer literal, possibly negated, or None."""
+    sign = 1
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        sign = -1 if isinstance(node.op, ast.USub) else 1
+        node = node.operand
+    if isinstance(node, ast.Constant) and type(node.value) is int:
+        return sign * node.value
+    return None
+
+def range_call(start: ast.expr, end: ast.expr, step: Optional[ast.expr]) -> ast.Call:
+    """
+    Build the `range(...)` for `FOR ... <start> TO <end> STEP <step>`, which includes `end`.
+
+    A step that is not a constant is evaluated once, through an assignment
+    expression, and its sign picks the end adjustment at run time.
+    """
+    step_value = 1 if step is None else constant_int(step)
+    if step_value is None:
+        if isinstance(step, ast.Name):
+            step_value = ast.Name(id=step.id, ctx=ast.Load())
         else:
-            raise SyntaxError(f"Expected 'IF' or 'ELSE', but got '{keyword}'")
-        
-        body = []
-        self.indent += 1
-
-        while not self.is_at_file_end():
-            if self.peek().value.lower() == 'endif':
-                self.advance() # consume endif
-                break
+            step = ast.NamedExpr(target=ast.Name(id='_lu_step', ctx=ast.Store()), value=step)
+            step_value = ast.Name(id='_lu_step', ctx=ast.Load())
+        delta = ast.IfExp(test=ast.Compare(left=step, ops=[ast.Gt()], comparators=[ast.Constant(value=0)]),
+                          body=ast.Constant(value=1), orelse=ast.Constant(value=-1))
+        args = [start, ast.BinOp(left=end, op=ast.Add(), right=delta), step_value]
+        return ast.Call(func=ast.Name(id='range', ctx=ast.Load()), args=args, keywords=[])
+
+    delta = 1 if step_value > 0 else -1
+    end_value = constant_int(end)
+    if end_value is not None:
+        stop = ast.Constant(value=end_value + delta)
+    else:
+        stop = ast.BinOp(left=end, op=ast.Add() if delta > 0 else ast.Sub(), right=ast.Constant(value=1))
+    args = [start, stop]
+    if step is not None and step_value != 1:
+        args.append(ast.Constant(value=step_value))
+    elif step is None and constant_int(start) == 0:
+        args = [stop]
+    return ast.Call(func=ast.Name(id='range', ctx=ast.Load()), args=args, keywords=[])
+
+
+class Expr:
+    def parse_conditions(self) -> List[ast.stmt]:
+        if self.peek_value() != 'IF':
+            raise SyntaxError(f"'{self.peek_value()}' without a matching IF", self.peek())
+        return self.parse_block()
+
+    def parse_block(self) -> List[ast.stmt]:
+        """
+        Parse an IF, WHILE, FOR or REPEAT block, with every block nested in it, up to its closing keyword.
 
-            expr = self.get_expr()
-            if expr is None:
-                raise SyntaxError("Unexpected token or empty expression in the block.")
-            elif expr == '':
-                continue
-            
-            if expr.startswith('    ' * self.indent):
-                body.append(expr + '\n')
+        Open blocks are kept on an explicit stack instead of recursing, so
+        nesting depth is limited only by memory. Each frame holds the
+        block's opening keyword, its node (for IF, the innermost `ast.If`
+        of its ELSE IF chain) and the statement list being filled; an ELSE
+        IF chain is closed by a single ENDIF.
+        """
+        root = self.open_block()
+        node = root[1]
+        stack = [root]
+        loops = int(root[0] != 'IF')
+        while stack:
+            frame = stack[-1]
+            if self.is_at_file_end():
+                raise SyntaxError(f"Unexpected end of file: {frame[0]} is never closed", self.peek(),
+                                  expected=BLOCK_ENDS[frame[0]])
+            value = self.peek_value()
+            if value in BLOCK_ENDS:
+                if value != 'IF' and loops == MAX_LOOP_NESTING:
+                    raise SyntaxError(f"Loops are nested more than {MAX_LOOP_NESTING} deep", self.peek())
+                opened = self.open_block()
+                frame[2].append(opened[1])
+                stack.append(opened)
+                loops += value != 'IF'
+            elif value.upper() == 'ELSE':
+                self.parse_else(frame)
+            elif value.upper() in BLOCK_END_KEYWORDS or value in ROUTINE_END_KEYWORDS:
+                if value.upper() != BLOCK_ENDS[frame[0]]:
+                    raise SyntaxError(f"{value} inside a {frame[0]} block", self.peek(), expected=BLOCK_ENDS[frame[0]])
+                self.close_block(frame)
+                loops -= stack.pop()[0] != 'IF'
             else:
-                body.append(('    ' * self.indent) + expr + '\n')
-            
-            if self.is_at_line_end():
-                self.advance()
+                frame[2].extend(self.parse_recovering(self.parse_line))
+        return [node]
 
-            if self.peek().value.lower() == 'else':
-                self.indent -= 1
-                self.advance()
-                body.append(self.parse_if_else('else'))
-                break
+    def is_at_block_end(self) -> bool:
+        """Check if the current token closes an IF, WHILE, FOR or REPEAT block."""
+        return self.peek_value().upper() in BLOCK_END_KEYWORDS
 
-        self.indent = indent_  # Reset indent to original level
-        return head + ''.join(body)
+    def open_block(self) -> list:
+        """Parse the header of the block at the current token, returning its stack frame."""
+        keyword = self.advance()
+        start = self.current
+        try:
+            node = BLOCK_HEADERS[keyword](self)
+        except Error as e:
+            if not self.recover:
+                raise
+            # Stand in an empty block, so the body and closing keyword still pair up.
+            self.record_error(e)
+            self.synchronize(start)
+            node = ast.While(test=ast.Constant(value=True), body=[], orelse=[])
+            if keyword == 'IF':
+                node = ast.If(test=node.test, body=[], orelse=[])
+        return [keyword, node, node.body]
 
+    def parse_else(self, frame: list):
+        """Parse an ELSE or ELSE IF line of the IF block in `frame`."""
+        node = frame[1]
+        if frame[0] != 'IF':
+            raise SyntaxError("ELSE without a matching IF", self.peek(), expected=BLOCK_ENDS[frame[0]])
+        if frame[2] is node.orelse:
+            raise SyntaxError("ELSE after the ELSE branch of an IF", self.peek(), expected="ENDIF")
+        self.advance()
+        node.body = node.body or [ast.Pass()]
+        if self.peek_value() == 'IF':  # ELSE IF continues the chain
+            self.advance()
+            chained = self.recovering_if_header()
+            node.orelse.append(chained)
+            frame[1:] = [chained, chained.body]
+        else:
+            self.end_statement()
+            frame[2] = node.orelse
 
-    def parse_print(self) -> str:
+    def close_block(self, frame: list):
+        """Parse the keyword closing the block in `frame` (and what follows it on the line) and finish its node."""
+        keyword, node, _ = frame
         self.advance()
-        print_args = self.collect_arguments()
-        return f"print({print_args})"
+        if keyword == 'FOR' and self.peek_kind() == IDENTIFIER:
+            name = self.peek_value()
+            if isinstance(node, ast.For) and name != node.target.id:
+                raise SyntaxError(f"NEXT {name} does not match FOR {node.target.id}", self.peek(),
+                                  expected=node.target.id)
+            self.advance()
+        elif keyword == 'REPEAT':
+            node.body.append(ast.If(test=self.parse_expression(), body=[ast.Break()], orelse=[]))
+        node.body = node.body or [ast.Pass()]
+        self.check_statement_end()
 
-    def parse_identifier(self) -> str:
-        identifier = self.advance().value
+    def recovering_if_header(self) -> ast.If:
+        """
+        Parse an IF header; in recovery mode a broken one is recorded and
+        replaced by `IF TRUE THEN`, so the block's body and ENDIF still pair up.
+        """
+        start = self.current
+        try:
+            return self.if_header()
+        except Error as e:
+            if not self.recover:
+                raise
+            self.record_error(e)
+            self.synchronize(start)
+            return ast.If(test=ast.Constant(value=True), body=[], orelse=[])
 
-        if self.peek().value == "(":
-            args = self.collect_arguments()
-            return f"{identifier}({args})"
-        elif self.peek().value in ("<-", "="):
+    def if_header(self) -> ast.If:
+        """Parse `<condition> THEN` and the line end after it, returning an `ast.If` with empty branches."""
+        test = self.parse_expression()
+        if self.peek_value().lower() != "then":
+            raise SyntaxError("expected 'THEN' at line end", self.peek(), expected="then")
+        self.advance()  # consume 'THEN'
+        self.end_header('THEN')
+        return ast.If(test=test, body=[], orelse=[])
+
+    def while_header(self) -> ast.While:
+        """Parse `<condition> [DO]` after WHILE, returning an `ast.While` with an empty body."""
+        test = self.parse_expression()
+        if self.peek_value() == 'DO':
             self.advance()
-            value_expr = []
-            while not self.is_at_line_end():
-                value_expr.append(self.advance().value)
-            value_expr =  ''.join(value_expr)
+        self.end_header('WHILE')
+        return ast.While(test=test, body=[], orelse=[])
 
-            return f"{identifier} = {value_expr}"
-        elif self.peek().type == 'ATTRIBUTE': 
-            return identifier + self.parse_attribute()
-        else:
-            return identifier
+    def for_header(self) -> ast.For:
+        """
+        Parse `<name> <- <start> TO <end> [STEP <step>]` after FOR, returning an `ast.For` over a `range`.
 
-    def parse_attribute(self) -> str:
-        attribute_chain = self.advance().value
+        The end is inclusive. When the step is a constant, so is the
+        direction of the loop, and a constant end is adjusted at compile time.
+        """
+        if self.peek_kind() != IDENTIFIER:
+            raise SyntaxError(f"Expected a loop variable after FOR, but got {self.peek_value()!r}", self.peek())
+        target = ast.Name(id=self.advance(), ctx=ast.Store())
+        if self.peek_value() not in ASSIGNMENT_OPERATORS:
+            raise SyntaxError(f"Expected '<-' after FOR {target.id}", self.peek(), expected='<-')
+        self.advance()
+        start = self.parse_expression()
+        self.expect('TO')
+        end = self.parse_expression()
+        step = None
+        if self.peek_value() == 'STEP':
+            token = self.peek()
+            self.advance()
+            step = self.parse_expression()
+            if constant_int(step) == 0:
+                raise SyntaxError("FOR loop STEP must not be zero", token)
+        self.end_header('FOR')
+        return ast.For(target=target, iter=range_call(start, end, step), body=[], orelse=[])
 
-        while self.peek().type == 'ATTRIBUTE':
-            attribute_chain += self.advance().value
+    def repeat_header(self) -> ast.While:
+        """Start a REPEAT block, which runs until the condition after its UNTIL holds."""
+        self.end_header('REPEAT')
+        return ast.While(test=ast.Constant(value=True), body=[], orelse=[])
 
-        if self.peek().value == "(":
-            args = self.collect_arguments()
-            return f"{attribute_chain}({args})"
-        else:
-            return attribute_chain
+    def end_header(self, keyword: str):
+        """Consume the line end after a block header."""
+        if not self.is_at_line_end():
+            raise SyntaxError(f"Unexpected token after {keyword}: {self.peek_value()!r}", self.peek())
+        self.advance()
 
-    def collect_arguments(self) -> str:
-        args = []
-        if self.peek_relative(-1).value == '(':
-            paren_count = 1
-            self.advance()  # Skip the opening parenthesis
+    def parse_print(self) -> List[ast.stmt]:
+        self.advance()
+        if self.is_at_line_end() or self.is_at_file_end():
+            args = []
+        elif self.peek_value() == '(' and self.is_at_statement_end(self.matching_bracket() + 1):
+            self.advance()  # consume '('
+            args = self.parse_expression_list(')')
+            self.advance()  # consume ')'
         else:
-            while not (self.is_at_line_end() or self.is_at_file_end()):
-                paren_count = 0
-                args.append(self.advance().value)
-            else:
-                args.append("\n")
-                
+            args = self.parse_expression_list()
+        call = ast.Call(func=ast.Name(id='print', ctx=ast.Load()), args=args, keywords=[])
+        return [ast.Expr(value=call)]
 
-        while paren_count > 0:
-            if self.is_at_file_end():
-                raise SyntaxError("Unexpected end of file: Function call does not have a closing parenthesis")
-            
-            if self.is_at_line_end():
-                args.append('\n')
-                self.advance()
-                continue
+    def parse_input(self) -> List[ast.stmt]:
+        """Parse `INPUT <target>`, which reads one line of standard input into the target."""
+        self.advance()  # consume 'INPUT'
+        target = self.as_store(self.parse_postfix())
+        call = ast.Call(func=ast.Name(id='input', ctx=ast.Load()), args=[], keywords=[])
+        return [ast.Assign(targets=[target], value=call)]
 
-            current_token = self.peek()
-            
-            if current_token.value == '(':
-                paren_count += 1
-            elif current_token.value == ')':
-                paren_count -= 1
-                if paren_count == 0:
-                    break
+    def parse_identifier(self) -> List[ast.stmt]:
+        if self.peek_value() in FILE_STATEMENTS and not (
+                self.peek_relative(1).value == '(' and self.is_at_statement_end(self.matching_bracket() + 1)):
+            return self.parse_file_statement()
+        target = self.parse_postfix()
 
-            args.append(current_token.value)
+        if self.peek_value() in ASSIGNMENT_OPERATORS:
             self.advance()
+            value = self.parse_expression()
+            return [ast.Assign(targets=[self.as_store(target)], value=value)]
+        return [ast.Expr(value=target)]
+
+    def parse_file_statement(self) -> List[ast.stmt]:
+        """
+        Parse `OPENFILE name FOR mode`, `READFILE name, target`,
+        `WRITEFILE name, value` or `CLOSEFILE name` into a call to the
+        runtime function of the same name.
+        """
+        keyword = self.advance()
+        self.require_import('lu_functions', keyword)
+        args = [self.parse_expression()]
+        if keyword == 'OPENFILE':
+            self.expect('FOR')
+            mode = self.peek()
+            if mode.value not in FILE_MODES:
+                raise SyntaxError(f"Unknown file mode '{mode.value}'", mode, expected='READ, WRITE or APPEND')
+            self.advance()
+            args.append(ast.Constant(value=mode.value))
+        elif keyword in ('READFILE', 'WRITEFILE'):
+            self.expect(',')
+            if keyword == 'READFILE':
+                target = self.as_store(self.parse_postfix())
+                call = ast.Call(func=ast.Name(id=keyword, ctx=ast.Load()), args=args, keywords=[])
+                return [ast.Assign(targets=[target], value=call)]
+            args.append(self.parse_expression())
+        if not self.is_at_statement_end():
+            raise SyntaxError(f"Unexpected '{self.peek_value()}' after {keyword}", self.peek(), expected='end of line')
+        return [ast.Expr(value=ast.Call(func=ast.Name(id=keyword, ctx=ast.Load()), args=args, keywords=[]))]
+
+    def as_store(self, node: ast.expr) -> ast.expr:
+        """Mark an expression as an assignment target."""
+        if not isinstance(node, (ast.Name, ast.Attribute, ast.Subscript)):
+            raise SyntaxError("Cannot assign to expression", self.peek())
+        node.ctx = ast.Store()
+        return node
+
+    def matching_bracket(self) -> int:
+        """Return the offset of the bracket closing the one at the current token."""
+        depth = 0
+        n = 0
+        while not self.is_at_file_end(n):
+            value = self.peek_relative(n).value
+            if value in ('(', '['):
+                depth += 1
+            elif value in (')', ']'):
+                depth -= 1
+                if depth == 0:
+                    return n
+            n += 1
+        raise SyntaxError("Unexpected end of file: bracket is never closed", self.peek())
+
+    # Expressions
+
+    def parse_expression(self) -> ast.expr:
+        """Parse a full expression, starting from the loosest binding operator."""
+        return self.parse_or()
+
+    def parse_expression_list(self, closing: Optional[str] = None) -> List[ast.expr]:
+        """Parse comma separated expressions up to `closing` or the line end."""
+        items = []
+        while not (self.is_at_line_end() or self.is_at_file_end() or self.peek_value() == closing):
+            items.append(self.parse_expression())
+            if self.peek_value() != ',':
+                break
+            self.advance()  # consume ','
+        return items
+
+    def parse_or(self) -> ast.expr:
+        values = [self.parse_and()]
+        while self.peek_value() == 'OR':
+            self.advance()
+            values.append(self.parse_and())
+        return values[0] if len(values) == 1 else ast.BoolOp(op=ast.Or(), values=values)
+
+    def parse_and(self) -> ast.expr:
+        values = [self.parse_not()]
+        while self.peek_value() == 'AND':
+            self.advance()
+            values.append(self.parse_not())
+        return values[0] if len(values) == 1 else ast.BoolOp(op=ast.And(), values=values)
+
+    def parse_not(self) -> ast.expr:
+        if self.peek_value() == 'NOT':
+            self.advance()
+            return ast.UnaryOp(op=ast.Not(), operand=self.parse_not())
+        return self.parse_comparison()
+
+    def parse_comparison(self) -> ast.expr:
+        left = self.parse_binary(0)
+        ops, comparators = [], []
+        while self.peek_kind() == OPERATOR and self.peek_value() in COMPARISON_OPERATORS:
+            ops.append(COMPARISON_OPERATORS[self.advance()]())
+            comparators.append(self.parse_binary(0))
+        if not ops:
+            return left
+        return ast.Compare(left=left, ops=ops, comparators=comparators)
+
+    def parse_binary(self, level: int) -> ast.expr:
+        if level == len(BINARY_OPERATORS):
+            return self.parse_unary()
+        operators = BINARY_OPERATORS[level]
+        left = self.parse_binary(level + 1)
+        while self.peek_kind() in OPERATOR_KINDS and self.peek_value() in operators:
+            op = operators[self.advance()]
+            left = ast.BinOp(left=left, op=op(), right=self.parse_binary(level + 1))
+        return left
+
+    def parse_unary(self) -> ast.expr:
+        if self.peek_kind() == OPERATOR and self.peek_value() in UNARY_OPERATORS:
+            op = UNARY_OPERATORS[self.advance()]
+            return ast.UnaryOp(op=op(), operand=self.parse_unary())
+        return self.parse_power()
+
+    def parse_power(self) -> ast.expr:
+        base = self.parse_postfix()
+        if self.peek_value() == '**':
+            self.advance()
+            return ast.BinOp(left=base, op=ast.Pow(), right=self.parse_unary())
+        return base
+
+    def parse_postfix(self) -> ast.expr:
+        node = self.parse_atom()
+        while True:
+            value = self.peek_value()
+            if value == '(':
+                self.advance()
+                args = self.parse_expression_list(')')
+                self.expect(')')
+                node = ast.Call(func=node, args=args, keywords=[])
+            elif value == '[':
+                self.advance()
+                indices = self.parse_expression_list(']')
+                self.expect(']')
+                index = indices[0] if len(indices) == 1 else ast.Tuple(elts=indices, ctx=ast.Load())
+                node = ast.Subscript(value=node, slice=index, ctx=ast.Load())
+            elif self.peek_kind() == ATTRIBUTE:
+                self.advance()
+                node = ast.Attribute(value=node, attr=value[1:], ctx=ast.Load())
+            else:
+                return node
+
+    def parse_atom(self) -> ast.expr:
+        kind, value = self.peek_kind(), self.peek_value()
+        if kind == INTEGER:
+            self.advance()
+            return ast.Constant(value=int(value))
+        elif kind == REAL:
+            self.advance()
+            return ast.Constant(value=float(value))
+        elif kind in (STRING, CHAR):
+            self.advance()
+            return ast.Constant(value=value[1:-1])
+        elif kind == BOOLEAN:
+            self.advance()
+            return ast.Constant(value=value == 'TRUE')
+        elif kind == IDENTIFIER:
+            self.advance()
+            if value in BUILTINS and self.peek_value() == '(':
+                self.require_import('lu_functions', value)
+            return ast.Name(id=value, ctx=ast.Load())
+        elif value == '(':
+            self.advance()
+            items = self.parse_expression_list(')')
+            self.expect(')')
+            if len(items) == 1:
+                return items[0]
+            return ast.Tuple(elts=items, ctx=ast.Load())
+        elif value == '[':
+            self.advance()
+            items = self.parse_expression_list(']')
+            self.expect(']')
+            return ast.List(elts=items, ctx=ast.Load())
+        raise SyntaxError(f"Unexpected token in expression: {value!r}", self.peek())
+
+    def expect(self, value: str) -> str:
+        """Consume the current token, which must be `value`."""
+        if self.peek_value() != value:
+            raise SyntaxError(f"Expected '{value}', but got '{self.peek().value}'", self.peek(), expected=value)
+        return self.advance()
 
-        if paren_count > 0:
-            raise SyntaxError("Function call does not have a closing parenthesis")
 
-        self.advance()  # Skip the closing parenthesis
-        return ''.join(args).strip()
+# Header parser of each kind of block, called after its keyword.
+BLOCK_HEADERS = {'IF': Expr.if_header, 'WHILE': Expr.while_header, 'FOR': Expr.for_header, 'REPEAT': Expr.repeat_header}
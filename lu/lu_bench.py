@@ -0,0 +1,299 @@
+"""
+Compiler benchmarks over synthetic pseudocode workloads.
+
+Run `python lu/lu_bench.py --save-baseline bench.json` once, then
+`python lu/lu_bench.py --baseline bench.json` after a change; the run
+fails when any metric regresses by more than the tolerance, or when
+importing `lu_compiler` takes longer than the startup budget.
+`--nesting` also checks that parse time stays linear in IF nesting depth.
+"""
+import argparse
+import ast
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+from lu_lexer import tokenize_text
+from lu_parser import parse
+from lu_compiler import unparse
+
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_REPEAT = 3
+IMPORT_BUDGET = 0.075  # seconds to import lu_compiler in a fresh interpreter
+# The test suite times the import against a stdlib module lu_compiler needs
+# anyway, so a slow or busy machine slows both. lu_compiler takes about 1.1x
+# as long as logging; loading the parser and optimizer eagerly takes 2.5x.
+IMPORT_BASELINE = 'logging'
+IMPORT_RATIO = 1.6
+NESTING_DEPTHS = (250, 500, 1000, 2000, 4000)
+NESTING_GROWTH = 1.5  # allowed growth of the parse time per level, shallowest to deepest
+
+# Workload generators
+
+def nested_if(depth: int = 50) -> str:
+    """IF/ELSE blocks nested `depth` levels deep."""
+    lines = []
+    for level in range(depth):
+        lines.append(f"IF x{level} > {level} THEN")
+        lines.append(f"    OUTPUT \"level {level}\"")
+    for level in reversed(range(depth)):
+        lines.append("ELSE")
+        lines.append(f"    y{level} <- {level} * 2")
+        lines.append("ENDIF")
+    return '\n'.join(lines) + '\n'
+
+def else_if_chain(length: int = 1000) -> str:
+    """One IF with `length` ELSE IF branches, closed by a single ENDIF."""
+    lines = ["IF x = 0 THEN", "    OUTPUT 0"]
+    for branch in range(1, length):
+        lines.append(f"ELSE IF x = {branch} THEN")
+        lines.append(f"    OUTPUT {branch}")
+    lines.append("ELSE")
+    lines.append("    OUTPUT -1")
+    lines.append("ENDIF")
+    return '\n'.join(lines) + '\n'
+
+def loops(count: int = 500) -> str:
+    """FOR, WHILE and REPEAT loops nested three deep, with IF blocks in their bodies."""
+    lines = []
+    for i in range(count):
+        lines.append(f"FOR i{i} <- 1 TO {i % 10 + 1} STEP {i % 3 + 1}")
+        lines.append(f"    WHILE w{i} < i{i}")
+        lines.append("        REPEAT")
+        lines.append(f"            IF r{i} > {i % 5} THEN")
+        lines.append(f"                r{i} <- r{i} - 1")
+        lines.append("            ENDIF")
+        lines.append(f"        UNTIL r{i} <= 0")
+        lines.append(f"        w{i} <- w{i} + 1")
+        lines.append("    ENDWHILE")
+        lines.append(f"NEXT i{i}")
+    return '\n'.join(lines) + '\n'
+
+def functions(count: int = 500) -> str:
+    """Recursive FUNCTIONs and PROCEDUREs with typed parameters, and the calls to them."""
+    lines = []
+    for i in range(count):
+        lines.append(f"FUNCTION Paths{i}(r : INTEGER, c : INTEGER) RETURNS INTEGER")
+        lines.append("    IF r <= 0 OR c <= 0 THEN")
+        lines.append("        RETURN 1")
+        lines.append("    ENDIF")
+        lines.append(f"    RETURN Paths{i}(r - 1, c) + Paths{i}(r, c - {i % 3 + 1})")
+        lines.append("ENDFUNCTION")
+        lines.append(f"PROCEDURE Show{i}(label : STRING, n)")
+        lines.append(f"    OUTPUT label, Paths{i}(n, {i % 7})")
+        lines.append("ENDPROCEDURE")
+        lines.append(f'CALL Show{i}("paths", {i % 10})')
+    return '\n'.join(lines) + '\n'
+
+def declare_arrays(count: int = 2000) -> str:
+    """Many one and two dimensional DECLARE ARRAY statements."""
+    types = ["INTEGER", "REAL", "BOOLEAN", "STRING"]
+    lines = []
+    for i in range(count):
+        datatype = types[i % len(types)]
+        if i % 3:
+            lines.append(f"DECLARE a{i} : ARRAY[1:{i % 50 + 1}] OF {datatype}")
+        else:
+            lines.append(f"DECLARE g{i} : ARRAY[1:{i % 20 + 1},1:{i % 7 + 1}] OF {datatype}")
+    return '\n'.join(lines) + '\n'
+
+def output_heavy(count: int = 5000) -> str:
+    """A long script of assignments and OUTPUT statements."""
+    lines = []
+    for i in range(count):
+        lines.append(f"v{i} <- (v{i - 1} + {i}) * 3 - {i % 7}" if i else "v0 <- 1")
+        lines.append(f"OUTPUT \"value\", v{i}, {i} / 2")
+    return '\n'.join(lines) + '\n'
+
+def type_definitions(count: int = 500, members: int = 12) -> str:
+    """Large enumerated TYPEs and records."""
+    lines = []
+    for i in range(count):
+        names = ', '.join(f"M{i}_{m}" for m in range(members))
+        lines.append(f"TYPE Enum{i} = ({names})")
+        lines.append(f"TYPE Record{i}")
+        for m in range(members):
+            lines.append(f"    DECLARE f{m} : {'INTEGER' if m % 2 else 'STRING'}")
+        lines.append("ENDTYPE")
+    return '\n'.join(lines) + '\n'
+
+WORKLOADS: Dict[str, Callable[[], str]] = {
+    'nested_if': nested_if,
+    'else_if_chain': else_if_chain,
+    'loops': loops,
+    'functions': functions,
+    'declare_arrays': declare_arrays,
+    'output_heavy': output_heavy,
+    'type_definitions': type_definitions,
+}
+
+# Lower is better for these metrics; higher is better for the rates.
+HIGHER_IS_BETTER = ('tokens_per_sec', 'statements_per_sec')
+
+def timed(phase: Callable[[], object]) -> Tuple[object, float]:
+    """Run `phase`, returning its result and wall time."""
+    gc.collect()
+    start = time.perf_counter()
+    result = phase()
+    return result, time.perf_counter() - start
+
+def traced(phase: Callable[[], object]) -> Tuple[object, int]:
+    """Run `phase`, returning its result and peak traced allocation."""
+    gc.collect()
+    tracemalloc.start()
+    result = phase()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak
+
+def count_statements(module: ast.Module) -> int:
+    return sum(isinstance(node, ast.stmt) for node in ast.walk(module))
+
+def run_workload(source: str, repeat: int = DEFAULT_REPEAT) -> Dict[str, float]:
+    """
+    Benchmark each compiler phase on `source`.
+
+    Timings keep the best of `repeat` runs; peak memory is measured in a
+    separate pass so tracemalloc does not skew the timings.
+    """
+    best: Dict[str, float] = {}
+    for _ in range(repeat):
+        tokens, lex_time = timed(lambda: tokenize_text(source))
+        module, parse_time = timed(lambda: parse(tokens, workers=1))
+        _, unparse_time = timed(lambda: unparse(module))
+        _, compile_time = timed(lambda: compile(module, '<bench>', 'exec'))
+        metrics = {
+            'tokens_per_sec': len(tokens) / lex_time,
+            'statements_per_sec': count_statements(module) / parse_time,
+            'lex_seconds': lex_time,
+            'parse_seconds': parse_time,
+            'unparse_seconds': unparse_time,
+            'compile_seconds': compile_time,
+            'end_to_end_seconds': lex_time + parse_time + unparse_time + compile_time,
+        }
+        for name, value in metrics.items():
+            if name not in best:
+                best[name] = value
+            elif name in HIGHER_IS_BETTER:
+                best[name] = max(best[name], value)
+            else:
+                best[name] = min(best[name], value)
+
+    tokens, best['lex_peak_bytes'] = traced(lambda: tokenize_text(source))
+    module, best['parse_peak_bytes'] = traced(lambda: parse(tokens, workers=1))
+    _, best['unparse_peak_bytes'] = traced(lambda: unparse(module))
+    _, best['compile_peak_bytes'] = traced(lambda: compile(module, '<bench>', 'exec'))
+    return best
+
+def import_time(module: str = 'lu_compiler', repeat: int = DEFAULT_REPEAT) -> float:
+    """Return the best cumulative import time of `module` in a fresh interpreter, from `-X importtime`."""
+    best: Optional[float] = None
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        for line in result.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            fields = line.split('|')
+            if len(fields) == 3 and fields[2].strip() == module:
+                seconds = int(fields[1]) / 1e6
+                best = seconds if best is None else min(best, seconds)
+    if best is None:
+        raise RuntimeError(f"no import time reported for {module}")
+    return best
+
+def nesting_scaling(depths=NESTING_DEPTHS, repeat: int = DEFAULT_REPEAT) -> Dict[str, float]:
+    """Return the best parse time per nesting level of `nested_if` at each of `depths`."""
+    per_level = {}
+    for depth in depths:
+        tokens = tokenize_text(nested_if(depth))
+        best = min(timed(lambda: parse(tokens, workers=1))[1] for _ in range(repeat))
+        per_level[str(depth)] = best / depth
+    return per_level
+
+def run(workloads: List[str], repeat: int = DEFAULT_REPEAT) -> Dict[str, Dict[str, float]]:
+    return {name: run_workload(WORKLOADS[name](), repeat) for name in workloads}
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Return a description of every metric that regressed by more than `tolerance`."""
+    regressions = []
+    for workload, metrics in results.items():
+        for name, value in metrics.items():
+            reference = baseline.get(workload, {}).get(name)
+            if not reference:
+                continue
+            if name in HIGHER_IS_BETTER:
+                change = (reference - value) / reference
+            else:
+                change = (value - reference) / reference
+            if change > tolerance:
+                regressions.append(f"{workload}.{name}: {value:.6g} vs baseline {reference:.6g} ({change:+.0%} worse)")
+    return regressions
+
+def print_table(results: Dict[str, Dict[str, float]]):
+    names = list(next(iter(results.values())).keys())
+    width = max(len(name) for name in names)
+    print(' ' * width + ''.join(f"{workload:>20}" for workload in results))
+    for name in names:
+        print(f"{name:<{width}}" + ''.join(f"{metrics[name]:>20.6g}" for metrics in results.values()))
+
+def main():
+    parser = argparse.ArgumentParser(description='Lu compiler benchmarks')
+    parser.add_argument('workloads', nargs='*', help=f"Workloads to run: {', '.join(WORKLOADS)} (default: all)")
+    parser.add_argument('-n', '--repeat', type=int, default=DEFAULT_REPEAT, help='Runs per workload; the best is kept')
+    parser.add_argument('--baseline', type=str, help='Baseline JSON to compare against')
+    parser.add_argument('--save-baseline', type=str, help='Write the results as a new baseline JSON')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Allowed relative regression before failing (default: %(default)s)')
+    parser.add_argument('--nesting', action='store_true',
+                        help=f'Also check that parse time grows linearly with IF nesting depth, up to {NESTING_DEPTHS[-1]} levels')
+    parser.add_argument('--import-budget', type=float, default=IMPORT_BUDGET * 1000,
+                        help='Fail when importing lu_compiler takes longer than this many ms (default: %(default)s)')
+    args = parser.parse_args()
+    for name in args.workloads:
+        if name not in WORKLOADS:
+            parser.error(f"unknown workload '{name}'")
+
+    results = run(args.workloads or list(WORKLOADS), args.repeat)
+    print_table(results)
+    startup = import_time(repeat=args.repeat)
+    print(f"import lu_compiler: {startup * 1000:.1f} ms (budget {args.import_budget:g} ms)")
+    results['startup'] = {'import_seconds': startup}
+    growth = None
+    if args.nesting:
+        results['nesting'] = nesting_scaling(repeat=args.repeat)
+        for depth, seconds in results['nesting'].items():
+            print(f"nesting depth {depth:>6}: {seconds * 1e6:.2f} us/level")
+        per_level = list(results['nesting'].values())
+        growth = per_level[-1] / per_level[0]
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as outfile:
+            json.dump(results, outfile, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as infile:
+            baseline = json.load(infile)
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+    if growth is not None and growth > NESTING_GROWTH:
+        print(f"REGRESSION parse time per nesting level grew {growth:.2f}x from depth {NESTING_DEPTHS[0]} "
+              f"to {NESTING_DEPTHS[-1]} (allowed {NESTING_GROWTH}x)", file=sys.stderr)
+        sys.exit(1)
+
+    if startup * 1000 > args.import_budget:
+        print(f"REGRESSION import lu_compiler took {startup * 1000:.1f} ms, over the {args.import_budget:g} ms budget",
+              file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional, Tuple
+from lu_cache import CompileCache, compiler_fingerprint
+from lu_errors import Error, error_list
+from lu_logger import info, error
+from lu_compiler import compile_file
+
+class BuildResult(NamedTuple):
+    input_file: str
+    output_file: str
+    status: str  # 'built', 'cached', 'skipped' or 'failed'
+    message: str
+    elapsed: float
+    diagnostics: tuple = ()  # `Error.to_dict()` of each error, for failed files
+
+def expand_inputs(patterns: List[str]) -> List[Tuple[str, str]]:
+    """
+    Expand files, directories and glob patterns into (input_file, root) pairs.
+
+    Directories are searched recursively for .lu files. `root` is the
+    directory the input's output path is made relative to when building
+    into a separate output directory.
+    """
+    found = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            root = pattern
+            matches = glob.glob(os.path.join(pattern, '**', '*.lu'), recursive=True)
+        elif glob.has_magic(pattern):
+            root = glob_root(pattern)
+            matches = glob.glob(pattern, recursive=True)
+        else:
+            root = None
+            matches = [pattern]
+        for match in sorted(matches):
+            found.append((match, root if root is not None else os.path.dirname(match)))
+
+    seen = set()
+    unique = []
+    for input_file, root in found:
+        key = os.path.abspath(input_file)
+        if key not in seen:
+            seen.add(key)
+            unique.append((input_file, root))
+    return unique
+
+def glob_root(pattern: str) -> str:
+    """Return the leading directories of `pattern` that contain no wildcards."""
+    parts = []
+    for part in pattern.split(os.sep)[:-1]:
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return os.sep.join(parts) or '.'
+
+def output_path(input_file: str, root: str, output_dir: Optional[str], suffix: str = '.py') -> str:
+    base = os.path.splitext(input_file)[0] + suffix
+    if output_dir is None:
+        return base
+    return os.path.join(output_dir, os.path.relpath(base, root))
+
+def artifacts(output_file: str, emit: str) -> List[str]:
+    """Return the files `emit` writes for `output_file`."""
+    pyc_file = os.path.splitext(output_file)[0] + '.pyc'
+    return {'py': [output_file], 'pyc': [pyc_file], 'both': [output_file, pyc_file]}.get(emit, [])
+
+def stamp_path(output_file: str) -> str:
+    """Return the file recording how `output_file` was last built."""
+    return os.path.splitext(output_file)[0] + '.lubuild'
+
+def build_stamp(emit: str, *options) -> str:
+    """Return the stamp of a build by this compiler with `emit` and `options`."""
+    return hashlib.sha256(f"{compiler_fingerprint()}{emit!r}{options!r}".encode()).hexdigest()
+
+def is_up_to_date(input_file: str, output_file: str, cache: Optional[CompileCache], emit: str, *options) -> bool:
+    """
+    Check if the outputs `emit` writes for `input_file` can be reused.
+
+    The last build must have used this compiler and `options`, as recorded
+    in its stamp, and every output must be newer than `input_file` or, for
+    Python source, match its cached compilation.
+    """
+    try:
+        with open(stamp_path(output_file), 'r', encoding='utf-8') as infile:
+            if infile.read() != build_stamp(emit, *options):
+                return False
+        input_mtime = os.path.getmtime(input_file)
+    except OSError:
+        return False
+    key = None
+    for filename in artifacts(output_file, emit):
+        try:
+            if os.path.getmtime(filename) >= input_mtime:
+                continue
+        except OSError:
+            return False
+        if cache is None or not filename.endswith('.py'):
+            return False
+        key = key or cache.key_for_file(input_file, *options)
+        if not cache.matches(key, filename):
+            return False
+    return True
+
+def build_one(input_file: str, output_file: str, cache: Optional[CompileCache], emit: str, force: bool,
+              array_backend: str = 'list', optimize: int = 0, recover: bool = False) -> BuildResult:
+    """Compile one file of a build, reporting failures instead of raising."""
+    start = time.perf_counter()
+    try:
+        if not force and emit != 'none' and is_up_to_date(input_file, output_file, cache, emit, array_backend, optimize):
+            return BuildResult(input_file, output_file, 'skipped', '', time.perf_counter() - start)
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+        stamp = stamp_path(output_file)
+        if emit != 'none':
+            # Drop the old stamp first, so a failed build is never taken as up to date.
+            try:
+                os.remove(stamp)
+            except FileNotFoundError:
+                pass
+        # Files are already spread across the pool, so parse each one serially.
+        status = compile_file(input_file, output_file, workers=1, cache=cache, emit=emit, array_backend=array_backend,
+                              optimize=optimize, recover=recover)
+        if emit != 'none':
+            with open(stamp, 'w', encoding='utf-8') as outfile:
+                outfile.write(build_stamp(emit, array_backend, optimize))
+        return BuildResult(input_file, output_file, status, '', time.perf_counter() - start)
+    except Error as e:
+        message = e.full_message
+        diagnostics = tuple(item.to_dict() for item in error_list(e))
+    except Exception as e:
+        message = f"{e.__class__.__name__}: {e}"
+        diagnostics = ({'type': e.__class__.__name__, 'message': str(e), 'line': None, 'column': None},)
+    return BuildResult(input_file, output_file, 'failed', message, time.perf_counter() - start, diagnostics)
+
+def build(patterns: List[str], output_dir: Optional[str] = None, workers: Optional[int] = None,
+          cache: Optional[CompileCache] = None, emit: str = 'py', force: bool = False,
+          array_backend: str = 'list', optimize: int = 0, recover: bool = False) -> List[BuildResult]:
+    """Compile every input matched by `patterns` across a process pool."""
+    inputs = expand_inputs(patterns)
+    jobs = [(input_file, output_path(input_file, root, output_dir), cache, emit, force, array_backend, optimize, recover)
+            for input_file, root in inputs]
+    if not jobs:
+        return []
+
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers == 1:
+        return [build_one(*job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(build_one, *zip(*jobs)))
+
+def report(results: List[BuildResult], diagnostics_format: str = 'text') -> int:
+    """
+    Log a build summary and return the process exit code.
+
+    Failures are logged, or with the 'json' format written to stderr as
+    one JSON object per failed file.
+    """
+    counts = {'built': 0, 'cached': 0, 'skipped': 0, 'failed': 0}
+    for result in results:
+        counts[result.status] += 1
+        if result.status != 'failed':
+            continue
+        if diagnostics_format == 'json':
+            print(json.dumps({'file': result.input_file, 'diagnostics': list(result.diagnostics)}), file=sys.stderr)
+        else:
+            error(f"{result.input_file}: {result.message}")
+
+    info(f"Build finished: {counts['built'] + counts['cached']} built ({counts['cached']} from cache), "
+         f"{counts['skipped']} skipped, {counts['failed']} failed")
+    return 1 if counts['failed'] else 0
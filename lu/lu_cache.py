@@ -0,0 +1,152 @@
+import functools
+import glob
+import hashlib
+import importlib.util
+import marshal
+import os
+import shutil
+from types import CodeType
+from typing import Optional
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'lu')
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024  # bytes
+
+@functools.lru_cache(maxsize=None)
+def compiler_fingerprint() -> str:
+    """
+    Return a hash of the compiler's own sources, computed once per process.
+
+    Cache entries are keyed by it, so any change to the compiler that can
+    change its output invalidates them without a version bump by hand.
+    """
+    digest = hashlib.sha256()
+    for filename in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py'))):
+        digest.update(os.path.basename(filename).encode())
+        with open(filename, 'rb') as infile:
+            digest.update(infile.read())
+    return digest.hexdigest()
+
+class CompileCache:
+    """
+    Content-addressed store of compiled Lu programs.
+
+    Entries are keyed by a hash of the source bytes, `version` (by
+    default `compiler_fingerprint()`), the options and the Python bytecode
+    magic number, and hold the generated Python source
+    (`<key>.py`) and its marshalled code object (`<key>.pyc`). Hits refresh an
+    entry's mtime, and the least recently used entries are evicted once the
+    directory grows past `max_bytes`.
+    """
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_SIZE, version: Optional[str] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.version = compiler_fingerprint() if version is None else version
+
+    def key(self, source: bytes, *options) -> str:
+        """Return the cache key for `source` compiled with `options`."""
+        digest = hashlib.sha256()
+        digest.update(self.version.encode())
+        digest.update(importlib.util.MAGIC_NUMBER)
+        digest.update(repr(options).encode())
+        digest.update(source)
+        return digest.hexdigest()
+
+    def key_for_file(self, filename: str, *options) -> str:
+        with open(filename, 'rb') as infile:
+            return self.key(infile.read(), *options)
+
+    def path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, key + suffix)
+
+    def fetch(self, key: str, output_filename: str) -> bool:
+        """Copy the cached Python source for `key` to `output_filename`, if present."""
+        source = self.path(key, '.py')
+        try:
+            shutil.copyfile(source, output_filename)
+        except FileNotFoundError:
+            return False
+        self.touch(key)
+        return True
+
+    def matches(self, key: str, filename: str) -> bool:
+        """Check if `filename` is byte-identical to the cached Python source for `key`."""
+        import filecmp
+        try:
+            return filecmp.cmp(self.path(key, '.py'), filename, shallow=False)
+        except OSError:
+            return False
+
+    def load_code(self, key: str) -> Optional[CodeType]:
+        """Return the cached code object for `key`, or None if missing or unreadable."""
+        try:
+            with open(self.path(key, '.pyc'), 'rb') as infile:
+                code = marshal.load(infile)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        return code if isinstance(code, CodeType) else None
+
+    def store(self, key: str, py_output: str, code: Optional[CodeType] = None):
+        """Store the generated source (and code object) for `key`, then enforce the size bound."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.write_atomic(self.path(key, '.py'), py_output.encode('utf-8'))
+        if code is not None:
+            self.write_atomic(self.path(key, '.pyc'), marshal.dumps(code))
+        self.evict()
+
+    def store_file(self, key: str, py_filename: str, code: Optional[CodeType] = None):
+        """Like `store`, but copy the generated source from `py_filename` instead of holding it in memory."""
+        os.makedirs(self.directory, exist_ok=True)
+        import tempfile
+        fd, temp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            shutil.copyfile(py_filename, temp)
+            os.replace(temp, self.path(key, '.py'))
+        except BaseException:
+            os.unlink(temp)
+            raise
+        if code is not None:
+            self.write_atomic(self.path(key, '.pyc'), marshal.dumps(code))
+        self.evict()
+
+    def write_atomic(self, filename: str, data: bytes):
+        # Concurrent compiles may race on the same key; os.replace keeps readers
+        # from ever seeing a half-written entry.
+        import tempfile
+        fd, temp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as outfile:
+                outfile.write(data)
+            os.replace(temp, filename)
+        except BaseException:
+            os.unlink(temp)
+            raise
+
+    def touch(self, key: str):
+        for suffix in ('.py', '.pyc'):
+            try:
+                os.utime(self.path(key, suffix))
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in `max_bytes`."""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(('.py', '.pyc')) and entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
@@ -1,32 +1,63 @@
+from __future__ import annotations
 import os
 import sys
-import astunparse
-from lu_lexer import tokenize_text
-from lu_parser import parse
-from lu_errors import Error
-from lu_logger import info, error, exception
-import argparse
-
-def process_file(input_filename: str, output_filename: str, run: bool = False):
+from types import CodeType
+from typing import TYPE_CHECKING, Union
+from lu_errors import Error, error_list
+from lu_logger import info, error, exception, warning
+
+# The lexer, parser, cache and profiler are imported where they are first
+# needed, so starting up stays cheap and a cache hit never loads the parser.
+if TYPE_CHECKING:
+    import ast
+    from lu_cache import CompileCache
+    from lu_profile import Profiler
+
+__version__ = "0.1.0"
+
+EMIT_CHOICES = ('py', 'pyc', 'both', 'none')
+COMPILE_MODES = ('ast', 'source', 'code')
+DIAGNOSTICS_FORMATS = ('text', 'json')
+
+def compile_source(text: str, *, mode: str = 'code', filename: str = '<lu>', array_backend: str = 'list',
+                   optimize: int = 0, recover: bool = False) -> Union[ast.Module, str, CodeType]:
+    """
+    Compile Lu source text for embedding, returning an `ast.Module` ('ast'), Python source ('source') or a code object ('code').
+
+    Errors are raised as `lu_errors.Error` (an `lu_errors.Diagnostics`
+    with `recover`) instead of being logged or exiting. The lexer tables
+    are shared and read-only and every other piece of state lives in the
+    call, so threads may compile concurrently; each call parses in its
+    own thread without a process pool. `filename` names the code object.
+An unknown `mode` or `array_backend` raises `ValueError`.
+    """
+    if mode not in COMPILE_MODES:
+        raise ValueError(f"mode must be one of {', '.join(COMPILE_MODES)}, not {mode!r}")
+    from lu_functions import ARRAY_BACKENDS
+    if array_backend not in ARRAY_BACKENDS:
+        raise ValueError(f"array_backend must be one of {', '.join(ARRAY_BACKENDS)}, not {array_backend!r}")
+    from lu_lexer import tokenize_text
+    from lu_parser import parse
+    module = parse(tokenize_text(text), workers=1, array_backend=array_backend, recover=recover)
+    if optimize:
+        from lu_optimizer import optimize as optimize_module
+        module = optimize_module(module, optimize)
+    if mode == 'ast':
+        return module
+    if mode == 'source':
+        return unparse(module)
+    return compile(module, filename, 'exec', dont_inherit=True)
+
+def process_file(input_filename: str, output_filename: str, run: bool = False,
+                 parallel_threshold: int = None, workers: int = None, stream: bool = False,
+                 cache: CompileCache = None, emit: str = 'py', profiler: Profiler = None, array_backend: str = 'list',
+                 optimize: int = 0, recover: bool = False, diagnostics_format: str = 'text'):
+    """Compile a single file from the command line, exiting on any error."""
     try:
-        with open(input_filename, 'r', encoding='utf-8') as infile:
-            text = infile.read()
-        
-        info(f"Processing file: {input_filename}")
-        tokens = tokenize_text(text)
-        parsed_ast = parse(tokens)
-        py_output = astunparse.unparse(parsed_ast).replace("'#NEWLINE#'","")
-        
-        with open(output_filename, 'w', encoding='utf-8') as outfile:
-            outfile.write(py_output)
-        
-        info(f"Compilation successful. Output written to {output_filename}")
-        
-        if run:
-            execute_compiled_code(output_filename)
-    
+        compile_file(input_filename, output_filename, run, parallel_threshold, workers, stream, cache, emit, profiler,
+                     array_backend, optimize, recover)
     except Error as e:
-        error(f"Compilation failed: {e.full_message}")
+        report_error(input_filename, e, diagnostics_format)
         sys.exit(1)
     except IOError as e:
         error(f"File error: {str(e)}")
@@ -35,27 +66,261 @@ def process_file(input_filename: str, output_filename: str, run: bool = False):
         exception(f"Unexpected error occurred: {str(e)}")
         sys.exit(1)
 
-def execute_compiled_code(filename: str):
+def compile_file(input_filename: str, output_filename: str, run: bool = False,
+                 parallel_threshold: int = None, workers: int = None, stream: bool = False,
+                 cache: CompileCache = None, emit: str = 'py', profiler: Profiler = None,
+                 array_backend: str = 'list', optimize: int = 0, recover: bool = False) -> str:
+    """
+    Compile `input_filename`, writing the outputs selected by `emit`.
+
+    The code object is compiled straight from the parsed AST, so `run`
+    executes it without reading any output back from disk. Returns
+    'cached' or 'built'; errors propagate to the caller. Each step is
+    timed as a phase of `profiler`, when given. `parallel_threshold`
+    defaults to `lu_parser.PARALLEL_THRESHOLD`. `array_backend` selects
+    the storage emitted for DECLARE ARRAY and `optimize` the `lu_optimizer`
+    level; both are part of the cache key. With `recover`, every syntax
+    error is collected and raised together as an `lu_errors.Diagnostics`.
+
+    With `stream`, the input is tokenized lazily and, when Python source is
+    written, each top-level statement is written as soon as it is parsed
+    (see `lu_emit.emit_stream`). The code object is then compiled from the
+    written output, and only when `run` or a .pyc needs it.
+    """
+    from lu_profile import no_phase
+    phase = profiler.phase if profiler is not None else no_phase
+    info(f"Processing file: {input_filename}")
+    write_py = emit in ('py', 'both')
+    # A streamed compile never holds the whole module, so it only builds a
+    # code object (from the written output) when one is needed.
+    streamed = stream and write_py
+    need_code = run or emit in ('pyc', 'both') or not streamed
+    code = None
+    status = 'built'
+    if cache is not None:
+        with phase('cache'):
+            key = cache.key_for_file(input_filename, array_backend, optimize)
+            code = cache.load_code(key) if need_code else None
+            if (code is not None or not need_code) and (not write_py or cache.fetch(key, output_filename)):
+                status = 'cached'
+            else:
+                code = None
+        if status == 'cached':
+            info(f"Cache hit for {input_filename}")
+
+    if status == 'built':
+        import ast
+        from lu_lexer import tokenize_text, tokenize_file
+        from lu_parser import parse, PARALLEL_THRESHOLD
+        if parallel_threshold is None:
+            parallel_threshold = PARALLEL_THRESHOLD
+        if streamed:
+            from lu_emit import emit_stream
+            # Tokens are produced lazily and statements written as they are parsed, so all three are timed together.
+            with phase('lex+parse+write'):
+                emit_stream(tokenize_file(input_filename), output_filename, array_backend, optimize, recover, profiler)
+            if need_code:
+                with phase('compile'):
+                    with open(output_filename, 'r', encoding='utf-8') as infile:
+                        code = compile(infile.read(), output_filename, 'exec', dont_inherit=True)
+            if cache is not None:
+                with phase('cache'):
+                    cache.store_file(key, output_filename, code)
+        else:
+            if stream:
+                # Tokens are produced lazily while parsing, so lexing is timed with it.
+                tokens = tokenize_file(input_filename)
+                with phase('lex+parse'):
+                    parsed_ast = parse(tokens, parallel_threshold, workers, array_backend, recover)
+            else:
+                with phase('read'):
+                    with open(input_filename, 'r', encoding='utf-8') as infile:
+                        text = infile.read()
+                with phase('lex'):
+                    tokens = tokenize_text(text)
+                with phase('parse'):
+                    parsed_ast = parse(tokens, parallel_threshold, workers, array_backend, recover)
+                if profiler is not None:
+                    profiler.count('tokens', len(tokens))
+            if optimize:
+                from lu_optimizer import optimize as optimize_module
+                with phase('optimize'):
+                    parsed_ast = optimize_module(parsed_ast, optimize)
+            if profiler is not None:
+                profiler.count('statements', sum(isinstance(node, ast.stmt) for node in ast.walk(parsed_ast)))
+            with phase('compile'):
+                code = compile(parsed_ast, output_filename, 'exec', dont_inherit=True)
+
+            if write_py or cache is not None:
+                with phase('unparse'):
+                    py_output = unparse(parsed_ast)
+            if write_py:
+                with phase('write'):
+                    with open(output_filename, 'w', encoding='utf-8') as outfile:
+                        outfile.write(py_output)
+            if cache is not None:
+                with phase('cache'):
+                    cache.store(key, py_output, code)
+
+        info(f"Compilation successful. Output written to {output_filename}" if write_py else "Compilation successful.")
+
+    if emit in ('pyc', 'both'):
+        pyc_filename = os.path.splitext(output_filename)[0] + '.pyc'
+        with phase('write'):
+            write_pyc(code, pyc_filename, input_filename)
+        info(f"Bytecode written to {pyc_filename}")
+
+    if run:
+        with phase('exec'):
+            execute_code(code)
+    return status
+
+def report_error(filename: str, e: Error, diagnostics_format: str = 'text'):
+    """Report a failed compile of `filename`, as a log message or as one JSON line on stderr."""
+    if diagnostics_format == 'json':
+        import json
+        print(json.dumps({'file': filename, 'diagnostics': [item.to_dict() for item in error_list(e)]}),
+              file=sys.stderr)
+    else:
+        error(f"Compilation failed: {e.full_message}")
+
+def unparse(module: ast.Module) -> str:
+    """Return the Python source for a parsed Lu module, dropping its blank-line placeholders in place."""
+    import ast
+    from lu_optimizer import drop_placeholders
+    return ast.unparse(drop_placeholders(module)) + "\n"
+
+def write_pyc(code: CodeType, pyc_filename: str, source_filename: str):
+    """Write `code` as a timestamp-based .pyc that `python <file>.pyc` can run directly."""
+    import importlib.util
+    import marshal
+    source_stat = os.stat(source_filename)
+    data = bytearray(importlib.util.MAGIC_NUMBER)
+    data.extend((0).to_bytes(4, 'little'))  # flags: timestamp-based
+    data.extend((int(source_stat.st_mtime) & 0xFFFFFFFF).to_bytes(4, 'little'))
+    data.extend((source_stat.st_size & 0xFFFFFFFF).to_bytes(4, 'little'))
+    data.extend(marshal.dumps(code))
+    with open(pyc_filename, 'wb') as outfile:
+        outfile.write(data)
+
+def execute_code(code: CodeType):
+    """Run compiled Lu code as `__main__` in a fresh namespace."""
+    import builtins
     try:
-        info(f"Executing compiled code: {filename}")
-        with open(filename, 'r', encoding='utf-8') as file:
-            code = file.read()
-        exec(code, globals())
+        info(f"Executing compiled code: {code.co_filename}")
+        exec(code, {'__name__': '__main__', '__builtins__': builtins})
     except Exception as e:
         error(f"Error during execution: {str(e)}")
         sys.exit(1)
 
 def main():
+    import argparse
+    from lu_cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE
+    from lu_functions import ARRAY_BACKENDS
+    from lu_optimizer import MEMOIZE_LEVEL, OPTIMIZE_LEVELS
     parser = argparse.ArgumentParser(description='Lu Compiler')
-    parser.add_argument('input_file', type=str, help='Lu file path (e.g., path/example.lu)')
-    parser.add_argument('-o', '--output', type=str, help='Output Python file path (e.g., path/output.py)')
+    parser.add_argument('inputs', type=str, nargs='*',
+                        help='Lu file path (e.g., path/example.lu); several files, directories or glob patterns build a project')
+    parser.add_argument('-o', '--output', type=str,
+                        help='Output Python file path (e.g., path/output.py), or output directory when building a project or watching')
     parser.add_argument('-r', '--run', action='store_true', help='Run the compiled code after compilation')
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='Worker processes for building several files or parsing large inputs (default: CPU count)')
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help='Stay running and recompile the inputs incrementally whenever they change')
+    parser.add_argument('--serve', action='store_true',
+                        help='Compile JSON-lines requests from stdin on a pool of warm workers, writing responses to stdout')
+    parser.add_argument('--max-pending', type=int,
+                        help='With --serve, requests in flight before reading stdin pauses (default: twice the workers)')
+    parser.add_argument('--request-timeout', type=float,
+                        help='With --serve, seconds a worker may spend compiling one request before it fails (default: no limit)')
+    parser.add_argument('-f', '--force', action='store_true', help='Rebuild project files even if their output is up to date')
+    parser.add_argument('--parallel-threshold', type=int,
+                        help='Token count above which parsing runs in parallel (default: 50000)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Tokenize the input lazily from a memory-mapped file instead of reading it whole')
+    parser.add_argument('--no-cache', action='store_true', help='Always recompile, bypassing the compilation cache')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR,
+                        help=f'Compilation cache directory (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE // (1024 * 1024),
+                        help='Maximum cache size in MiB before least recently used entries are evicted (default: %(default)s)')
+    parser.add_argument('--emit', choices=EMIT_CHOICES, default='py',
+                        help='Write Python source, a .pyc next to it, both, or nothing (useful with --run) (default: py)')
+    parser.add_argument('--array-backend', choices=ARRAY_BACKENDS, default='list',
+                        help='Storage for DECLARE ARRAY: nested lists, or flat array.array / NumPy buffers that keep '
+                             'the declared bounds (default: list)')
+    parser.add_argument('-O', '--optimize', type=int, choices=OPTIMIZE_LEVELS, default=0,
+                        help='Optimization level: 1 folds constants, removes dead IF branches, blank-line placeholders '
+                             'and repeated imports; 2 also hoists loop-invariant conditions; 3 also memoizes pure '
+                             'functions (default: 0)')
+    parser.add_argument('--memoize', action='store_true',
+                        help=f'Cache the results of pure FUNCTIONs; the same as -O {MEMOIZE_LEVEL}')
+    parser.add_argument('--recover', action='store_true',
+                        help='Keep parsing after a syntax error and report every error in the input, not just the first')
+    parser.add_argument('--diagnostics-format', choices=DIAGNOSTICS_FORMATS, default='text',
+                        help='Report errors as log messages, or as one JSON object per failed file on stderr (default: text)')
+    parser.add_argument('--profile', '--stats', nargs='?', const='table', choices=('table', 'json'),
+                        help='Report per-phase wall/CPU time and token/statement counts (default: table)')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='Also trace the peak memory of each --profile phase; this slows the timed phases several times over')
+    parser.add_argument('--profile-output', type=str, help='Write the --profile report to this file instead of stderr')
+    parser.add_argument('--cprofile', type=str,
+                        help='Write a cProfile dump of the parse phase to this file; the compilation cache is bypassed')
     args = parser.parse_args()
+    if args.memoize:
+        args.optimize = max(args.optimize, MEMOIZE_LEVEL)
+
+    if args.serve:
+        if args.inputs:
+            parser.error('--serve reads its inputs from stdin')
+        from lu_serve import serve
+        serve(args.jobs, args.max_pending, optimize=args.optimize, array_backend=args.array_backend, recover=args.recover,
+              timeout=args.request_timeout)
+        return
+    if not args.inputs:
+        parser.error('the following arguments are required: inputs')
+
+    cache = None
+    # A cache hit never parses, which would leave --cprofile nothing to profile.
+    if not args.no_cache and not args.cprofile:
+        from lu_cache import CompileCache
+        cache = CompileCache(args.cache_dir, args.cache_size * 1024 * 1024)
+
+    input_file = args.inputs[0]
+    if args.watch:
+        from lu_watch import watch
+        watch(args.inputs, args.output, array_backend=args.array_backend, optimize=args.optimize)
+        return
+
+    import glob
+    if len(args.inputs) > 1 or os.path.isdir(input_file) or glob.has_magic(input_file):
+        if args.run:
+            parser.error('--run needs a single input file')
+        from lu_build import build, report
+        results = build(args.inputs, args.output, args.jobs, cache, args.emit, args.force, args.array_backend,
+                        args.optimize, args.recover)
+        if not results:
+            parser.error('no .lu files matched the given inputs')
+        sys.exit(report(results, args.diagnostics_format))
 
-    input_file = args.input_file
     output_file = args.output or os.path.splitext(input_file)[0] + '.py'
-    
-    process_file(input_file, output_file, args.run)
+    profiler = None
+    if args.profile or args.cprofile:
+        from lu_profile import Profiler
+        profiler = Profiler(trace_memory=args.profile_memory,
+                            cprofile_phases=('parse', 'lex+parse', 'lex+parse+write') if args.cprofile else ())
+    process_file(input_file, output_file, args.run, args.parallel_threshold, args.jobs, args.stream, cache, args.emit,
+                 profiler, args.array_backend, args.optimize, args.recover, args.diagnostics_format)
+
+    if args.cprofile and not profiler.dump_cprofile(args.cprofile):
+        warning(f"Nothing was parsed, so no cProfile dump was written to {args.cprofile}")
+    if args.profile:
+        report = profiler.to_json() if args.profile == 'json' else profiler.table()
+        if args.profile_output:
+            with open(args.profile_output, 'w', encoding='utf-8') as outfile:
+                outfile.write(report + '\n')
+        else:
+            print(report, file=sys.stderr)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
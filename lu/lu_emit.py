@@ -0,0 +1,106 @@
+import ast
+import os
+import shutil
+import tempfile
+from typing import IO, TYPE_CHECKING, Iterable, Iterator, Optional, Tuple
+from lu_token import Token, TokenWindow
+from lu_parser import Parser, allow_nesting, fix_locations, import_nodes
+from lu_errors import Diagnostics, Error
+from lu_optimizer import drop_placeholders
+
+if TYPE_CHECKING:
+    from lu_profile import Profiler
+
+def unparse_body(statements: list) -> Optional[Tuple[str, bool]]:
+    """
+    Unparse module-level statements, or return None if only blank-line placeholders remain.
+
+    The flag tells whether the first statement is a class or function,
+    which ast.unparse separates from the code before it by a blank line.
+    """
+    module = ast.Module(body=statements, type_ignores=[])
+    allow_nesting(fix_locations(module))
+    statements = drop_placeholders(module).body
+    if not statements:
+        return None
+    return ast.unparse(module), isinstance(statements[0], (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef))
+
+def join_bodies(parts: Iterable[Tuple[str, bool]]) -> str:
+    """Join unparsed parts the way ast.unparse joins the statements of one module."""
+    pieces = []
+    for code, spaced in parts:
+        if pieces:
+            pieces.append('\n\n' if spaced else '\n')
+        pieces.append(code)
+    return ''.join(pieces)
+
+def emit_stream(tokens: Iterator[Token], output_filename: str, array_backend: str = 'list', optimize: int = 0,
+                recover: bool = False, profiler: 'Profiler' = None):
+    """
+    Parse a lazy token stream and write the Python source statement by statement.
+
+    Each top-level statement is unparsed and appended to a temporary body
+    file as soon as it is parsed, so memory holds the token window and
+    one statement's tree, never the whole module or its source. The
+    imports are only known at the end; they are written to the head of
+    the output, followed by the body, which then replaces
+    `output_filename` in one rename. On an error the output is left as
+    it was. The result is identical to unparsing the whole module.
+    The statements written are counted in `profiler`, when given.
+    """
+    parser = Parser(TokenWindow(tokens), array_backend, recover)
+    if optimize:
+        from lu_optimizer import optimize_block
+    optimizer_imports = []  # imports the optimizer needs, which precede the parser's
+    directory = os.path.dirname(output_filename) or '.'
+    statement_count = 0
+    first_spaced = None  # whether the body starts with a class or function
+    with tempfile.TemporaryFile('w+', encoding='utf-8', dir=directory) as body:
+        try:
+            while not parser.is_at_file_end():
+                statements = parser.parse_recovering(parser.parse_top_level)
+                if parser.diagnostics:
+                    continue  # keep parsing to collect every error, but stop writing
+                if optimize:
+                    block_imports, statements = optimize_block(statements, optimize)
+                    optimizer_imports.extend(block_imports)
+                part = unparse_body(statements)
+                if part is None:
+                    continue
+                code, spaced = part
+                if first_spaced is None:
+                    first_spaced = spaced
+                else:
+                    body.write('\n\n' if spaced else '\n')
+                body.write(code)
+                if profiler is not None:
+                    statement_count += sum(isinstance(node, ast.stmt) for statement in statements for node in ast.walk(statement))
+        except Error as e:
+            if e.source is None:
+                e.source = getattr(parser.tokens, 'line_index', None)
+            raise
+        if parser.diagnostics:
+            raise Diagnostics(parser.diagnostics)
+
+        imports = import_nodes(optimizer_imports + parser.imports)
+        body.seek(0)
+        write_atomic(output_filename, unparse_body(imports), first_spaced, body)
+    if profiler is not None:
+        profiler.count('statements', statement_count + len(imports))
+
+def write_atomic(output_filename: str, header: Optional[Tuple[str, bool]], first_spaced: Optional[bool], body: IO[str]):
+    """Write `header` and then the contents of `body` to a new file that replaces `output_filename`."""
+    temporary = f"{output_filename}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, 'w', encoding='utf-8') as outfile:
+            if header is not None:
+                outfile.write(header[0])
+                if first_spaced is not None:
+                    outfile.write('\n\n' if first_spaced else '\n')
+            shutil.copyfileobj(body, outfile)
+            outfile.write('\n')
+        os.replace(temporary, output_filename)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+        raise
@@ -1,21 +1,49 @@
-from lu_logger import error as log_error
+from typing import List
 
 class Error(Exception):
-    def __init__(self, message: str, token=None):
+    # Errors are reported by whoever catches them; constructing one has no side effects,
+    # so the parser can collect many of them in recovery mode.
+    def __init__(self, message: str, token=None, source=None):
         self.message = message
         self.token = token
+        self.source = source  # lu_token.LineIndex of the source, for context lines
         super().__init__(self.full_message)
-        log_error(self.log_message)
+
+    def __reduce__(self):
+        # Errors cross process boundaries during parallel parsing; rebuild
+        # them from their state, since subclasses take different arguments.
+        return (_restore_error, (self.__class__, self.__dict__.copy()))
 
     @property
-    def full_message(self):
+    def summary(self):
         if self.token:
             return f"{self.__class__.__name__} at line {self.token.line}, column {self.token.column}: {self.message}"
         return f"{self.__class__.__name__}: {self.message}"
 
+    @property
+    def full_message(self):
+        if self.token and self.source is not None:
+            return f"{self.summary}\n{self.source.excerpt(self.token.line, self.token.column)}"
+        return self.summary
+
     @property
     def log_message(self):
-        return f"{self.full_message} | Token: {self.token}"
+        return f"{self.summary} | Token: {self.token}"
+
+    def to_dict(self) -> dict:
+        """Return the error as a JSON-serializable diagnostic."""
+        return {
+            'type': self.__class__.__name__,
+            'message': self.message,
+            'line': self.token.line if self.token else None,
+            'column': self.token.column if self.token else None,
+        }
+
+def _restore_error(cls, state):
+    err = cls.__new__(cls)
+    err.__dict__.update(state)
+    err.args = (err.full_message,)
+    return err
 
 class SyntaxError(Error):
     def __init__(self, message: str, token=None, expected: str = None):
@@ -23,12 +51,15 @@ class SyntaxError(Error):
         super().__init__(message, token)
 
     @property
-    def full_message(self):
-        base_message = super().full_message
+    def summary(self):
+        base_message = super().summary
         if self.expected:
             return f"{base_message}. Expected: {self.expected}"
         return base_message
 
+    def to_dict(self) -> dict:
+        return {**super().to_dict(), 'expected': self.expected}
+
 class TypeError(Error):
     def __init__(self, message: str, token=None, expected_type: str = None, actual_type: str = None):
         self.expected_type = expected_type
@@ -36,12 +67,15 @@ class TypeError(Error):
         super().__init__(message, token)
 
     @property
-    def full_message(self):
-        base_message = super().full_message
+    def summary(self):
+        base_message = super().summary
         if self.expected_type and self.actual_type:
             return f"{base_message}. Expected type: {self.expected_type}, got: {self.actual_type}"
         return base_message
 
+    def to_dict(self) -> dict:
+        return {**super().to_dict(), 'expected_type': self.expected_type, 'actual_type': self.actual_type}
+
 class NameError(Error):
     pass
 
@@ -52,4 +86,22 @@ class ReturnError(Error):
     pass
 
 class RuntimeError(Error):
-    pass
\ No newline at end of file
+    pass
+
+class Diagnostics(Error):
+    """Every error found in one compile by the parser's recovery mode, in source order."""
+    def __init__(self, errors: List[Error]):
+        self.errors = errors
+        super().__init__(f"{len(errors)} error(s)")
+
+    @property
+    def summary(self):
+        return '\n'.join(error.summary for error in self.errors)
+
+    @property
+    def full_message(self):
+        return '\n'.join(error.full_message for error in self.errors)
+
+def error_list(error: Error) -> List[Error]:
+    """Return the individual errors in `error`."""
+    return error.errors if isinstance(error, Diagnostics) else [error]
@@ -1,7 +1,379 @@
-from typing import List, Dict, Any
-from lu_errors import Error, SyntaxError, TypeError, NameError
+import atexit
+import functools
+import math
+import operator
+import os
+import sys
+from array import array
+from typing import List, Dict, Any, Optional, Tuple
+
+# The runtime library is imported by generated programs, which must not need
+# the compiler, so its errors are Python's own exceptions, not lu_errors'.
 
 class LuFunction:
     pass
 
-# nothing here 
\ No newline at end of file
+# Storage backends for DECLARE ARRAY; 'list' keeps plain (nested) Python lists.
+ARRAY_BACKENDS = ('list', 'array', 'numpy')
+
+# array.array typecodes and NumPy dtypes for the typed element types.
+ARRAY_TYPECODES = {'INTEGER': 'q', 'REAL': 'd', 'BOOLEAN': 'b'}
+NUMPY_DTYPES = {'INTEGER': 'int64', 'REAL': 'float64', 'BOOLEAN': 'bool'}
+ARRAY_DEFAULTS = {'INTEGER': 0, 'REAL': 0.0, 'BOOLEAN': False, 'STRING': '', 'CHAR': '', 'DATE': ''}
+
+def as_integer(value) -> int:
+    """Check an INTEGER element; a float is rejected rather than truncated."""
+    try:
+        return operator.index(value)
+    except TypeError:
+        raise TypeError(f"an INTEGER array element cannot be {value!r}") from None
+
+def as_real(value) -> float:
+    """Check a REAL element; strings are rejected rather than parsed."""
+    if isinstance(value, (str, bytes)):
+        raise TypeError(f"a REAL array element cannot be {value!r}")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise TypeError(f"a REAL array element cannot be {value!r}") from None
+
+def as_boolean(value) -> bool:
+    """Check a BOOLEAN element, which must be TRUE or FALSE."""
+    if not isinstance(value, bool):
+        raise TypeError(f"a BOOLEAN array element cannot be {value!r}")
+    return value
+
+# Checks run on every store into a typed buffer, so the array and numpy
+# backends accept and reject the same values: array.array would raise on
+# some of them and NumPy silently convert others.
+ELEMENT_CHECKS = {'INTEGER': as_integer, 'REAL': as_real, 'BOOLEAN': as_boolean}
+
+class LuArray:
+    """
+    A DECLARE ARRAY with its declared bounds.
+
+    Elements live in one flat, row-major buffer: an `array.array` or a NumPy
+    array for INTEGER, REAL and BOOLEAN elements, and a list otherwise.
+    Indices run from each dimension's declared lower to upper bound, and a
+    2-D array is indexed as `a[i, j]`. Values stored in a typed buffer
+    are checked by `ELEMENT_CHECKS`, raising `TypeError` on a mismatch.
+    """
+    __slots__ = ('data_type', 'bounds', 'data', '_stride', '_check')
+
+    def __init__(self, data_type: str, bounds: List[Tuple[int, int]], backend: str = 'array'):
+        self.data_type = data_type
+        self.bounds = [tuple(bound) for bound in bounds]
+        size = 1
+        for lower, upper in self.bounds:
+            size *= max(upper - lower + 1, 0)
+        self._stride = self.bounds[1][1] - self.bounds[1][0] + 1 if len(self.bounds) > 1 else 1
+        self._check = ELEMENT_CHECKS.get(data_type) if backend in ('array', 'numpy') else None
+
+        if backend == 'numpy' and data_type in NUMPY_DTYPES:
+            try:
+                import numpy
+            except ImportError:
+                raise ImportError("the numpy array backend needs NumPy to be installed") from None
+            self.data = numpy.zeros(size, dtype=NUMPY_DTYPES[data_type])
+        elif backend in ('array', 'numpy') and data_type in ARRAY_TYPECODES:
+            typecode = ARRAY_TYPECODES[data_type]
+            self.data = array(typecode, bytes(size * array(typecode).itemsize))
+        else:
+            self.data = [ARRAY_DEFAULTS.get(data_type)] * size
+
+    def _offset(self, index) -> int:
+        indices = index if isinstance(index, tuple) else (index,)
+        if len(indices) != len(self.bounds):
+            raise IndexError(f"array has {len(self.bounds)} dimension(s), got {len(indices)} index(es)")
+        offset = 0
+        for i, (lower, upper) in zip(indices, self.bounds):
+            if not lower <= i <= upper:
+                raise IndexError(f"index {i} is outside the array bounds {lower}:{upper}")
+            offset = offset * (upper - lower + 1) + i - lower
+        return offset
+
+    def __getitem__(self, index):
+        value = self.data[self._offset(index)]
+        return bool(value) if self.data_type == 'BOOLEAN' else value
+
+    def __setitem__(self, index, value):
+        if self._check is not None:
+            value = self._check(value)
+        self.data[self._offset(index)] = value
+
+    def __len__(self) -> int:
+        return self.bounds[0][1] - self.bounds[0][0] + 1
+
+    def __iter__(self):
+        """Iterate over the elements, or over the rows of a 2-D array."""
+        if len(self.bounds) == 1:
+            if self.data_type == 'BOOLEAN':
+                return (bool(value) for value in self.data)
+            return iter(self.data)
+        return (self.data[start:start + self._stride] for start in range(0, len(self.data), self._stride))
+
+    def __repr__(self) -> str:
+        dimensions = ','.join(f"{lower}:{upper}" for lower, upper in self.bounds)
+        return f"LuArray[{dimensions}] OF {self.data_type}: {list(self.data)!r}"
+
+# Element types of record fields whose columns can be typed, by annotation.
+RECORD_FIELD_TYPES = {int: 'INTEGER', float: 'REAL', bool: 'BOOLEAN', str: 'STRING',
+                      'int': 'INTEGER', 'float': 'REAL', 'bool': 'BOOLEAN', 'str': 'STRING'}
+
+class RecordArray:
+    """
+    An ARRAY OF a record type, stored as one column per field.
+
+    Each column is an `LuArray` with the array's bounds, so INTEGER, REAL and
+    BOOLEAN fields are packed into typed buffers instead of living in a
+    separate object per element. `a[i]` returns a view whose attributes read
+    and write the columns, and assigning a record to `a[i]` copies its fields.
+    """
+    __slots__ = ('record', 'bounds', 'columns')
+
+    def __init__(self, record: type, bounds: List[Tuple[int, int]], backend: str = 'array'):
+        import dataclasses
+        if not dataclasses.is_dataclass(record):
+            raise TypeError(f"{record.__name__} is not a record type")
+        self.record = record
+        self.bounds = bounds
+        self.columns: Dict[str, LuArray] = {}
+        for field in dataclasses.fields(record):
+            column = LuArray(RECORD_FIELD_TYPES.get(field.type), bounds, backend)
+            if field.default_factory is not dataclasses.MISSING:
+                column.data = [field.default_factory() for _ in column.data]
+            elif field.default is not dataclasses.MISSING and field.type not in RECORD_FIELD_TYPES:
+                column.data = [field.default] * len(column.data)
+            self.columns[field.name] = column
+
+    def __getitem__(self, index) -> 'RecordView':
+        return RecordView(self, index)
+
+    def __setitem__(self, index, record):
+        for name, column in self.columns.items():
+            column[index] = getattr(record, name)
+
+    def __len__(self) -> int:
+        return self.bounds[0][1] - self.bounds[0][0] + 1
+
+    def __iter__(self):
+        """Iterate over views of the elements, in row-major order."""
+        if len(self.bounds) == 1:
+            return (RecordView(self, i) for i in range(self.bounds[0][0], self.bounds[0][1] + 1))
+        (lower1, upper1), (lower2, upper2) = self.bounds
+        return (RecordView(self, (i, j)) for i in range(lower1, upper1 + 1) for j in range(lower2, upper2 + 1))
+
+class RecordView:
+    """One element of a `RecordArray`, accessed like a record."""
+    __slots__ = ('_array', '_index')
+
+    def __init__(self, array: RecordArray, index):
+        object.__setattr__(self, '_array', array)
+        object.__setattr__(self, '_index', index)
+
+    def __getattr__(self, name: str):
+        try:
+            column = self._array.columns[name]
+        except KeyError:
+            raise AttributeError(f"{self._array.record.__name__} has no field '{name}'") from None
+        return column[self._index]
+
+    def __setattr__(self, name: str, value):
+        try:
+            column = self._array.columns[name]
+        except KeyError:
+            raise AttributeError(f"{self._array.record.__name__} has no field '{name}'") from None
+        column[self._index] = value
+
+    def record(self):
+        """Return the element as a record instance."""
+        return self._array.record(**{name: column[self._index] for name, column in self._array.columns.items()})
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, RecordView):
+            other = other.record()
+        return self.record() == other
+
+    def __repr__(self) -> str:
+        return repr(self.record())
+
+# Built-in functions of the runtime library. Generated code imports each one
+# from this module only when the program calls it.
+BUILTINS = frozenset({'LENGTH', 'SUBSTRING', 'UCASE', 'LCASE', 'MOD', 'DIV', 'ROUND', 'RANDOM',
+                      'OPENFILE', 'READFILE', 'WRITEFILE', 'CLOSEFILE', 'EOF'})
+
+# Strings and arrays know their length, so these are the C built-ins themselves.
+LENGTH = len
+UCASE = str.upper
+LCASE = str.lower
+MOD = operator.mod
+DIV = operator.floordiv
+
+def SUBSTRING(text: str, start: int, length: int) -> str:
+    """Return `length` characters of `text` from the 1-based position `start`."""
+    if start < 1 or length < 0:
+        raise ValueError(f"SUBSTRING needs a start of at least 1 and a length of at least 0, got {start} and {length}")
+    return text[start - 1:start - 1 + length]
+
+def ROUND(value: float, places: int = 0):
+    """Round `value` to `places` decimal places, halves away from zero; to an INTEGER when `places` is 0."""
+    scale = 10 ** places
+    rounded = math.floor(abs(value) * scale + 0.5)
+    if places == 0:
+        return int(math.copysign(rounded, value)) if rounded else 0
+    return math.copysign(rounded / scale, value)
+
+def __getattr__(name: str):
+    # RANDOM is random.random itself; the random module is only loaded by programs that use it.
+    if name == 'RANDOM':
+        from random import random
+        globals()['RANDOM'] = random
+        return random
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Files
+
+FILE_MODES = {'READ': 'r', 'WRITE': 'w', 'APPEND': 'a'}
+FILE_BUFFER_SIZE = 1 << 16  # bytes buffered per open file
+
+class LuFile:
+    """
+    A file opened by OPENFILE, kept open until CLOSEFILE.
+
+    A file opened for READ holds its next line, read ahead, so EOF is a
+    check of that line rather than a read.
+    """
+    __slots__ = ('name', 'mode', 'file', 'next_line')
+
+    def __init__(self, name: str, mode: str):
+        self.name = name
+        self.mode = mode
+        self.file = open(name, FILE_MODES[mode], encoding='utf-8', buffering=FILE_BUFFER_SIZE)
+        self.next_line = self._read_ahead() if mode == 'READ' else None
+
+    def _read_ahead(self) -> Optional[str]:
+        line = self.file.readline()
+        if not line:
+            return None
+        return line[:-1] if line.endswith('\n') else line
+
+    def read_line(self) -> str:
+        line = self.next_line
+        if line is None:
+            raise EOFError(f"READFILE past the end of file '{self.name}'")
+        self.next_line = self._read_ahead()
+        return line
+
+# The program's open files by name. Programs run one after another in the
+# same process (as in `lu_runner`) must call `reset_runtime` in between.
+_files: Dict[str, LuFile] = {}
+
+def _open_file(name: str, mode: str) -> LuFile:
+    """Return the open file `name`, which must have been opened for `mode`."""
+    file = _files.get(name)
+    if file is None:
+        raise RuntimeError(f"File '{name}' is not open")
+    if file.mode != mode and not (mode == 'WRITE' and file.mode == 'APPEND'):
+        raise RuntimeError(f"File '{name}' is open for {file.mode}, not {mode}")
+    return file
+
+def OPENFILE(name: str, mode: str = 'READ'):
+    """Open `name` for READ, WRITE or APPEND."""
+    mode = mode.upper()
+    if mode not in FILE_MODES:
+        raise ValueError(f"Unknown file mode '{mode}', expected READ, WRITE or APPEND")
+    if name in _files:
+        raise RuntimeError(f"File '{name}' is already open")
+    _files[name] = LuFile(name, mode)
+
+def READFILE(name: str) -> str:
+    """Return the next line of `name`, without its line break."""
+    return _open_file(name, 'READ').read_line()
+
+def WRITEFILE(name: str, value):
+    """Write `value` to `name` as one line."""
+    _open_file(name, 'WRITE').file.write(f"{value}\n")
+
+def EOF(name: str) -> bool:
+    """Return whether every line of `name` has been read."""
+    return _open_file(name, 'READ').next_line is None
+
+def CLOSEFILE(name: str):
+    """Close `name`, writing out what is buffered."""
+    file = _files.pop(name, None)
+    if file is None:
+        raise RuntimeError(f"File '{name}' is not open")
+    file.file.close()
+
+def close_files():
+    """Close every file the program left open."""
+    while _files:
+        _files.popitem()[1].file.close()
+
+atexit.register(close_files)
+
+# Memoization
+
+MEMO_SIZE = 1 << 16  # results kept per memoized function, least recently used dropped first
+MEMO_KEY_TYPES = frozenset({int, float, str, bool, type(None)})  # immutable argument types that can key the cache
+# Recursion limit while memoized functions run. Each call takes three frames (its wrapper, the
+# cache and the function), so this keeps the default depth of 1000 calls reachable.
+MEMO_RECURSION_LIMIT = 3000
+
+_memoized: List[Any] = []  # every memoized function, for the report
+
+def memoize(function):
+    """
+    Cache the results of a pure `function` in a bounded LRU cache keyed by its arguments.
+
+    Calls with any argument that is not an int, float, str, bool or None,
+    such as an array, bypass the cache, since the argument may be mutable.
+    A recursive function recurses through the cache, so the recursion
+    limit is raised to at least `MEMO_RECURSION_LIMIT`.
+    """
+    cached = functools.lru_cache(maxsize=MEMO_SIZE, typed=True)(function)
+
+    @functools.wraps(function)
+    def call(*args):
+        for arg in args:
+            if type(arg) not in MEMO_KEY_TYPES:
+                call.bypassed += 1
+                return function(*args)
+        return cached(*args)
+
+    call.bypassed = 0
+    call.cache_info = cached.cache_info
+    _memoized.append(call)
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), MEMO_RECURSION_LIMIT))
+    return call
+
+def memo_stats() -> List[Dict[str, Any]]:
+    """Return the calls, cache hits and hit rate of every memoized function."""
+    stats = []
+    for call in _memoized:
+        info = call.cache_info()
+        calls = info.hits + info.misses + call.bypassed
+        stats.append({'function': call.__name__, 'calls': calls, 'hits': info.hits, 'misses': info.misses,
+                      'bypassed': call.bypassed, 'cached': info.currsize,
+                      'hit_rate': info.hits / calls if calls else 0.0})
+    return stats
+
+def print_memo_report(file=None):
+    """Print `memo_stats` as a table, to stderr by default."""
+    file = file or sys.stderr
+    print(f"{'memoized':<20}{'calls':>12}{'hits':>12}{'misses':>12}{'bypassed':>10}{'cached':>10}{'hit rate':>10}",
+          file=file)
+    for stat in memo_stats():
+        print(f"{stat['function']:<20}{stat['calls']:>12}{stat['hits']:>12}{stat['misses']:>12}"
+              f"{stat['bypassed']:>10}{stat['cached']:>10}{stat['hit_rate']:>10.1%}", file=file)
+
+def _report_at_exit():
+    if _memoized and os.environ.get('LU_MEMO_REPORT'):
+        print_memo_report()
+
+atexit.register(_report_at_exit)
+
+def reset_runtime():
+    """Close the program's files and forget its memoized functions, before the process runs another program."""
+    close_files()
+    _memoized.clear()
@@ -1,78 +1,136 @@
+import codecs
 import re
-from lu_token import Token
+from typing import Iterable, Iterator, Tuple
+from lu_token import EOF, KINDS, LineIndex, Token, TokenBuffer
 
-class Lexer:
-    def __init__(self, text: str):
-        self.text = text
-        self.pos = 0
-        self.line = 1
-        self.column = 1
-        self.token_specs = [
-            # Whitespace and Comments
-            # ('TAB', r'\t+'),                 # Matches individual tabs
-            ('WHITESPACE', r'\n+'),            # Matches individual newlines  # Matches tabs and newlines
-            ('SPACE', r'[ ]+'),                # Matches spaces
-            ('COMMENT', r'//.*'),              # Single-line comments starting with //
+CHUNK_SIZE = 1 << 16
+# Tokens ending this close to the end of a chunk may still grow once the next
+# chunk arrives (e.g. 'NOT' -> 'NOT OR', '<' -> '<=', identifiers, numbers).
+LOOKAHEAD_MARGIN = 16
+
+# Token patterns, tried in order; built once and shared by every Lexer, which
+# only holds per-text state, so lexers can run concurrently in threads.
+TOKEN_SPECS = (
+    # Whitespace and Comments
+    # ('TAB', r'\t+'),                 # Matches individual tabs
+    ('WHITESPACE', r'\n+'),            # Matches individual newlines  # Matches tabs and newlines
+    ('SPACE', r'[ ]+'),                # Matches spaces
+    ('COMMENT', r'//.*'),              # Single-line comments starting with //
 
-            # Boolean and Logical Operators
-            ('BOOLEAN', r'\b(TRUE|FALSE)\b'),                   # Boolean literals TRUE, FALSE
-            ('BOOLEANOP', r'\b(NOT OR|NOT AND|OR|AND|NOT)\b'),  # Logical operators AND, OR, NOT
+    # Boolean and Logical Operators
+    ('BOOLEAN', r'\b(TRUE|FALSE)\b'),                   # Boolean literals TRUE, FALSE
+    ('BOOLEANOP', r'\b(NOT OR|NOT AND|OR|AND|NOT)\b'),  # Logical operators AND, OR, NOT
 
-            # Keywords
-            ('KEYWORD', r'\b(INPUT|OUTPUT|PRINT|IF|THEN|ELSE|ENDIF|WHILE|ENDWHILE|FOR|TO|STEP|NEXT|FUNCTION|ENDFUNCTION|RETURN|CALL|DECLARE|CONSTANT|LET|DO|REPEAT|UNTIL|CASE|ENDCASE|SWITCH|ENDSWITCH|TRUE|FALSE)\b'),
+    # Keywords
+    ('KEYWORD', r'\b(INPUT|OUTPUT|PRINT|IF|THEN|ELSE|ENDIF|WHILE|ENDWHILE|FOR|TO|STEP|NEXT|FUNCTION|ENDFUNCTION|RETURN|CALL|DECLARE|CONSTANT|LET|DO|REPEAT|UNTIL|CASE|ENDCASE|SWITCH|ENDSWITCH|TRUE|FALSE)\b'),
 
-            # Identifiers and Functions
-            ('IDENTIFIER', r'[a-zA-Z_]\w*'),   # Variable/function names (alphanumeric and underscores)
-            ('ATTRIBUTE', r'\.[a-zA-Z_]\w*'),  # Attributes starting with a dot (e.g., object.property)
+    # Identifiers and Functions
+    ('IDENTIFIER', r'[a-zA-Z_]\w*'),   # Variable/function names (alphanumeric and underscores)
+    ('ATTRIBUTE', r'\.[a-zA-Z_]\w*'),  # Attributes starting with a dot (e.g., object.property)
 
-            # Character and String Literals
-            ('CHAR', r"'.'"),                  # Single characters enclosed in single quotes
-            ('STRING', r'"[^"]*"'),            # Strings enclosed in double quotes
+    # Character and String Literals
+    ('CHAR', r"'.'"),                  # Single characters enclosed in single quotes
+    ('STRING', r'"[^"]*"'),            # Strings enclosed in double quotes
 
-            # Numeric Literals
-            ('INTEGER', r'\b\d+\b'),           # Integer literals (whole numbers)
-            ('REAL', r'\b\d+\.\d+\b'),         # Real (floating point) numbers
+    # Numeric Literals
+    ('REAL', r'\b\d+\.\d+\b'),         # Real (floating point) numbers, tried first so '3.14' is not split
+    ('INTEGER', r'\b\d+\b'),           # Integer literals (whole numbers)
 
-            # Operators (Arithmetic, Assignment, Comparison, and Bitwise)
-            ('OPERATOR', r'(<-|←|->|==|!=|\+|-|\*{1,2}|/|\^|=|<>|<|<=|>|>=|%|&|\||\^|~|<<|>>)'),  # All operators
+    # Operators (Arithmetic, Assignment, Comparison, and Bitwise)
+    ('OPERATOR', r'(<-|←|->|==|!=|<>|<=|>=|<<|>>|\+|-|\*{1,2}|/|\^|=|<|>|%|&|\||~)'),  # All operators, longest first
 
-            # Delimiters
-            ('DELIMITER', r'[\(\)\[\]\{\},;:]'),        # Parentheses, brackets, commas, etc.
-        ]
+    # Delimiters
+    ('DELIMITER', r'[\(\)\[\]\{\},;:]'),        # Parentheses, brackets, commas, etc.
+)
 
+TOKEN_REGEX = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in TOKEN_SPECS))
+SKIPPED_KINDS = frozenset({'COMMENT', 'SPACE'})  # matched but not emitted
 
-        self.token_regex = '|'.join(f'(?P<{name}>{pattern})' for name, pattern in self.token_specs)
-        self.compiled_regex = re.compile(self.token_regex)
+class Lexer:
+    def __init__(self, text: str = ''):
+        self.text = text
+        self.line_index = LineIndex(text)
+        self.token_specs = TOKEN_SPECS
+        self.compiled_regex = TOKEN_REGEX
 
-    def tokenize(self):
-        tokens = []
+    def tokenize(self) -> TokenBuffer:
+        """Tokenize the whole text; positions are looked up in the line index when needed."""
+        tokens = TokenBuffer(self.text, self.line_index)
         for match in self.compiled_regex.finditer(self.text):
             token_type = match.lastgroup
-            value = match.group(token_type)
-            if token_type in {'COMMENT', 'SPACE'}:
-                self.update_position(value)
-                continue
-            else:
-                token = Token(token_type, value, self.line, self.column)
-                tokens.append(token)
-                self.update_position(value)
-        tokens.append(Token('EOF', '', self.line, self.column))
+            if token_type not in SKIPPED_KINDS:
+                tokens.append(KINDS[token_type], match.start(), match.end())
+        tokens.append(EOF, len(self.text), len(self.text))
         return tokens
 
-    def update_position(self, value: str):
-        """Update line and column positions after processing a token."""
-        newline_count = value.count('\n')
-        semicolon_count = value.count(';')
+    def scan(self, start: int = 0) -> Iterator[Tuple[int, Token]]:
+        """
+        Yield (offset, token) pairs for the text from `start` on.
 
-        # Increment line number for each newline and semicolon
-        self.line += newline_count + semicolon_count
+        Positions come from the line index, so a caller can resume
+        tokenizing at any token boundary. No EOF token is added.
+        """
+        for match in self.compiled_regex.finditer(self.text, start):
+            token_type = match.lastgroup
+            if token_type not in SKIPPED_KINDS:
+                yield match.start(), Token(token_type, match.group(token_type), *self.line_index.position(match.start()))
 
-        if newline_count > 0:
-            self.column = len(value.rsplit('\n', 1)[-1]) + 1
-        else:
-            self.column += len(value)
-        self.pos += len(value)
+    def tokenize_chunks(self, chunks: Iterable[str]) -> Iterator[Token]:
+        """
+        Lazily tokenize text arriving in chunks, yielding the same tokens as `tokenize`.
 
-def tokenize_text(text: str):
+        Matches are only accepted once enough text follows them that the next
+        chunk cannot change them; anything after the last accepted token
+        (a token touching the chunk end, an unterminated string) is carried
+        over and rescanned with the next chunk.
+        """
+        buffer = ''
+        pos = 0  # end of the last accepted match within buffer
+        index = LineIndex(buffer)
+        chunks = iter(chunks)
+        while True:
+            chunk = next(chunks, '')
+            eof = not chunk
+            keep = max(pos - 1, 0)  # keep one character of left context for \b
+            buffer = buffer[keep:] + chunk
+            index = LineIndex(buffer, *index.position(keep))
+            pos -= keep
+            limit = len(buffer) if eof else len(buffer) - LOOKAHEAD_MARGIN
+
+            for match in self.compiled_regex.finditer(buffer, pos):
+                if not eof and (match.end() > limit or '"' in buffer[pos:match.start()]):
+                    break
+                token_type = match.lastgroup
+                pos = match.end()
+                if token_type not in SKIPPED_KINDS:
+                    yield Token(token_type, match.group(token_type), *index.position(match.start()))
+
+            if eof:
+                break
+        yield Token('EOF', '', *index.position(len(buffer)))
+
+def tokenize_text(text: str) -> TokenBuffer:
     lexer = Lexer(text)
     return lexer.tokenize()
+
+def read_chunks(filename: str, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """Yield the decoded text of `filename` in chunks, memory-mapping it when possible."""
+    import mmap
+    with open(filename, 'rb') as infile:
+        try:
+            buffer = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty files cannot be mapped
+            return
+        with buffer:
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            for start in range(0, len(buffer), chunk_size):
+                text = decoder.decode(buffer[start:start + chunk_size])
+                if text:
+                    yield text
+            tail = decoder.decode(b'', final=True)
+            if tail:
+                yield tail
+
+def tokenize_file(filename: str, chunk_size: int = CHUNK_SIZE) -> Iterator[Token]:
+    """Lazily tokenize `filename` without reading it into memory at once."""
+    return Lexer().tokenize_chunks(read_chunks(filename, chunk_size))
@@ -1,12 +1,16 @@
+import atexit
 import logging
-import sys
 import os
+import sys
+import threading
 
 # ANSI escape codes for colors
 RESET = "\033[0m"
 RED = "\033[31m"
 YELLOW = "\033[33m"
 
+LOG_FILE = os.environ.get('LU_LOG_FILE', 'lu_compiler.log')  # empty disables the file log
+
 class ColoredFormatter(logging.Formatter):
     def format(self, record):
         formatted_message = super().format(record)
@@ -17,53 +21,112 @@ class ColoredFormatter(logging.Formatter):
         return formatted_message
 
 def setup_logger(name: str, level: int = logging.INFO) -> logging.Logger:
+    """
+    Create the logger without any handlers.
+
+    Handlers are attached on the first record that passes the level check,
+    so importing this module does no I/O and disabled levels cost nothing.
+    """
     logger = logging.getLogger(name)
     logger.setLevel(level)
+    logger.propagate = False
+    return logger
 
-    # Create a formatter that includes the calling function's filename and line number
-    formatter = ColoredFormatter('%(asctime)s - %(name)s - [%(filename)s:%(lineno)d] - %(levelname)s - %(message)s')
+# Create a global logger instance
+lu_logger = setup_logger('lu_compiler', getattr(logging, os.environ.get('LU_LOG_LEVEL', 'INFO').upper(), logging.INFO))
 
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+_listener = None
+_listener_pid = None
+_setup_lock = threading.Lock()
 
-    file_handler = logging.FileHandler('lu_compiler.log')
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+def _start_listener():
+    """
+    Route records through a queue to a background thread that writes them.
 
-    return logger
+    Compile threads only enqueue records; the console and (lazily opened)
+    file handlers run on the listener thread. A forked child gets its own
+    queue and listener, since the parent's thread does not survive the fork.
+    """
+    global _listener, _listener_pid
+    import logging.handlers
+    import queue
+    with _setup_lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            return
+        for handler in list(lu_logger.handlers):
+            lu_logger.removeHandler(handler)
 
-# Create a global logger instance
-lu_logger = setup_logger('lu_compiler')
+        # Create a formatter that includes the calling function's filename and line number
+        formatter = ColoredFormatter('%(asctime)s - %(name)s - [%(filename)s:%(lineno)d] - %(levelname)s - %(message)s')
+
+        handlers = []
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+
+        if LOG_FILE:
+            file_handler = logging.FileHandler(LOG_FILE, delay=True)
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+
+        records = queue.SimpleQueue()
+        lu_logger.addHandler(logging.handlers.QueueHandler(records))
+        _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        _listener.start()
+        _listener_pid = os.getpid()
+
+        # Pool workers leave through os._exit, which skips atexit handlers.
+        if 'multiprocessing' in sys.modules:
+            import multiprocessing.util
+            if multiprocessing.parent_process() is not None:
+                multiprocessing.util.Finalize(None, flush, exitpriority=0)
+
+def flush():
+    """Stop the listener after it has written every queued record."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+        _listener = None
+
+atexit.register(flush)
+
+def set_level(level: int):
+    lu_logger.setLevel(level)
+
+def is_enabled(level: int) -> bool:
+    return lu_logger.isEnabledFor(level)
 
-# Function to get the caller's information
-def get_caller_info():
-    frame = sys._getframe(2)  # Get the frame two levels up (skipping this function and the logging function)
-    filename = os.path.basename(frame.f_code.co_filename)
-    lineno = frame.f_lineno
-    return filename, lineno
+def _log(level, msg, args, kwargs):
+    if _listener is None or _listener_pid != os.getpid():
+        _start_listener()
+    # stacklevel points %(filename)s and %(lineno)d at our caller's caller
+    lu_logger.log(level, msg, *args, stacklevel=3, **kwargs)
 
-# Custom logging functions that include caller info
+# Logging functions; each returns before doing any work when its level is disabled
 def debug(msg, *args, **kwargs):
-    filename, lineno = get_caller_info()
-    lu_logger.debug(f"[{filename}:{lineno}] {msg}", *args, **kwargs)
+    if lu_logger.isEnabledFor(logging.DEBUG):
+        _log(logging.DEBUG, msg, args, kwargs)
 
 def info(msg, *args, **kwargs):
-    filename, lineno = get_caller_info()
-    lu_logger.info(f"[{filename}:{lineno}] {msg}", *args, **kwargs)
+    if lu_logger.isEnabledFor(logging.INFO):
+        _log(logging.INFO, msg, args, kwargs)
 
 def warning(msg, *args, **kwargs):
-    filename, lineno = get_caller_info()
-    lu_logger.warning(f"[{filename}:{lineno}] {msg}", *args, **kwargs)
+    if lu_logger.isEnabledFor(logging.WARNING):
+        _log(logging.WARNING, msg, args, kwargs)
 
 def error(msg, *args, **kwargs):
-    filename, lineno = get_caller_info()
-    lu_logger.error(f"[{filename}:{lineno}] {msg}", *args, **kwargs)
+    if lu_logger.isEnabledFor(logging.ERROR):
+        _log(logging.ERROR, msg, args, kwargs)
 
 def critical(msg, *args, **kwargs):
-    filename, lineno = get_caller_info()
-    lu_logger.critical(f"[{filename}:{lineno}] {msg}", *args, **kwargs)
+    if lu_logger.isEnabledFor(logging.CRITICAL):
+        _log(logging.CRITICAL, msg, args, kwargs)
 
 def exception(msg, *args, **kwargs):
-    filename, lineno = get_caller_info()
-    lu_logger.exception(f"[{filename}:{lineno}] {msg}", *args, **kwargs)
\ No newline at end of file
+    if lu_logger.isEnabledFor(logging.ERROR):
+        kwargs.setdefault('exc_info', True)
+        _log(logging.ERROR, msg, args, kwargs)
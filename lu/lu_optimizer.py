@@ -0,0 +1,380 @@
+import ast
+import hashlib
+import operator
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from lu_parser import allow_nesting, fix_locations, import_nodes
+from lu_functions import BUILTINS
+from FUNCTION import returns_value
+
+# Highest level accepted by `-O`; 0 leaves the parsed module untouched.
+OPTIMIZE_LEVELS = (0, 1, 2, 3)
+MEMOIZE_LEVEL = 3  # the level `--memoize` selects
+
+PLACEHOLDER = '#NEWLINE#'
+
+BINARY_OPERATORS: Dict[type, Callable] = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow,
+    ast.LShift: operator.lshift, ast.RShift: operator.rshift,
+    ast.BitOr: operator.or_, ast.BitXor: operator.xor, ast.BitAnd: operator.and_,
+}
+UNARY_OPERATORS: Dict[type, Callable] = {
+    ast.UAdd: operator.pos, ast.USub: operator.neg, ast.Not: operator.not_, ast.Invert: operator.invert,
+}
+COMPARE_OPERATORS: Dict[type, Callable] = {
+    ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.Lt: operator.lt,
+    ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge,
+}
+
+# Folded values larger than these stay as expressions, so `2 ** 100000` or
+# `"ab" * 10000` does not bloat the generated source.
+MAX_FOLDED_BITS = 256
+MAX_FOLDED_LENGTH = 256
+
+# Calls that cannot rebind the names an expression reads, including the runtime library's.
+PURE_CALLS = frozenset({'print', 'len', 'int', 'float', 'str', 'bool', 'abs', 'round', 'range'}) | BUILTINS
+
+# Calls whose result depends only on their arguments, and which have no effects.
+DETERMINISTIC_CALLS = frozenset({'len', 'int', 'float', 'str', 'bool', 'abs', 'round', 'range', 'min', 'max',
+                                 'LENGTH', 'SUBSTRING', 'UCASE', 'LCASE', 'MOD', 'DIV', 'ROUND'})
+# Deterministic calls returning a new immutable value whatever their arguments; min and max return an argument.
+IMMUTABLE_CALLS = DETERMINISTIC_CALLS - {'min', 'max'}
+
+def optimize(module: ast.Module, level: int = 1) -> ast.Module:
+    """
+    Run the optimization passes selected by `level` over a parsed module.
+
+    Level 1 drops the `'#NEWLINE#'` placeholder statements, folds constant
+    expressions, removes IF and WHILE branches whose condition is constant,
+    and removes repeated module-level imports. Level 2 also hoists
+    loop-invariant parts of WHILE conditions out of the loop. Level 3 also
+    memoizes pure functions. Every pass preserves the program's behavior;
+    the module is changed in place.
+    """
+    imports: List[Tuple[str, str]] = []
+    module = run_passes(module, level, imports)
+    if imports:
+        module.body = import_nodes(imports) + module.body
+        fix_locations(module)
+    return module
+
+def optimize_block(statements: List[ast.stmt], level: int) -> Tuple[List[Tuple[str, str]], List[ast.stmt]]:
+    """
+    Optimize one top-level block on its own, returning the imports the passes need and the statements.
+
+    For `lu_emit` and `lu_watch`, which put the imports of every block at
+    the head of the output themselves, ahead of the parser's imports. The
+    recursion limit is raised for the block first, as `lu_parser.parse`
+    does for a whole module.
+    """
+    imports: List[Tuple[str, str]] = []
+    module = ast.Module(body=statements, type_ignores=[])
+    allow_nesting(fix_locations(module))
+    module = run_passes(module, level, imports)
+    return imports, module.body
+
+def run_passes(module: ast.Module, level: int, imports: List[Tuple[str, str]]) -> ast.Module:
+    """Run the passes of `level`, adding the `(module, name)` imports they need to `imports`."""
+    if level <= 0:
+        return module
+    passes: List[ast.NodeTransformer] = [DropPlaceholders(), ConstantFolder(), DeadBranches()]
+    if level >= 2:
+        passes.append(LoopInvariants())
+    if level >= 3:
+        passes.append(Memoize(imports))
+    for transformer in passes:
+        module = transformer.visit(module)
+    module.body = dedupe_imports(module.body)
+    module = FillEmptyBodies().visit(module)
+    fix_locations(module)
+    return module
+
+def drop_placeholders(module: ast.Module) -> ast.Module:
+    """
+    Remove the blank-line placeholders from `module` in place, for unparsing.
+
+    A block holding only placeholders gets a `pass`, and a leading
+    placeholder can no longer be unparsed as a docstring.
+    """
+    return FillEmptyBodies().visit(DropPlaceholders().visit(module))
+
+class DropPlaceholders(ast.NodeTransformer):
+    """Remove the `'#NEWLINE#'` expression statements the parser keeps for blank lines."""
+    def visit_Expr(self, node: ast.Expr) -> Optional[ast.Expr]:
+        if isinstance(node.value, ast.Constant) and node.value.value == PLACEHOLDER:
+            return None
+        return node
+
+class ConstantFolder(ast.NodeTransformer):
+    """Evaluate operators whose operands are all constants."""
+    def visit_BinOp(self, node: ast.BinOp) -> ast.expr:
+        self.generic_visit(node)
+        if not (isinstance(node.left, ast.Constant) and isinstance(node.right, ast.Constant)):
+            return node
+        left, right = node.left.value, node.right.value
+        if isinstance(node.op, (ast.Pow, ast.LShift)) and isinstance(right, int) and abs(right) > MAX_FOLDED_BITS:
+            return node
+        if isinstance(node.op, ast.Mult) and (isinstance(left, str) or isinstance(right, str)):
+            return node  # repetition can grow without bound
+        return fold(node, BINARY_OPERATORS.get(type(node.op)), left, right)
+
+    def visit_UnaryOp(self, node: ast.UnaryOp) -> ast.expr:
+        self.generic_visit(node)
+        if not isinstance(node.operand, ast.Constant):
+            return node
+        return fold(node, UNARY_OPERATORS.get(type(node.op)), node.operand.value)
+
+    def visit_Compare(self, node: ast.Compare) -> ast.expr:
+        self.generic_visit(node)
+        if len(node.ops) != 1 or not all(isinstance(operand, ast.Constant) for operand in (node.left, *node.comparators)):
+            return node
+        return fold(node, COMPARE_OPERATORS.get(type(node.ops[0])), node.left.value, node.comparators[0].value)
+
+    def visit_BoolOp(self, node: ast.BoolOp) -> ast.expr:
+        """Drop leading operands that cannot decide the result, keeping `and`/`or` value semantics."""
+        self.generic_visit(node)
+        deciding = isinstance(node.op, ast.Or)  # the truth value that ends evaluation
+        values = list(node.values)
+        while len(values) > 1 and isinstance(values[0], ast.Constant):
+            if bool(values[0].value) == deciding:
+                return ast.copy_location(values[0], node)
+            values.pop(0)
+        if len(values) == 1:
+            return values[0]
+        node.values = values
+        return node
+
+def fold(node: ast.expr, function: Optional[Callable], *operands) -> ast.expr:
+    """Return `function(*operands)` as a constant in place of `node`, or `node` if it cannot be folded."""
+    if function is None or not all(isinstance(operand, (int, float, complex, str)) for operand in operands):
+        return node
+    try:
+        value = function(*operands)
+    except (ArithmeticError, TypeError, ValueError):
+        return node  # raise at run time, as the original would
+    if isinstance(value, int) and value.bit_length() > MAX_FOLDED_BITS:
+        return node
+    if isinstance(value, str) and len(value) > MAX_FOLDED_LENGTH:
+        return node
+    return ast.copy_location(ast.Constant(value=value), node)
+
+class DeadBranches(ast.NodeTransformer):
+    """Replace IF statements and expressions on a constant condition with the branch that runs."""
+    def visit_If(self, node: ast.If):
+        self.generic_visit(node)
+        if isinstance(node.test, ast.Constant):
+            return node.body if node.test.value else node.orelse
+        return node
+
+    def visit_IfExp(self, node: ast.IfExp) -> ast.expr:
+        self.generic_visit(node)
+        if isinstance(node.test, ast.Constant):
+            return node.body if node.test.value else node.orelse
+        return node
+
+    def visit_While(self, node: ast.While):
+        self.generic_visit(node)
+        if isinstance(node.test, ast.Constant) and not node.test.value:
+            return node.orelse
+        return node
+
+class LoopInvariants(ast.NodeTransformer):
+    """
+    Hoist the parts of a WHILE condition that no iteration can change.
+
+    Only the condition is considered, since it is evaluated at least once
+    however many times the body runs, and only arithmetic and comparisons
+    over names the loop never assigns are moved. A loop that calls anything
+    outside `PURE_CALLS`, or declares names global, is left alone, since
+    the call could rebind a name the condition reads. Operands after the
+    first of `and`/`or` are not hoisted, as they may never be evaluated.
+
+    Temporaries are named after the hoisted expression, not numbered, so
+    compiling a file in pieces (as `lu_watch` does) names them the same
+    way. Reusing a name is safe: equal invariant expressions have equal
+    values wherever they are assigned.
+    """
+    def visit_While(self, node: ast.While):
+        self.generic_visit(node)
+        assigned = assigned_names(node)
+        if assigned is None:
+            return node
+        hoisted: List[ast.stmt] = []
+        node.test = self.hoist(node.test, assigned, hoisted)
+        return hoisted + [node] if hoisted else node
+
+    def hoist(self, expr: ast.expr, assigned: Set[str], hoisted: List[ast.stmt]) -> ast.expr:
+        if not isinstance(expr, (ast.Name, ast.Constant)) and is_invariant(expr, assigned):
+            name = invariant_name(expr)
+            hoisted.append(ast.Assign(targets=[ast.Name(id=name, ctx=ast.Store())], value=expr))
+            return ast.Name(id=name, ctx=ast.Load())
+        if isinstance(expr, ast.BinOp):
+            expr.left = self.hoist(expr.left, assigned, hoisted)
+            expr.right = self.hoist(expr.right, assigned, hoisted)
+        elif isinstance(expr, ast.UnaryOp):
+            expr.operand = self.hoist(expr.operand, assigned, hoisted)
+        elif isinstance(expr, ast.Compare) and len(expr.ops) == 1:
+            expr.left = self.hoist(expr.left, assigned, hoisted)
+            expr.comparators = [self.hoist(expr.comparators[0], assigned, hoisted)]
+        elif isinstance(expr, ast.BoolOp):
+            expr.values[0] = self.hoist(expr.values[0], assigned, hoisted)
+        return expr
+
+def invariant_name(expr: ast.expr) -> str:
+    return '_lu_invariant_' + hashlib.blake2b(ast.dump(expr).encode(), digest_size=6).hexdigest()
+
+INVARIANT_NODES = (ast.BinOp, ast.UnaryOp, ast.Compare, ast.Name, ast.Constant,
+                   ast.operator, ast.unaryop, ast.cmpop, ast.expr_context)
+
+def is_invariant(expr: ast.expr, assigned: Set[str]) -> bool:
+    """Check if `expr` is arithmetic over constants and names outside `assigned`."""
+    for node in ast.walk(expr):
+        if not isinstance(node, INVARIANT_NODES):
+            return False
+        if isinstance(node, ast.Name) and node.id in assigned:
+            return False
+    return True
+
+class Memoize(ast.NodeTransformer):
+    """
+    Wrap each pure function in `lu_functions.memoize`, which caches its results.
+
+    A function is pure if its result depends only on its arguments: it
+    reads no names but its parameters and locals, assigns no array
+    element or record field (which may belong to the caller), and calls
+    only itself and `DETERMINISTIC_CALLS`, so no OUTPUT, INPUT, RANDOM or
+    file functions. Every value it returns must also be immutable (see
+    `returns_immutable`), or callers would share one cached array or
+    record. Each function is judged on its own, so one that calls
+    another of the program's functions is not memoized; the result is
+    then the same when `lu_emit` or `lu_watch` optimize one top-level
+    block at a time.
+    """
+    def __init__(self, imports: List[Tuple[str, str]]):
+        self.imports = imports
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> ast.FunctionDef:
+        self.generic_visit(node)
+        if not node.decorator_list and returns_value(node.body) and is_pure(node) and returns_immutable(node):
+            node.decorator_list = [ast.Name(id='memoize', ctx=ast.Load())]
+            if ('lu_functions', 'memoize') not in self.imports:
+                self.imports.append(('lu_functions', 'memoize'))
+        return node
+
+IMPURE_NODES = (ast.Global, ast.Nonlocal, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda,
+                ast.Import, ast.ImportFrom, ast.Delete, ast.Yield, ast.YieldFrom, ast.Await)
+
+def is_pure(function: ast.FunctionDef) -> bool:
+    """Check if `function`'s result depends only on its arguments, and calling it has no effects."""
+    nodes = [node for statement in function.body for node in ast.walk(statement)]
+    readable = {arg.arg for arg in function.args.args} | DETERMINISTIC_CALLS | {function.name}
+    readable.update(node.id for node in nodes if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store))
+    for node in nodes:
+        if isinstance(node, IMPURE_NODES):
+            return False
+        if isinstance(node, (ast.Subscript, ast.Attribute)) and not isinstance(node.ctx, ast.Load):
+            return False
+        if isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name) and node.func.id in readable):
+            return False
+        if isinstance(node, ast.Name) and node.id not in readable:
+            return False
+    return True
+
+def returns_immutable(function: ast.FunctionDef) -> bool:
+    """
+    Check if every value `function` returns is a number, string or boolean.
+
+    Returned values are built from constants, operators, calls to
+    `IMMUTABLE_CALLS` or to `function` itself, and names that are only ever
+    bound to such values. Parameters count as immutable, since a memoized
+    call with any other argument bypasses the cache.
+    """
+    nodes = [node for statement in function.body for node in ast.walk(statement)]
+    bindings: Dict[str, List[ast.expr]] = {arg.arg: [] for arg in function.args.args}
+    mutable: Set[str] = set()
+
+    def bind(target: ast.expr, value: ast.expr):
+        if isinstance(target, ast.Name):
+            bindings.setdefault(target.id, []).append(value)
+        else:
+            mutable.update(node.id for node in ast.walk(target) if isinstance(node, ast.Name))
+
+    for node in nodes:
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                bind(target, node.value)
+        elif isinstance(node, (ast.AugAssign, ast.AnnAssign, ast.NamedExpr)) and node.value is not None:
+            bind(node.target, node.value)
+        elif isinstance(node, (ast.For, ast.comprehension)):
+            # The elements of a range or a string are immutable, like the sequence.
+            bind(node.target, node.iter)
+
+    # Drop names bound to anything but an immutable value until none are left to drop.
+    immutable = set(bindings) - mutable
+    changed = True
+    while changed:
+        changed = False
+        for name in list(immutable):
+            if not all(is_immutable(value, immutable, function.name) for value in bindings[name]):
+                immutable.discard(name)
+                changed = True
+    return all(is_immutable(node.value, immutable, function.name)
+               for node in nodes if isinstance(node, ast.Return) and node.value is not None)
+
+def is_immutable(node: ast.expr, names: Set[str], function: str) -> bool:
+    """Check if `node` evaluates to a number, string or boolean, given the immutable `names`, inside `function`."""
+    if isinstance(node, (ast.Constant, ast.Compare, ast.JoinedStr)):
+        return True
+    if isinstance(node, ast.Name):
+        return node.id in names
+    if isinstance(node, ast.BinOp):
+        return is_immutable(node.left, names, function) and is_immutable(node.right, names, function)
+    if isinstance(node, ast.UnaryOp):
+        return is_immutable(node.operand, names, function)
+    if isinstance(node, ast.BoolOp):
+        return all(is_immutable(value, names, function) for value in node.values)
+    if isinstance(node, ast.IfExp):
+        return is_immutable(node.body, names, function) and is_immutable(node.orelse, names, function)
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        if node.func.id in IMMUTABLE_CALLS or node.func.id == function:
+            return True
+        if node.func.id in ('min', 'max'):
+            return all(is_immutable(arg, names, function) for arg in node.args)
+    return False
+
+def assigned_names(loop: ast.stmt) -> Optional[Set[str]]:
+    """Return every name `loop` may bind, or None if it could rebind names it does not mention."""
+    names = set()
+    for node in ast.walk(loop):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split('.')[0] for alias in node.names)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            return None
+        elif isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name) and node.func.id in PURE_CALLS):
+            return None
+    return names
+
+def dedupe_imports(body: List[ast.stmt]) -> List[ast.stmt]:
+    """Drop module-level imports identical to an earlier one."""
+    seen = set()
+    kept = []
+    for statement in body:
+        if isinstance(statement, (ast.Import, ast.ImportFrom)):
+            key = ast.dump(statement)
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(statement)
+    return kept
+
+class FillEmptyBodies(ast.NodeTransformer):
+    """Put a `pass` into any block that the other passes emptied."""
+    def generic_visit(self, node: ast.AST) -> ast.AST:
+        super().generic_visit(node)
+        if isinstance(node, ast.stmt) and getattr(node, 'body', None) == []:
+            node.body = [ast.Pass()]
+        return node
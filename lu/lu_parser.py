@@ -1,99 +1,418 @@
-from typing import List, Optional
-from lu_token import Token
+import os
+import sys
+import threading
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+from lu_token import Token, TokenBuffer, TokenWindow, EOF, WHITESPACE, IDENTIFIER, KEYWORD, KINDS
 import ast
-from lu_errors import SyntaxError, NameError, RuntimeError
-from expr import Expr
+from lu_errors import Diagnostics, Error, SyntaxError
+from expr import Expr, BLOCK_END_KEYWORDS
 from TYPE import keyword_type
+from FUNCTION import keyword_function, ROUTINE_ENDS, ROUTINE_END_KEYWORDS
 from elements import elements
 
-class Parser(Expr, keyword_type, elements):
-    def __init__(self, tokens: List[Token]) -> None:
-        self.imports: List[str] = []
+class Parser(Expr, keyword_type, keyword_function, elements):
+    def __init__(self, tokens: Union[TokenBuffer, TokenWindow, List[Token]], array_backend: str = 'list',
+                 recover: bool = False) -> None:
+        """
+        `tokens` is a `TokenBuffer`, a token list, or a `TokenWindow` over a lazy token stream.
+        `array_backend` selects the storage emitted for DECLARE ARRAY (see `lu_functions.ARRAY_BACKENDS`).
+        With `recover`, errors are collected in `diagnostics` and parsing resumes at the next statement.
+        """
+        self.imports: List[Tuple[str, str]] = []
         self.datatypes = ["INTEGER", "CHAR", "STRING", "DATE", "REAL", "BOOLEAN"]
+        self.array_backend = array_backend
+        self.recover = recover
+        self.diagnostics: List[Error] = []
+        self.routines: List[str] = []  # FUNCTION or PROCEDURE for each routine being parsed, innermost last
+        if isinstance(tokens, list):
+            tokens = TokenBuffer.from_tokens(tokens)
         self.tokens = tokens
         self.current = 0
-        self.indent = 0
+        # Bound once; the peek methods run for nearly every token.
+        self.kinds = tokens.kinds
+        self.value_at = tokens.value
+        self.release = tokens.release if isinstance(tokens, TokenWindow) else None
 
-    def parse_statement(self) -> ast.AST:
+    def parse_statement(self) -> List[ast.stmt]:
         """Parse a single statement."""
-        return ast.parse(self.get_expr()).body
+        return self.get_expr()
+
+    def parse_top_level(self) -> List[ast.stmt]:
+        """Parse a top-level statement and the line end after it."""
+        start = self.current
+        statements = self.parse_statement()
+        if self.current == start and not self.is_at_statement_end():
+            raise SyntaxError(f"Unexpected token: {self.peek().value}", self.peek())
+        self.end_statement()
+        return statements
+
+    def parse_line(self) -> List[ast.stmt]:
+        """Parse a statement inside a block or routine and the line end after it."""
+        statements = self.get_expr()
+        self.end_statement()
+        return statements
+
+    def end_statement(self):
+        """Consume the line end after a statement, which must come next unless the file ends."""
+        self.check_statement_end()
+        if self.is_at_line_end():
+            self.advance()
+
+    def check_statement_end(self):
+        """
+        Check that a statement ends at the current token.
+
+        Anything else left on the line is an error; in recovery mode it is
+        recorded and skipped, up to but not including the line end.
+        """
+        if self.is_at_statement_end():
+            return
+        self.report(SyntaxError(f"Unexpected {self.peek_value()!r} after the end of a statement", self.peek(),
+                                expected="end of line"))
+        while not self.is_at_statement_end():
+            self.advance()
 
     def peek(self) -> Token:
         """Return the current token that is being parsed."""
         return self.tokens[self.current]
 
+    def peek_kind(self) -> int:
+        """Return the kind of the current token, without building a `Token`."""
+        return self.kinds[self.current]
+
+    def peek_value(self) -> str:
+        """Return the value of the current token, without building a `Token`."""
+        return self.value_at(self.current)
+
     def peek_relative(self, n: int) -> Token:
-        """Return the token `n` positions from the current token."""
+        """Return the token `n` positions from the current token, or an EOF token if that is outside the input."""
         k = self.current + n
-        if k < 0 or k >= len(self.tokens):
-            SyntaxError(f"List index out of range: {k}")
-            return Token(type="EOF", value="", line=self.tokens[-1].line)
-        return self.tokens[k]
-
-    def advance(self) -> Token:
-        """Increment and return the previous token."""
-        if self.is_at_file_end():
-            return self.peek()  # Return current EOF token without advancing
+        try:
+            if k < 0:
+                raise IndexError(k)
+            return self.tokens[k]
+        except IndexError:
+            return Token(type="EOF", value="", line=self.peek().line, column=self.peek().column)
+
+    def advance(self) -> str:
+        """Increment and return the previous token's value."""
+        if self.kinds[self.current] == EOF:
+            return ''  # Stay on the EOF token
         self.current += 1
-        return self.tokens[self.current - 1]
+        if self.release is not None:
+            self.release(self.current)
+        return self.value_at(self.current - 1)
 
     def is_at_file_end(self, n: int = None) -> bool:
         """Check if the current or `n`-th token is EOF."""
-        return (self.peek_relative(n).type == 'EOF') if n is not None else self.peek().type == 'EOF'
+        return (self.peek_relative(n).type == 'EOF') if n is not None else self.peek_kind() == EOF
 
     def is_at_line_end(self, n: int = None) -> bool:
         """Check if the current or `n`-th token is a newline or semicolon."""
-        token = self.peek_relative(n) if n is not None else self.peek()
-        return token.value in {'\n', ';'} or (token.type == 'WHITESPACE' and '\n' in token.value)
+        if n is not None:
+            return is_line_end_value(self.peek_relative(n).value)
+        return self.peek_kind() == WHITESPACE or self.peek_value() == ';'
+
+    def is_at_statement_end(self, n: int = None) -> bool:
+        """Check if the current or `n`-th token ends a statement (line end or EOF)."""
+        return self.is_at_line_end(n) or self.is_at_file_end(n)
 
-    def get_expr(self, till_types: Optional[List[str]] = None) -> str:
+    def require_import(self, module: str, name: str):
+        """Record a `from module import name` needed by the generated code."""
+        if (module, name) not in self.imports:
+            self.imports.append((module, name))
+
+    def get_expr(self, till_types: Optional[List[str]] = None) -> List[ast.stmt]:
         """Retrieve the next expression from tokens."""
         if till_types is None:
             till_types = []
 
-        current_token = self.peek()
-        if current_token.value in ('print', 'PRINT', 'OUTPUT'):
+        value = self.peek_value()
+        if value in ('print', 'PRINT', 'OUTPUT'):
             return self.parse_print()
-        elif current_token.value in ('IF', 'ELSE'):
+        elif value in ('IF', 'ELSE'):
             return self.parse_conditions()
-        elif current_token.value == 'TYPE':
+        elif value in ('WHILE', 'FOR', 'REPEAT'):
+            return self.parse_block()
+        elif value == 'INPUT':
+            return self.parse_input()
+        elif value in ROUTINE_ENDS:
+            return self.parse_routine()
+        elif value == 'RETURN':
+            return self.parse_return()
+        elif value == 'CALL':
+            return self.parse_call()
+        elif value in ROUTINE_END_KEYWORDS:
+            raise SyntaxError(f"{value} without a matching {value[3:]}", self.peek())
+        elif value == 'TYPE':
             return self.parse_type()
-        elif current_token.value == "DECLARE":
+        elif value == "DECLARE":
             return self.parse_declare()
-        elif current_token.type == 'IDENTIFIER':
+        elif self.peek_kind() == IDENTIFIER:
             return self.parse_identifier()
-        elif current_token.type == 'ATTRIBUTE' and self.peek_relative(-1).type in ('ATTRIBUTE', 'IDENTIFIER'):
-            return self.parse_attribute()
-        elif current_token.value.lower() in ('endif', 'else', '\t'):
-            return ''
-        elif current_token.value == '\n' and current_token.column == 1:
-            return "'#NEWLINE#'"
+        elif value.lower() in ('endif', 'else', '\t'):
+            return []
+        elif value == '\n' and self.peek().column == 1:
+            return [ast.Expr(value=ast.Constant(value='#NEWLINE#'))]
+        elif self.is_at_line_end():
+            return []  # blank or comment-only line
         else:
-            raise SyntaxError(f"Unexpected token: {current_token.value}, {current_token}")
+            raise SyntaxError(f"Unexpected token: {value}", self.peek())
+
+    def parse_recovering(self, parse: Callable[[], List[ast.stmt]]) -> List[ast.stmt]:
+        """
+        Run `parse` for one statement.
+
+        In recovery mode an `Error` it raises is added to `diagnostics`,
+        the parser skips to the next statement, and no statements are
+        returned; otherwise the error propagates.
+        """
+        start = self.current
+        try:
+            return parse()
+        except Error as e:
+            if not self.recover:
+                raise
+            self.record_error(e)
+            self.synchronize(start)
+            return []
+
+    def record_error(self, error: Error):
+        """Add `error` to the diagnostics, with the source it points into."""
+        if error.source is None:
+            error.source = getattr(self.tokens, 'line_index', None)
+        self.diagnostics.append(error)
+
+    def synchronize(self, start: int):
+        """
+        Skip the rest of a broken statement that began at `start`.
+
+        Stops after the next line end, or on a block terminator (ELSE, ENDIF,
+        ENDWHILE, NEXT, UNTIL, ENDTYPE, ENDFUNCTION, ENDPROCEDURE) or EOF so the enclosing block can still
+        be closed. At least one token is always skipped, so recovery cannot stall.
+        """
+        if self.current == start:
+            self.advance()
+        while not self.is_at_file_end():
+            if self.peek_value() in SYNC_TOKENS:
+                return
+            if self.is_at_line_end():
+                self.advance()
+                return
+            self.advance()
+
+# Chosen by timing parses of the mixed lu_bench workloads. Starting a pool
+# costs about 12 ms, and the parent pickles every token chunk out and
+# unpickles every parsed tree back by itself, which takes 20-75% as long as
+# parsing serially. Only the rest of the work is spread over the workers, so
+# 4 workers first beat a serial parse somewhere between 15k and 45k tokens,
+# and 2 workers only past about 100k; below that the pool is pure overhead.
+PARALLEL_THRESHOLD = 50_000
+CHUNKS_PER_WORKER = 4
+
+BLOCK_OPENERS = frozenset({'IF', 'WHILE', 'FOR', 'REPEAT', 'FUNCTION', 'PROCEDURE'})
+BLOCK_CLOSERS = frozenset({'ENDIF', 'ENDWHILE', 'NEXT', 'UNTIL', 'ENDTYPE', 'ENDFUNCTION', 'ENDPROCEDURE'})
+# Where recovery stops skipping.
+SYNC_TOKENS = frozenset({'ELSE', 'ENDIF', 'ENDWHILE', 'NEXT', 'UNTIL', 'ENDTYPE', 'ENDFUNCTION', 'ENDPROCEDURE'})
+
+
+def is_line_end_value(value: str) -> bool:
+    """Check if a token with `value` terminates a line, mirroring `Parser.is_at_line_end`."""
+    # Newline runs are the only tokens starting with a newline; strings start with a quote.
+    return value == ';' or value[:1] == '\n'
+
+
+def value_getter(tokens) -> Callable[[int], str]:
+    """Return a function giving the value of the token at an index of `tokens`."""
+    if isinstance(tokens, (TokenBuffer, TokenWindow)):
+        return tokens.value
+    return lambda index: tokens[index].value
+
+
+def kind_getter(tokens) -> Callable[[int], int]:
+    """Return a function giving the kind of the token at an index of `tokens`."""
+    if isinstance(tokens, (TokenBuffer, TokenWindow)):
+        return tokens.kinds.__getitem__
+    return lambda index: KINDS[tokens[index].type]
+
+
+def iter_statement_starts(tokens: List[Token], start: int = 0) -> Iterator[int]:
+    """
+    Yield the indices after `start` at which top-level statements begin.
+
+    A boundary is the token after a line end that sits outside any
+    IF, loop, routine or TYPE/ENDTYPE block and outside any open bracket, i.e. a
+    point where the single-threaded parser begins a fresh statement.
+    `start` must itself be such a point.
+
+    Like the parser, only a word that starts a statement opens or closes a
+    block, so `OPENFILE f FOR READ`, the IF of ELSE IF, and a variable
+    named ENDTYPE leave the depth alone.
+    """
+    depth = 0
+    brackets = 0
+    value_at = value_getter(tokens)
+    kind_at = kind_getter(tokens)
+    last = len(tokens) - 1  # the trailing EOF token never starts a statement
+    at_start = True
+    for i in range(start, last):
+        value = value_at(i)
+        if is_line_end_value(value):
+            if depth == 0 and brackets == 0 and i + 1 < last:
+                yield i + 1
+            at_start = brackets == 0
+            continue
+        if at_start and kind_at(i) in (KEYWORD, IDENTIFIER):
+            if value in BLOCK_OPENERS:
+                depth += 1
+            elif value == 'TYPE' and i + 2 < len(tokens) and is_line_end_value(value_at(i + 2)):
+                depth += 1  # record type; enumerated types fit on one line
+            elif value in BLOCK_CLOSERS or value.upper() in BLOCK_END_KEYWORDS:
+                depth = max(depth - 1, 0)
+        if value in ('(', '['):
+            brackets += 1
+        elif value in (')', ']'):
+            brackets = max(brackets - 1, 0)
+        at_start = False
+
+
+def split_statements(tokens: TokenBuffer) -> List[int]:
+    """Return the indices at which top-level statements start."""
+    return [0] + list(iter_statement_starts(tokens))
 
-def parse(tokens: List[Token]) -> ast.Module:
+
+def chunk_tokens(tokens: TokenBuffer, chunks: int) -> List[TokenBuffer]:
+    """Group top-level statements into at most `chunks` EOF-terminated token buffers."""
+    starts = split_statements(tokens)
+    target = max(len(tokens) // max(chunks, 1), 1)
+
+    bounds = [0]
+    for start in starts[1:]:
+        if start - bounds[-1] >= target:
+            bounds.append(start)
+    bounds.append(len(tokens) - 1)
+
+    return [tokens.chunk(lo, hi) for lo, hi in zip(bounds, bounds[1:])]
+
+
+def process_token_chunk(chunk: Union[TokenBuffer, List[Token]], array_backend: str = 'list',
+                        recover: bool = False) -> Tuple[List[Tuple[str, str]], List[ast.stmt], List[Error]]:
+    """
+    Parse one chunk of tokens, returning its imports, statements and diagnostics.
+
+    Without `recover` the first error is raised and the diagnostics are empty.
+    """
+    parser = Parser(chunk, array_backend, recover)
+    statements = []
+    try:
+        while not parser.is_at_file_end():
+            statements.extend(parser.parse_recovering(parser.parse_top_level))
+    except Error as e:
+        if e.source is None:
+            e.source = getattr(parser.tokens, 'line_index', None)
+        raise
+    # A worker pickles the statements back; measure the real tree, since an
+    # ELSE IF chain nests in `orelse` however flat its source looks.
+    allow_nesting(fix_locations(ast.Module(body=statements, type_ignores=[])))
+    return parser.imports, statements, parser.diagnostics
+
+
+def parse(tokens: Iterable[Token], threshold: int = PARALLEL_THRESHOLD, workers: Optional[int] = None,
+          array_backend: str = 'list', recover: bool = False) -> ast.Module:
     """
     Parse tokens using parallel processing for large inputs;
     fall back to single-threaded parsing for smaller inputs.
+
+    Inputs longer than `threshold` tokens are split at top-level statement
+    boundaries and parsed across `workers` processes (default: CPU count).
+    The chunk results are merged in source order, so the module is
+    identical to a single-threaded parse.
+
+    A lazy token iterator (see `lu_lexer.tokenize_file`) is parsed
+    single-threaded through a bounded `TokenWindow`.
+
+    With `recover`, parsing continues past errors and all of them are
+    raised together at the end as one `Diagnostics`.
     """
-    def process_token_chunk(chunk):
-        parser = Parser(chunk)
-        statements = []
-        while not parser.is_at_file_end():
-            statements.append(parser.parse_statement())
-            if parser.is_at_line_end():
-                parser.advance()
-        return statements
+    if isinstance(tokens, Iterator):
+        tokens = TokenWindow(tokens)
+    elif isinstance(tokens, list):
+        tokens = TokenBuffer.from_tokens(tokens)
+
+    workers = workers or os.cpu_count() or 1
+    chunks = [tokens]
+    if isinstance(tokens, TokenBuffer) and len(tokens) > threshold and workers > 1:
+        chunks = chunk_tokens(tokens, workers * CHUNKS_PER_WORKER)
 
-    if len(tokens) > 1000:
-        pass  # Parallel processing not implemented, fallback to single-threaded
+    if len(chunks) > 1:
+        # Imported here; the process pool machinery is slow to import and most inputs never need it.
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            results = list(pool.map(process_token_chunk, chunks, [array_backend] * len(chunks),
+                                    [recover] * len(chunks)))
     else:
-        parser = Parser(tokens)
-        statements = []
-        while not parser.is_at_file_end():
-            statements.append(parser.parse_statement())
-            if parser.is_at_line_end():
-                print(parser.advance())
-        
-        imports = [ast.parse(i).body for i in parser.imports]
-        return ast.Module(body=imports + statements, type_ignores=[])
+        results = [process_token_chunk(tokens, array_backend, recover)]
+
+    imports: List[Tuple[str, str]] = []
+    statements = []
+    errors: List[Error] = []
+    for chunk_imports, chunk_statements, chunk_errors in results:
+        imports.extend(chunk_imports)
+        statements.extend(chunk_statements)
+        errors.extend(chunk_errors)
+    if errors:
+        raise Diagnostics(errors)
+
+    module = ast.Module(body=import_nodes(imports) + statements, type_ignores=[])
+    allow_nesting(fix_locations(module))
+    return module
+
+
+def import_nodes(imports: Iterable[Tuple[str, str]]) -> List[ast.stmt]:
+    """Build the deduplicated `from module import name` statements for the parser's `imports`."""
+    return [ast.ImportFrom(module=module, names=[ast.alias(name=name)], level=0) for module, name in dict.fromkeys(imports)]
+
+
+def fix_locations(node: ast.AST) -> int:
+    """
+    Give every node without a location line 1, column 0, and return the depth of the tree.
+
+    Does what `ast.fix_missing_locations` does for the parser's location-free
+    trees, but walks them with an explicit stack, so deeply nested blocks do
+    not hit the recursion limit.
+    """
+    depth = 0
+    stack = [(node, 1)]
+    while stack:
+        node, level = stack.pop()
+        if level > depth:
+            depth = level
+        if 'lineno' in node._attributes:
+            if not hasattr(node, 'lineno'):
+                node.lineno = node.end_lineno = 1
+                node.col_offset = node.end_col_offset = 0
+            elif getattr(node, 'end_lineno', None) is None:
+                node.end_lineno, node.end_col_offset = node.lineno, node.col_offset
+        stack.extend((child, level + 1) for child in ast.iter_child_nodes(node))
+    return depth
+
+
+# Frames used per level of nesting by the deepest walker of the tree: pickling
+# takes 5 (the node, its field dict and the field's list), ast.unparse 4,
+# NodeTransformer passes 3 and compile() 1. One more is kept as a margin.
+FRAMES_PER_LEVEL = 6
+_recursion_limit_lock = threading.Lock()
+
+def allow_nesting(depth: int):
+    """
+    Raise the recursion limit, if needed, for a tree `depth` levels deep.
+
+    The parser itself does not recurse per block, but the standard library
+    code that walks its output does. The limit only ever grows, so
+    concurrent compiles cannot lower it under each other.
+    """
+    needed = depth * FRAMES_PER_LEVEL + 1000
+    if needed > sys.getrecursionlimit():
+        with _recursion_limit_lock:
+            if needed > sys.getrecursionlimit():
+                sys.setrecursionlimit(needed)
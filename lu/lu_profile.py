@@ -0,0 +1,99 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional
+
+if TYPE_CHECKING:
+    import cProfile
+
+class Profiler:
+    """
+    Per-phase instrumentation for a compile.
+
+    Each `phase` records wall and CPU time and, when `trace_memory` is set,
+    the peak memory allocated while it ran (phases run in worker processes,
+    such as parallel parsing, are not traced). Tracing slows the traced
+    code several times over, so it is off by default and the reports say
+    when the times include it. Counters such as tokens and
+    statements are attached with `count`. Callbacks registered with
+    `subscribe` receive `(phase, stats)` as soon as each phase finishes.
+    Repeated phases accumulate time and keep the largest peak.
+    Phases named in `cprofile_phases` also run under cProfile.
+    """
+    def __init__(self, trace_memory: bool = False, cprofile_phases: Iterable[str] = ()):
+        self.trace_memory = trace_memory
+        self.cprofile_phases = set(cprofile_phases)
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self.counts: Dict[str, int] = {}
+        self.subscribers: List[Callable[[str, Dict[str, float]], None]] = []
+        self.cprofile: Optional['cProfile.Profile'] = None
+
+    def subscribe(self, callback: Callable[[str, Dict[str, float]], None]):
+        self.subscribers.append(callback)
+
+    @contextmanager
+    def phase(self, name: str):
+        tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        if name in self.cprofile_phases:
+            if self.cprofile is None:
+                import cProfile
+                self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            stats = {
+                'wall_seconds': time.perf_counter() - wall,
+                'cpu_seconds': time.process_time() - cpu,
+            }
+            if name in self.cprofile_phases:
+                self.cprofile.disable()
+            if self.trace_memory:
+                stats['peak_bytes'] = max(tracemalloc.get_traced_memory()[1] - baseline, 0)
+            if tracing:
+                tracemalloc.stop()
+            previous = self.phases.get(name, {})
+            self.phases[name] = {key: max(value, previous.get(key, 0)) if key == 'peak_bytes' else value + previous.get(key, 0)
+                                 for key, value in stats.items()}
+            for callback in self.subscribers:
+                callback(name, stats)
+
+    def count(self, name: str, value: int):
+        self.counts[name] = value
+
+    def dump_cprofile(self, filename: str) -> bool:
+        """Write the collected cProfile data for `pstats`/snakeviz, returning False if no profiled phase ran."""
+        if self.cprofile is None:
+            return False
+        self.cprofile.dump_stats(filename)
+        return True
+
+    def to_dict(self) -> dict:
+        return {'phases': self.phases, 'counts': self.counts, 'memory_traced': self.trace_memory}
+
+    def to_json(self) -> str:
+        import json
+        return json.dumps(self.to_dict(), indent=2)
+
+    def table(self) -> str:
+        lines = [f"{'phase':<10}{'wall ms':>12}{'cpu ms':>12}{'peak KiB':>12}"]
+        for name, stats in self.phases.items():
+            peak = f"{stats['peak_bytes'] / 1024:.1f}" if 'peak_bytes' in stats else '-'
+            lines.append(f"{name:<10}{stats['wall_seconds'] * 1000:>12.2f}{stats['cpu_seconds'] * 1000:>12.2f}{peak:>12}")
+        total = sum(stats['wall_seconds'] for stats in self.phases.values())
+        lines.append(f"{'total':<10}{total * 1000:>12.2f}")
+        for name, value in self.counts.items():
+            lines.append(f"{name}: {value}")
+        if self.trace_memory:
+            lines.append("times include tracemalloc overhead; profile without --profile-memory for accurate times")
+        return '\n'.join(lines)
+
+@contextmanager
+def no_phase(name: str):
+    yield
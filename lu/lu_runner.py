@@ -0,0 +1,284 @@
+"""
+Run many Lu programs in parallel, each under CPU, memory, time and output limits.
+
+Run `python lu/lu_runner.py submissions/ --cpu-limit 2 --memory-limit 256`
+to compile and execute every .lu file. A program's INPUT reads from the
+`.in` file next to it, when there is one. Each job reports its status,
+captured stdout/stderr and timings. The limits use `resource` and
+signals, so the runner needs a Unix system.
+"""
+import argparse
+import builtins
+import io
+import json
+import os
+import signal
+import sys
+import time
+import traceback
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, NamedTuple, Optional
+from lu_errors import Error
+from lu_build import expand_inputs
+from lu_compiler import compile_source
+from lu_functions import reset_runtime
+
+DEFAULT_CPU_LIMIT = 5.0  # seconds of CPU time per job
+DEFAULT_MEMORY_LIMIT = 512  # MiB of address space per worker process
+DEFAULT_OUTPUT_LIMIT = 1 << 20  # characters of stdout/stderr kept per job
+DEFAULT_TASKS_PER_CHILD = 100  # jobs a worker runs before it is replaced
+CPU_GRACE = 5  # extra CPU seconds before a worker that ignores SIGXCPU is killed
+INPUT_SUFFIX = '.in'
+
+class Limits(NamedTuple):
+    cpu: Optional[float] = DEFAULT_CPU_LIMIT  # CPU seconds per job (a profiling timer, backed by RLIMIT_CPU)
+    memory: Optional[int] = DEFAULT_MEMORY_LIMIT * 1024 * 1024  # bytes of address space per worker (RLIMIT_AS)
+    wall: Optional[float] = None  # wall-clock seconds per job, e.g. for programs that sleep
+    output: int = DEFAULT_OUTPUT_LIMIT  # characters of stdout and of stderr per job
+
+class RunJob(NamedTuple):
+    name: str  # reported with the result, and the filename of the code object
+    source: str  # Lu source text
+    stdin: str = ''  # text read by INPUT
+
+class RunResult(NamedTuple):
+    name: str
+    status: str  # 'ok', 'error', 'compile_error', 'cpu_limit', 'memory_limit', 'timeout', 'output_limit' or 'crashed'
+    stdout: str
+    stderr: str
+    compile_seconds: float
+    run_seconds: float
+    cpu_seconds: float
+
+# Raised in the job by the limit signals. They derive from BaseException so
+# that a program cannot swallow them with a broad `except Exception`.
+class CPULimitExceeded(BaseException):
+    pass
+
+class WallLimitExceeded(BaseException):
+    pass
+
+class OutputLimitExceeded(BaseException):
+    pass
+
+class CappedOutput(io.StringIO):
+    """A captured output stream that stops the job once it holds `limit` characters."""
+    def __init__(self, limit: int):
+        super().__init__()
+        self.limit = limit
+
+    def write(self, text: str) -> int:
+        if self.tell() + len(text) > self.limit:
+            super().write(text[:max(self.limit - self.tell(), 0)])
+            raise OutputLimitExceeded()
+        return super().write(text)
+
+def _raise_cpu_limit(signum, frame):
+    if _limits_armed:
+        raise CPULimitExceeded()
+
+def _raise_wall_limit(signum, frame):
+    if _limits_armed:
+        raise WallLimitExceeded()
+
+_limits_armed = False  # set while a job runs, so a late timer signal cannot escape into the worker's own code
+
+def init_worker(limits: Limits, tasks_per_child: int):
+    """
+    Apply the per-process limits to a new worker.
+
+    Each job's CPU limit is a profiling timer (see `run_job`), which the
+    program sees as an exception. RLIMIT_CPU only backs it up: it is set
+    once to what all of this worker's jobs may use, and kills a worker
+    stuck where the timer's signal cannot be handled.
+    """
+    import resource
+    signal.signal(signal.SIGPROF, _raise_cpu_limit)
+    signal.signal(signal.SIGXCPU, _raise_cpu_limit)
+    signal.signal(signal.SIGALRM, _raise_wall_limit)
+    if limits.cpu is not None:
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        budget = int(tasks_per_child * (limits.cpu + 1)) + CPU_GRACE
+        if hard == resource.RLIM_INFINITY or budget < hard:
+            resource.setrlimit(resource.RLIMIT_CPU, (budget, budget))
+    if limits.memory is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (limits.memory, limits.memory))
+
+def run_job(job: RunJob, limits: Limits) -> RunResult:
+    """Compile and run one job in this worker, returning how it ended."""
+    global _limits_armed
+
+    stdout, stderr = CappedOutput(limits.output), CappedOutput(limits.output)
+    streams = sys.stdin, sys.stdout, sys.stderr
+    status = 'ok'
+    compile_seconds = run_seconds = 0.0
+    cpu_start = time.process_time()
+    _limits_armed = True
+    if limits.cpu is not None:
+        signal.setitimer(signal.ITIMER_PROF, limits.cpu)
+    if limits.wall is not None:
+        signal.setitimer(signal.ITIMER_REAL, limits.wall)
+    try:
+        start = time.perf_counter()
+        try:
+            code = compile_source(job.source, filename=job.name)
+        except Error as e:
+            status = 'compile_error'
+            stderr.write(e.full_message + '\n')
+            code = None
+        compile_seconds = time.perf_counter() - start
+
+        if code is not None:
+            start = time.perf_counter()
+            sys.stdin, sys.stdout, sys.stderr = io.StringIO(job.stdin), stdout, stderr
+            try:
+                exec(code, {'__name__': '__main__', '__builtins__': builtins})
+            except SystemExit as e:
+                if e.code not in (None, 0):
+                    status = 'error'
+            except (CPULimitExceeded, WallLimitExceeded, OutputLimitExceeded, MemoryError):
+                raise
+            except BaseException as e:
+                status = 'error'
+                traceback.print_exception(e.with_traceback(e.__traceback__.tb_next), file=stderr)
+            finally:
+                sys.stdin, sys.stdout, sys.stderr = streams
+                run_seconds = time.perf_counter() - start
+    except CPULimitExceeded:
+        status = 'cpu_limit'
+    except WallLimitExceeded:
+        status = 'timeout'
+    except OutputLimitExceeded:
+        status = 'output_limit'
+    except MemoryError:
+        status = 'memory_limit'
+    finally:
+        _limits_armed = False
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        sys.stdin, sys.stdout, sys.stderr = streams
+        reset_runtime()  # the next job in this worker starts with no files open or caches kept
+    return RunResult(job.name, status, stdout.getvalue(), stderr.getvalue(), compile_seconds, run_seconds,
+                     time.process_time() - cpu_start)
+
+def run_jobs(jobs: List[RunJob], workers: Optional[int] = None, limits: Limits = Limits(),
+             tasks_per_child: int = DEFAULT_TASKS_PER_CHILD) -> List[RunResult]:
+    """
+    Run `jobs` across a pool of `workers` processes (default: CPU count), returning results in job order.
+
+    Workers are replaced after `tasks_per_child` jobs, so leaks and a
+    grown address space do not carry over. If a worker dies, which breaks
+    the pool, the jobs that were in flight are rerun one at a time in
+    their own process, and the one that kills its process again is
+    reported as 'crashed'; the rest continue on a fresh pool.
+    """
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+    results: List[Optional[RunResult]] = [None] * len(jobs)
+    queue = deque(range(len(jobs)))
+    while queue:
+        for index in run_window(jobs, queue, results, workers, limits, tasks_per_child):
+            results[index] = run_isolated(jobs[index], limits)
+    return results
+
+def run_window(jobs: List[RunJob], queue: deque, results: List[Optional[RunResult]], workers: int, limits: Limits,
+               tasks_per_child: int) -> List[int]:
+    """
+    Run queued jobs on a fresh pool, keeping at most two per worker in flight.
+
+    Returns the jobs that were in flight if the pool broke, or nothing once the queue is done.
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(limits, tasks_per_child),
+                             max_tasks_per_child=tasks_per_child) as pool:
+        running: Dict = {}
+        while queue or running:
+            while queue and len(running) < 2 * workers:
+                index = queue.popleft()
+                running[pool.submit(run_job, jobs[index], limits)] = index
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                try:
+                    results[running[future]] = future.result()
+                    del running[future]
+                except BrokenProcessPool:
+                    broken = True
+            if broken:
+                return list(running.values())
+    return []
+
+def run_isolated(job: RunJob, limits: Limits) -> RunResult:
+    """Run `job` alone in a new worker, reporting it as 'crashed' if the worker dies."""
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=1, initializer=init_worker, initargs=(limits, 1),
+                             max_tasks_per_child=1) as pool:
+        try:
+            return pool.submit(run_job, job, limits).result()
+        except BrokenProcessPool:
+            return RunResult(job.name, 'crashed', '', 'worker process died', 0.0, time.perf_counter() - start, 0.0)
+
+def jobs_for_inputs(patterns: List[str], stdin: Optional[str] = None) -> List[RunJob]:
+    """Build a job per .lu file matched by `patterns`, with `stdin` or the file's `.in` fixture as input."""
+    jobs = []
+    for input_file, _ in expand_inputs(patterns):
+        with open(input_file, 'r', encoding='utf-8') as infile:
+            source = infile.read()
+        text = stdin
+        if text is None:
+            fixture = os.path.splitext(input_file)[0] + INPUT_SUFFIX
+            text = ''
+            if os.path.exists(fixture):
+                with open(fixture, 'r', encoding='utf-8') as infile:
+                    text = infile.read()
+        jobs.append(RunJob(input_file, source, text))
+    return jobs
+
+def print_results(results: List[RunResult]):
+    width = max(len(result.name) for result in results)
+    print(f"{'program':<{width}}  {'status':<14}{'compile ms':>12}{'run ms':>12}{'cpu ms':>12}")
+    for result in results:
+        print(f"{result.name:<{width}}  {result.status:<14}{result.compile_seconds * 1000:>12.1f}"
+              f"{result.run_seconds * 1000:>12.1f}{result.cpu_seconds * 1000:>12.1f}")
+    counts: Dict[str, int] = {}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+    print(', '.join(f"{count} {status}" for status, count in sorted(counts.items())))
+
+def main():
+    parser = argparse.ArgumentParser(description='Run Lu programs in parallel under resource limits')
+    parser.add_argument('inputs', nargs='+', help='Lu files, directories or glob patterns')
+    parser.add_argument('-j', '--jobs', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--stdin', type=str, help='File fed to every program as input, instead of each <program>.in')
+    parser.add_argument('--cpu-limit', type=float, default=DEFAULT_CPU_LIMIT,
+                        help='CPU seconds per program, 0 for none (default: %(default)s)')
+    parser.add_argument('--memory-limit', type=int, default=DEFAULT_MEMORY_LIMIT,
+                        help='MiB of address space per worker process, 0 for none (default: %(default)s)')
+    parser.add_argument('--timeout', type=float, help='Wall-clock seconds per program (default: none)')
+    parser.add_argument('--output-limit', type=int, default=DEFAULT_OUTPUT_LIMIT,
+                        help='Characters of stdout and of stderr kept per program (default: %(default)s)')
+    parser.add_argument('--tasks-per-child', type=int, default=DEFAULT_TASKS_PER_CHILD,
+                        help='Programs a worker runs before it is replaced (default: %(default)s)')
+    parser.add_argument('--json', action='store_true',
+                        help='Print one JSON object per program, with its output, instead of a table')
+    args = parser.parse_args()
+
+    stdin = None
+    if args.stdin:
+        with open(args.stdin, 'r', encoding='utf-8') as infile:
+            stdin = infile.read()
+    jobs = jobs_for_inputs(args.inputs, stdin)
+    if not jobs:
+        parser.error('no .lu files matched the given inputs')
+    limits = Limits(args.cpu_limit or None, args.memory_limit * 1024 * 1024 or None, args.timeout, args.output_limit)
+    results = run_jobs(jobs, args.jobs, limits, args.tasks_per_child)
+
+    if args.json:
+        for result in results:
+            print(json.dumps(result._asdict()))
+    else:
+        print_results(results)
+    sys.exit(0 if all(result.status == 'ok' for result in results) else 1)
+
+if __name__ == "__main__":
+    main()
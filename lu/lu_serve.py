@@ -0,0 +1,169 @@
+"""
+Compile requests read as JSON lines from stdin on a pool of warm workers.
+
+Run `python lu/lu_compiler.py --serve` and write one request per line:
+
+    {"id": 1, "source": "OUTPUT 1", "optimize": 1}
+    {"id": 2, "path": "course/module1/intro.lu"}
+
+Each request gets one response line on stdout, in the order the requests
+finish rather than the order they arrived; `id` is echoed back to match
+them up:
+
+    {"id": 1, "ok": true, "code": "print(1)\\n", "diagnostics": [], "timings": {...}}
+
+Options are `optimize`, `array_backend`, `recover` and `timeout`, the
+seconds a worker may spend compiling the request; the ones a request
+leaves out default to those given on the command line. At most
+`max_pending` requests are compiled or queued at once; beyond that the
+server stops reading stdin until one finishes, so a fast producer is
+throttled by the pipe instead of growing the queue.
+"""
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import IO, Optional
+from lu_errors import Error, error_list
+
+REQUEST_OPTIONS = ('optimize', 'array_backend', 'recover')
+TIMEOUT_OPTION = 'timeout'
+
+def warm_worker():
+    """Import the compiler in a new worker, so the first request does not pay for it."""
+    import lu_compiler, lu_lexer, lu_parser, lu_optimizer  # noqa: F401
+
+def compile_request(request: dict, received: float) -> dict:
+    """
+    Compile one request in a worker, returning its response.
+
+    A request still compiling after its `timeout` seconds fails with a
+    `TimeoutError`, raised in the worker by an interval timer, so the
+    worker is free for the next request. The timer needs `signal.setitimer`,
+    which Windows lacks; there the timeout is ignored.
+    """
+    from lu_compiler import compile_source
+    start = time.time()
+    timings = {'queue_seconds': max(start - received, 0.0)}
+    response = {'id': request.get('id'), 'ok': False, 'code': None, 'diagnostics': [], 'timings': timings}
+    timeout = request.get(TIMEOUT_OPTION)
+    try:
+        options = {name: request[name] for name in REQUEST_OPTIONS if name in request}
+        options['optimize'] = int(options.get('optimize') or 0)
+        options['recover'] = bool(options.get('recover', False))
+        if 'source' in request:
+            text = request['source']
+        elif 'path' in request:
+            with open(request['path'], 'r', encoding='utf-8') as infile:
+                text = infile.read()
+        else:
+            raise ValueError("request needs a 'source' or a 'path'")
+
+        phase = time.perf_counter()
+        with time_limit(timeout):
+            response['code'] = compile_source(text, mode='source', **options)
+        timings['compile_seconds'] = time.perf_counter() - phase
+        response['ok'] = True
+    except Error as e:
+        response['diagnostics'] = [item.to_dict() for item in error_list(e)]
+    except Exception as e:
+        response['diagnostics'] = [failure(e)]
+    timings['total_seconds'] = time.time() - start
+    return response
+
+@contextmanager
+def time_limit(seconds: Optional[float]):
+    """Raise `TimeoutError` in the block once it has run for `seconds`; None or 0 means no limit."""
+    if not seconds or not hasattr(signal, 'setitimer'):
+        yield
+        return
+
+    def expire(signum, frame):
+        raise TimeoutError(f"compiling took longer than {seconds} seconds")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def failure(e: BaseException) -> dict:
+    """Describe an exception that is not a compile error as a diagnostic."""
+    return {'type': e.__class__.__name__, 'message': str(e), 'line': None, 'column': None}
+
+class Server:
+    """
+    Read requests from `requests`, compile them on `workers` processes and write responses to `responses`.
+
+    `defaults` holds the options used when a request does not set them.
+    A worker that dies breaks the whole pool: every request submitted to
+    it and not yet answered fails with `BrokenProcessPool`. The pool is
+    then replaced and serving continues with the next request.
+    """
+    def __init__(self, requests: IO[str], responses: IO[str], workers: Optional[int] = None,
+                 max_pending: Optional[int] = None, defaults: Optional[dict] = None):
+        self.requests = requests
+        self.responses = responses
+        self.workers = workers or os.cpu_count() or 1
+        self.pending = threading.BoundedSemaphore(max_pending or 2 * self.workers)
+        self.write_lock = threading.Lock()
+        self.defaults = defaults or {}
+        self.pool: Optional[ProcessPoolExecutor] = None
+
+    def serve(self):
+        """Serve until `requests` is exhausted and every response is written."""
+        self.pool = self.new_pool()
+        try:
+            for line in self.requests:
+                if not line.strip():
+                    continue
+                received = time.time()
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError('a request must be a JSON object')
+                except ValueError as e:
+                    self.write({'id': None, 'ok': False, 'code': None, 'diagnostics': [failure(e)], 'timings': {}})
+                    continue
+                self.pending.acquire()  # blocks reading more input while `max_pending` are in flight
+                self.submit({**self.defaults, **request}, received)
+        finally:
+            self.pool.shutdown(wait=True)
+
+    def new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=warm_worker)
+
+    def submit(self, request: dict, received: float):
+        try:
+            future = self.pool.submit(compile_request, request, received)
+        except BrokenProcessPool:
+            self.pool.shutdown(wait=False)
+            self.pool = self.new_pool()
+            future = self.pool.submit(compile_request, request, received)
+        future.add_done_callback(lambda done: self.finish(request, done))
+
+    def finish(self, request: dict, future: Future):
+        try:
+            response = future.result()
+        except BaseException as e:
+            response = {'id': request.get('id'), 'ok': False, 'code': None,
+                        'diagnostics': [failure(e)], 'timings': {}}
+        self.write(response)
+        self.pending.release()
+
+    def write(self, response: dict):
+        line = json.dumps(response) + '\n'
+        with self.write_lock:
+            self.responses.write(line)
+            self.responses.flush()
+
+def serve(workers: Optional[int] = None, max_pending: Optional[int] = None, **defaults):
+    """Serve JSON-lines compile requests on stdin and stdout, with `defaults` for the request options."""
+    Server(sys.stdin, sys.stdout, workers, max_pending, defaults).serve()
@@ -1,7 +1,198 @@
-from typing import List, NamedTuple
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
 
 class Token(NamedTuple):
     type: str
     value: str
     line: int
     column: int
+
+# Token kinds as small ints, in the order of the lexer's token specs.
+KIND_NAMES = ('EOF', 'WHITESPACE', 'SPACE', 'COMMENT', 'BOOLEAN', 'BOOLEANOP', 'KEYWORD', 'IDENTIFIER',
+              'ATTRIBUTE', 'CHAR', 'STRING', 'REAL', 'INTEGER', 'OPERATOR', 'DELIMITER')
+KINDS = {name: kind for kind, name in enumerate(KIND_NAMES)}
+(EOF, WHITESPACE, SPACE, COMMENT, BOOLEAN, BOOLEANOP, KEYWORD, IDENTIFIER,
+ ATTRIBUTE, CHAR, STRING, REAL, INTEGER, OPERATOR, DELIMITER) = range(len(KIND_NAMES))
+
+
+SEPARATOR = re.compile(r'[\n;]')
+
+
+class LineIndex:
+    """
+    Offsets of the line separators in a source text.
+
+    Lines are counted across both newlines and semicolons, and columns
+    restart after each newline. Built with one scan of the text, the index
+    turns any offset into a (line, column) position, and back, by bisection.
+    `line` and `column` give the position of `text[0]`, for indexing a
+    piece of a larger source.
+    """
+    def __init__(self, text: str, line: int = 1, column: int = 1):
+        self.text = text
+        self.line = line
+        self.column = column
+        self.separators = array('i', [match.start() for match in SEPARATOR.finditer(text)])
+        self.newlines = array('i', [offset for offset in self.separators if text[offset] == '\n'])
+
+    def position(self, offset: int) -> Tuple[int, int]:
+        """Return the line and column of `offset`."""
+        line = self.line + bisect_left(self.separators, offset)
+        k = bisect_left(self.newlines, offset)
+        return line, offset - self.newlines[k - 1] if k else self.column + offset
+
+    def offset(self, line: int, column: int) -> int:
+        """Return the offset of a line and column, the inverse of `position`."""
+        k = line - self.line
+        last_separator = self.separators[min(k, len(self.separators)) - 1] if k > 0 else -1
+        k = bisect_right(self.newlines, last_separator)
+        return self.newlines[k - 1] + column if k else column - self.column
+
+    def excerpt(self, line: int, column: int) -> str:
+        """Return the source line holding a position, with a caret under its column."""
+        offset = min(max(self.offset(line, column), 0), len(self.text))
+        start = self.text.rfind('\n', 0, offset) + 1
+        end = self.text.find('\n', offset)
+        text = self.text[start:end if end >= 0 else len(self.text)]
+        pointer = ''.join(c if c == '\t' else ' ' for c in self.text[start:offset]) + '^'
+        return f"    {text}\n    {pointer}"
+
+
+class TokenBuffer:
+    """
+    Struct-of-arrays token store over the source text.
+
+    Each token is a small-int kind and start/end offsets into `text`, held
+    in compact arrays. Values are sliced from the text, and line/column
+    positions looked up in `line_index`, only when asked for. Buffers built
+    from `Token` lists have no index and keep line/column arrays instead.
+    Indexing returns a `Token` for code that expects one; the parser reads
+    `kind` and `value` directly instead.
+    """
+    def __init__(self, text: str = '', line_index: Optional[LineIndex] = None):
+        self.text = text
+        self.line_index = line_index
+        self.kinds = array('B')
+        self.starts = array('i')
+        self.ends = array('i')
+        self.lines = array('i')
+        self.columns = array('i')
+
+    @classmethod
+    def from_tokens(cls, tokens: Iterable[Token]) -> 'TokenBuffer':
+        """Pack `tokens` into a buffer over the concatenation of their values."""
+        buffer = cls()
+        values = []
+        offset = 0
+        for token in tokens:
+            end = offset + len(token.value)
+            buffer.append(KINDS[token.type], offset, end, token.line, token.column)
+            values.append(token.value)
+            offset = end
+        buffer.text = ''.join(values)
+        return buffer
+
+    def append(self, kind: int, start: int, end: int, line: int = 0, column: int = 0):
+        """Add a token; `line` and `column` are only kept by buffers without a line index."""
+        self.kinds.append(kind)
+        self.starts.append(start)
+        self.ends.append(end)
+        if self.line_index is None:
+            self.lines.append(line)
+            self.columns.append(column)
+
+    def position(self, index: int) -> Tuple[int, int]:
+        if self.line_index is None:
+            return self.lines[index], self.columns[index]
+        return self.line_index.position(self.starts[index])
+
+    def kind(self, index: int) -> int:
+        return self.kinds[index]
+
+    def value(self, index: int) -> str:
+        return self.text[self.starts[index]:self.ends[index]]
+
+    def chunk(self, lo: int, hi: int) -> 'TokenBuffer':
+        """
+        Return tokens `lo` to `hi` followed by this buffer's last (EOF) token.
+
+        The chunk holds only the text its tokens span (up to the end of the
+        source for the last chunk) and a line index of just that text, so it
+        is cheap to send to a worker process.
+        """
+        base = self.starts[lo] if lo < hi else self.starts[-1]
+        end = len(self.text) if hi >= len(self) - 1 else self.ends[hi - 1]
+        text = self.text[base:end]
+        line_index = None if self.line_index is None else LineIndex(text, *self.line_index.position(base))
+        chunk = TokenBuffer(text, line_index)
+        chunk.kinds = self.kinds[lo:hi]
+        chunk.starts = array('i', [start - base for start in self.starts[lo:hi]])
+        chunk.ends = array('i', [end - base for end in self.ends[lo:hi]])
+        if line_index is None:
+            chunk.lines = self.lines[lo:hi]
+            chunk.columns = self.columns[lo:hi]
+        chunk.append(self.kinds[-1], len(text), len(text), *self.position(-1))
+        return chunk
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Token, List[Token]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return Token(KIND_NAMES[self.kinds[index]], self.text[self.starts[index]:self.ends[index]],
+                     *self.position(index))
+
+    def __iter__(self) -> Iterator[Token]:
+        for index in range(len(self)):
+            yield self[index]
+
+
+class TokenWindow:
+    """
+    Indexable view over a lazy token iterator.
+
+    Tokens are pulled from the iterator as they are indexed and released
+    once the parser has moved more than `behind` tokens past them, so only a
+    small window of the stream is ever held in memory.
+    """
+    def __init__(self, tokens: Iterator[Token], behind: int = 8):
+        self._tokens = tokens
+        self._buffer = deque()
+        self._base = 0  # absolute index of _buffer[0]
+        self._behind = behind
+        self.kinds = _WindowKinds(self)
+
+    def __getitem__(self, index: int) -> Token:
+        if index < self._base:
+            raise IndexError(f"Token {index} has already been released")
+        while index >= self._base + len(self._buffer):
+            token = next(self._tokens, None)
+            if token is None:
+                raise IndexError(f"Token index out of range: {index}")
+            self._buffer.append(token)
+        return self._buffer[index - self._base]
+
+    def kind(self, index: int) -> int:
+        return self.kinds[index]
+
+    def value(self, index: int) -> str:
+        return self[index].value
+
+    def release(self, index: int):
+        """Drop tokens more than `behind` positions before `index`."""
+        while self._buffer and self._base < index - self._behind:
+            self._buffer.popleft()
+            self._base += 1
+
+
+class _WindowKinds:
+    """Index a `TokenWindow` by kind, like `TokenBuffer.kinds`."""
+    def __init__(self, window: TokenWindow):
+        self._window = window
+
+    def __getitem__(self, index: int) -> int:
+        return KINDS[self._window[index].type]
@@ -0,0 +1,214 @@
+import os
+import time
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Tuple
+from lu_token import LineIndex, Token
+from lu_lexer import Lexer
+from lu_parser import import_nodes, iter_statement_starts, process_token_chunk
+from lu_errors import Error
+from lu_logger import info, error
+from lu_build import expand_inputs, output_path
+from lu_optimizer import optimize_block
+from lu_emit import join_bodies, unparse_body
+
+WATCH_INTERVAL = 0.25  # seconds between polls
+
+class WatchedFile:
+    """
+    Compiler state for one file kept warm between edits.
+
+    Each update re-lexes only the lines around the edited region, splices
+    the new tokens into the cached token list (shifting the line/column of
+    the tokens after it), and re-parses only the top-level blocks whose
+    tokens changed. Untouched blocks keep their parsed and unparsed output.
+    Each block is optimized on its own at `optimize`.
+    """
+    def __init__(self, filename: str, output_filename: str, array_backend: str = 'list', optimize: int = 0):
+        self.filename = filename
+        self.output_filename = output_filename
+        self.array_backend = array_backend
+        self.optimize = optimize
+        self.text = ''
+        self.tokens: List[Token] = [Token('EOF', '', 1, 1)]
+        self.offsets: List[int] = [0]  # source offset of each token, EOF included
+        self.block_starts: List[int] = [0]  # token index of each top-level block
+        # (optimizer imports, parser imports, unparsed code) per block
+        self.blocks: List[Optional[Tuple[list, list, Optional[Tuple[str, bool]]]]] = [None]
+
+    def update(self, text: str) -> str:
+        """Bring the state up to date with `text` and return the generated Python."""
+        old_start, old_end, new_end = self.relex(text)
+        self.reblock(old_start, old_end, new_end)
+        return self.render()
+
+    def relex(self, text: str) -> Tuple[int, int, int]:
+        """
+        Re-tokenize the edited part of `text`.
+
+        Returns the replaced token range in the old list and the end of
+        the replacement in the new one.
+        """
+        old_text, old_tokens, old_offsets = self.text, self.tokens, self.offsets
+
+        prefix = common_prefix(old_text, text)
+        suffix = common_prefix(old_text[prefix:][::-1], text[prefix:][::-1])
+        new_end = len(text) - suffix
+        delta = len(text) - len(old_text)
+
+        # A quote changes how everything after it lexes, so rescan from the top.
+        if '"' in old_text[prefix:len(old_text) - suffix] or '"' in text[prefix:new_end]:
+            line_start = 0
+        else:
+            line_start = text.rfind('\n', 0, prefix) + 1
+
+        # Resume at the last real token starting before the edited line; that one
+        # may still be a newline run that the edit extends.
+        start = bisect_left(old_offsets, line_start, 0, len(old_offsets) - 1) - 1
+        lexer = Lexer(text)
+        if start < 0:
+            start, offset = 0, 0
+        else:
+            offset = old_offsets[start]
+
+        tokens, offsets = [], []
+        resync = None
+        for offset, token in lexer.scan(offset):
+            if offset > new_end:
+                # Past the edit, the text (and its left context) is unchanged;
+                # once a token lands on an old token boundary the rest matches.
+                k = bisect_left(old_offsets, offset - delta, start, len(old_offsets) - 1)
+                if k < len(old_offsets) - 1 and old_offsets[k] == offset - delta:
+                    resync = k
+                    break
+            tokens.append(token)
+            offsets.append(offset)
+
+        if resync is None:
+            tokens.append(Token('EOF', '', *lexer.line_index.position(len(text))))
+            offsets.append(len(text))
+            tail, tail_offsets, resync = [], [], len(old_tokens)
+        else:
+            tail = self.shift(old_tokens[resync:], token)
+            tail_offsets = [o + delta for o in old_offsets[resync:]]
+
+        self.text = text
+        self.tokens = old_tokens[:start] + tokens + tail
+        self.offsets = old_offsets[:start] + offsets + tail_offsets
+        return start, resync, start + len(tokens)
+
+    @staticmethod
+    def shift(tokens: List[Token], first: Token) -> List[Token]:
+        """Move `tokens` so that `tokens[0]` lands on `first`'s line and column."""
+        line_delta = first.line - tokens[0].line
+        column_delta = first.column - tokens[0].column
+        shifted = []
+        same_line = column_delta != 0  # columns only move up to the next newline
+        for i, token in enumerate(tokens):
+            if same_line:
+                token = token._replace(line=token.line + line_delta, column=token.column + column_delta)
+                same_line = '\n' not in token.value
+            elif line_delta:
+                token = token._replace(line=token.line + line_delta)
+            else:
+                shifted.extend(tokens[i:])
+                break
+            shifted.append(token)
+        return shifted
+
+    def reblock(self, old_start: int, old_end: int, new_end: int):
+        """Recompute block boundaries around the edit and drop the stale blocks."""
+        token_delta = new_end - old_end
+        b = bisect_right(self.block_starts, old_start) - 1
+        starts = self.block_starts[:b + 1]
+        blocks = self.blocks[:b] + [None]
+
+        old_index = {s: k for k, s in enumerate(self.block_starts) if s >= old_end}
+        tail_starts, tail_blocks = [], []
+        for s in iter_statement_starts(self.tokens, starts[-1]):
+            if s >= new_end and s - token_delta in old_index:
+                k = old_index[s - token_delta]
+                tail_starts = [x + token_delta for x in self.block_starts[k:]]
+                tail_blocks = self.blocks[k:]
+                break
+            starts.append(s)
+            blocks.append(None)
+
+        self.block_starts = starts + tail_starts
+        self.blocks = blocks + tail_blocks
+
+    def render(self) -> str:
+        """Parse the stale blocks and assemble the module source."""
+        eof = self.tokens[-1]
+        ends = self.block_starts[1:] + [len(self.tokens) - 1]
+        for k, (start, end) in enumerate(zip(self.block_starts, ends)):
+            if self.blocks[k] is None:
+                imports, statements, _ = process_token_chunk(self.tokens[start:end] + [eof], self.array_backend)
+                optimizer_imports = []
+                if self.optimize:
+                    optimizer_imports, statements = optimize_block(statements, self.optimize)
+                self.blocks[k] = (optimizer_imports, imports, unparse_body(statements))
+
+        # The optimizer's imports go first, as `lu_optimizer.optimize` puts them.
+        imports = import_nodes([item for block_imports, _, _ in self.blocks for item in block_imports] +
+                               [item for _, block_imports, _ in self.blocks for item in block_imports])
+        parts = [unparse_body(imports)] + [code for _, _, code in self.blocks]
+        return join_bodies(part for part in parts if part is not None) + '\n'
+
+def common_prefix(a: str, b: str) -> int:
+    """Return the length of the common prefix of `a` and `b`."""
+    # Bisect on slice comparisons, which run in C, instead of walking characters.
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def watch(patterns: List[str], output_dir: Optional[str] = None, interval: float = WATCH_INTERVAL,
+          array_backend: str = 'list', optimize: int = 0):
+    """Recompile matching files whenever they change, until interrupted."""
+    files: Dict[str, WatchedFile] = {}
+    stamps: Dict[str, Tuple[float, int]] = {}
+    info(f"Watching {' '.join(patterns)}")
+    try:
+        while True:
+            for input_file, root in expand_inputs(patterns):
+                try:
+                    stat = os.stat(input_file)
+                except OSError:
+                    continue
+                stamp = (stat.st_mtime, stat.st_size)
+                if stamps.get(input_file) == stamp:
+                    continue
+                stamps[input_file] = stamp
+                watched = files.get(input_file)
+                if watched is None:
+                    watched = files[input_file] = WatchedFile(input_file, output_path(input_file, root, output_dir),
+                                                                        array_backend, optimize)
+                compile_watched(watched)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        info("Stopped watching")
+
+def compile_watched(watched: WatchedFile):
+    start = time.perf_counter()
+    try:
+        with open(watched.filename, 'r', encoding='utf-8') as infile:
+            text = infile.read()
+        try:
+            py_output = watched.update(text)
+        except Error as e:
+            if e.source is None:
+                e.source = LineIndex(text)
+            raise
+        os.makedirs(os.path.dirname(watched.output_filename) or '.', exist_ok=True)
+        with open(watched.output_filename, 'w', encoding='utf-8') as outfile:
+            outfile.write(py_output)
+    except Error as e:
+        error(f"Compilation failed: {e.full_message}")
+    except IOError as e:
+        error(f"File error: {str(e)}")
+    else:
+        info(f"Compiled {watched.filename} in {(time.perf_counter() - start) * 1000:.1f} ms")
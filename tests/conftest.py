@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The compiler's modules import each other as top-level modules from lu/.
+LU_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lu')
+sys.path.insert(0, LU_DIR)
+os.environ.setdefault('LU_LOG_FILE', '')
@@ -0,0 +1,84 @@
+import contextlib
+import io
+import pytest
+from lu_compiler import compile_source
+
+RECORD = '''TYPE Student
+    DECLARE Name : STRING
+    DECLARE Mark : INTEGER
+ENDTYPE
+'''
+
+# Indexed from 0, so the plain lists of the list backend agree with the declared bounds.
+ZERO_BASED = RECORD + '''DECLARE Marks : ARRAY[0:4] OF INTEGER
+DECLARE Flags : ARRAY[0:2] OF BOOLEAN
+DECLARE Names : ARRAY[0:1] OF STRING
+DECLARE Class : ARRAY[0:2] OF Student
+FOR i <- 0 TO 4
+    Marks[i] <- i * 10
+NEXT i
+Flags[2] <- TRUE
+Names[1] <- "Lin"
+Class[1].Name <- "Ada"
+Class[1].Mark <- Marks[4] + 1
+Class[2].Mark <- Class[1].Mark * 2
+OUTPUT Marks[0], Marks[4]
+OUTPUT Flags[0], Flags[2]
+OUTPUT Names[0], Names[1]
+OUTPUT Class[1].Name, Class[1].Mark, Class[2].Mark, Class[0].Mark
+'''
+
+# Declared bounds and `A[i, j]` indexing, which only the LuArray backends keep.
+BOUNDED = RECORD + '''DECLARE Marks : ARRAY[1:5] OF INTEGER
+DECLARE Grid : ARRAY[1:3,1:4] OF REAL
+DECLARE Class : ARRAY[1:3] OF Student
+DECLARE Seats : ARRAY[1:2,1:2] OF Student
+FOR i <- 1 TO 5
+    Marks[i] <- i * 10
+NEXT i
+FOR r <- 1 TO 3
+    FOR c <- 1 TO 4
+        Grid[r, c] <- r * 10 + c / 2
+    NEXT c
+NEXT r
+Class[3].Name <- "Ada"
+Class[3].Mark <- Marks[5] + Marks[1]
+Seats[2, 1].Name <- Class[3].Name
+Seats[2, 1].Mark <- Class[3].Mark - 1
+OUTPUT Marks[1], Marks[5]
+OUTPUT Grid[1, 1], Grid[2, 3], Grid[3, 4]
+OUTPUT Class[3].Name, Class[3].Mark, Class[1].Mark
+OUTPUT Seats[2, 1].Name, Seats[2, 1].Mark, Seats[1, 2].Mark
+'''
+
+def run(text: str, array_backend: str) -> str:
+    if array_backend == 'numpy':
+        pytest.importorskip('numpy')
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        exec(compile_source(text, array_backend=array_backend), {'__name__': '__main__'})
+    return output.getvalue()
+
+@pytest.mark.parametrize('array_backend', ['array', 'numpy'])
+def test_zero_based_arrays_match_the_list_backend(array_backend):
+    assert run(ZERO_BASED, array_backend) == run(ZERO_BASED, 'list')
+
+@pytest.mark.parametrize('array_backend', ['array', 'numpy'])
+def test_bounded_and_2d_arrays(array_backend):
+    assert run(BOUNDED, array_backend) == '10 50\n10.5 21.5 32.0\nAda 60 0\nAda 59 0\n'
+
+# Bounds that are only known at run time, as in `ARRAY[1:n]`.
+RUNTIME_BOUNDS = RECORD + '''n <- 4
+DECLARE Squares : ARRAY[1:n] OF INTEGER
+DECLARE Grid : ARRAY[0:n - 2, 1:n] OF INTEGER
+DECLARE Class : ARRAY[1:n] OF Student
+FOR i <- 1 TO n - 1
+    Squares[i] <- i * i
+NEXT i
+Class[n - 1].Mark <- Squares[3]
+OUTPUT LENGTH(Squares), Squares[3], LENGTH(Grid), Class[n - 1].Mark
+'''
+
+@pytest.mark.parametrize('array_backend', ['list', 'array', 'numpy'])
+def test_runtime_array_bounds(array_backend):
+    assert run(RUNTIME_BOUNDS, array_backend) == '4 9 3 9\n'
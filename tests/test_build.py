@@ -0,0 +1,21 @@
+import os
+from lu_build import build
+
+
+def statuses(tmp_path, **options):
+    return [result.status for result in build([str(tmp_path / 'src')], str(tmp_path / 'out'), workers=1, **options)]
+
+
+def test_rebuild_when_options_or_outputs_change(tmp_path):
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'src' / 'main.lu').write_text('DECLARE a : ARRAY[1:3] OF INTEGER\na[1] <- 2\nOUTPUT a[1] * 3\n')
+    assert statuses(tmp_path) == ['built']
+    assert statuses(tmp_path) == ['skipped']
+    assert statuses(tmp_path, optimize=1) == ['built']
+    assert statuses(tmp_path, optimize=1) == ['skipped']
+    assert statuses(tmp_path, optimize=1, array_backend='array') == ['built']
+    assert statuses(tmp_path, optimize=1, array_backend='array', emit='both') == ['built']
+    assert os.path.exists(tmp_path / 'out' / 'main.pyc')
+    assert statuses(tmp_path, optimize=1, array_backend='array', emit='both') == ['skipped']
+    os.remove(tmp_path / 'out' / 'main.pyc')
+    assert statuses(tmp_path, optimize=1, array_backend='array', emit='both') == ['built']
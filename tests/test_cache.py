@@ -0,0 +1,10 @@
+from lu_cache import CompileCache, compiler_fingerprint
+
+
+def test_cache_is_keyed_on_the_compiler_fingerprint(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    assert cache.version == compiler_fingerprint()
+    source = b'OUTPUT LENGTH("abc")\n'
+    # A different compiler must never be served this compiler's output.
+    assert cache.key(source, 0) != CompileCache(str(tmp_path), version='stale').key(source, 0)
+    assert cache.key(source, 0) == CompileCache(str(tmp_path)).key(source, 0)
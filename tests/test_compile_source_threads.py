@@ -0,0 +1,49 @@
+import threading
+from lu_bench import else_if_chain, functions, loops
+from lu_compiler import compile_source
+from lu_errors import Error, error_list
+
+THREADS = 16
+
+SOURCES = [
+    'OUTPUT LENGTH("abc") + 1\n',
+    'DECLARE a : ARRAY[1:3] OF INTEGER\na[2] <- 5\nOUTPUT a[2]\n',
+    loops(3),
+    functions(3),
+    else_if_chain(200),
+    'IF x THEN\nOUTPUT 1\n',  # never closed
+    'x <- )\ny <- (\nRETURN 2\n',  # several errors
+    'FUNCTION f RETURNS INTEGER\nOUTPUT 1\nENDFUNCTION\n',
+]
+OPTIONS = [
+    {'mode': 'source'},
+    {'mode': 'source', 'recover': True},
+    {'mode': 'source', 'optimize': 3},
+    {'mode': 'source', 'array_backend': 'array'},
+]
+
+def outcome(text: str, options: dict):
+    """Return what compiling `text` gives: the Python source, or the errors raised."""
+    try:
+        return compile_source(text, **options)
+    except Error as e:
+        return type(e).__name__, [item.to_dict() for item in error_list(e)]
+
+def test_concurrent_compiles_match_serial_compiles():
+    jobs = [(text, options) for text in SOURCES for options in OPTIONS] * 4
+    expected = [outcome(text, options) for text, options in jobs]
+    assert any(isinstance(result, tuple) for result in expected)
+    results = [None] * len(jobs)
+    start = threading.Barrier(THREADS)
+
+    def compile_share(first: int):
+        start.wait()  # start every thread's compiles at once
+        for i in range(first, len(jobs), THREADS):
+            results[i] = outcome(*jobs[i])
+
+    threads = [threading.Thread(target=compile_share, args=(first,)) for first in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == expected
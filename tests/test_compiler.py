@@ -0,0 +1,21 @@
+import __future__
+import marshal
+import pytest
+from lu_compiler import compile_file, compile_source
+
+# DATE has no Python type, so the annotation it emits fails when evaluated.
+DATE = 'DECLARE d : DATE\nOUTPUT 1\n'
+
+def test_code_object_evaluates_annotations_like_the_written_source(tmp_path):
+    with pytest.raises(NameError):
+        exec(compile_source(DATE, mode='source'), {})
+    with pytest.raises(NameError):
+        exec(compile_source(DATE), {})
+
+    source = tmp_path / 'date.lu'
+    source.write_text(DATE)
+    for stream in (False, True):
+        compile_file(str(source), str(tmp_path / 'date.py'), stream=stream, emit='both')
+        with open(tmp_path / 'date.pyc', 'rb') as infile:
+            code = marshal.loads(infile.read()[16:])
+        assert not code.co_flags & __future__.annotations.compiler_flag
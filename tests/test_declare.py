@@ -0,0 +1,25 @@
+import pytest
+from lu_compiler import compile_source
+from lu_errors import Diagnostics, SyntaxError, error_list
+
+def test_declare_scalars_and_arrays():
+    text = 'DECLARE s : STRING\nDECLARE a : ARRAY[-2:2] OF INTEGER\nDECLARE g : ARRAY[1:2, 0:3] OF REAL\n'
+    assert compile_source(text, mode='source') == 's: str\na: list = [int()] * 5\ng: list = [[float()] * 4 for _ in range(2)]\n'
+
+@pytest.mark.parametrize('text, column', [
+    ('DECLARE : INTEGER', 9),
+    ('DECLARE a INTEGER', 11),
+    ('DECLARE a :', 12),
+    ('DECLARE a : ARRAY[1:3 OF INTEGER', 23),
+    ('DECLARE a : ARRAY[1 3] OF INTEGER', 21),
+    ('DECLARE a : ARRAY[1:2,1:2,1:2] OF INTEGER', 26),
+    ('DECLARE a : ARRAY[1:3] INTEGER', 24),
+    ('DECLARE a : ARRAY[1:3] OF', 26),
+])
+def test_malformed_declare_is_a_syntax_error(text, column):
+    with pytest.raises(SyntaxError) as raised:
+        compile_source(text + '\n')
+    assert raised.value.to_dict()['column'] == column
+    with pytest.raises(Diagnostics) as raised:
+        compile_source(text + '\nOUTPUT 1\n', recover=True)
+    assert [error.to_dict()['column'] for error in error_list(raised.value)] == [column]
@@ -0,0 +1,47 @@
+import os
+import pytest
+from lu_compiler import compile_source
+from lu_emit import emit_stream
+from lu_errors import Diagnostics, SyntaxError
+from lu_lexer import tokenize_file
+
+# Imports needed by statements far apart, a class and a function among plain
+# statements, and blank lines, which all change how the output is joined.
+PROGRAM = '''FUNCTION Twice(n : INTEGER) RETURNS INTEGER
+    RETURN n * 2
+ENDFUNCTION
+
+x <- Twice(3 + 4)
+TYPE Colour = (Red, Green)
+
+TYPE Point
+    DECLARE x : INTEGER
+    DECLARE y : INTEGER
+ENDTYPE
+OUTPUT x, SUBSTRING("stream", 2, 3), Red
+WHILE x > 2 * 3
+    x <- x - 1
+ENDWHILE
+'''
+
+def emit(tmp_path, text: str, **options) -> str:
+    source = tmp_path / 'program.lu'
+    source.write_text(text)
+    output = tmp_path / 'program.py'
+    emit_stream(tokenize_file(str(source)), str(output), **options)
+    return output.read_text()
+
+@pytest.mark.parametrize('optimize', [0, 2])
+@pytest.mark.parametrize('text', [PROGRAM, 'x <- 1\n' + PROGRAM, '\n\nOUTPUT 1\n\n'])
+def test_streamed_output_matches_unparsing_the_whole_module(tmp_path, text, optimize):
+    assert emit(tmp_path, text, optimize=optimize) == compile_source(text, mode='source', optimize=optimize)
+
+def test_failed_compile_leaves_the_previous_output(tmp_path):
+    previous = emit(tmp_path, PROGRAM)
+    with pytest.raises(SyntaxError):
+        emit(tmp_path, PROGRAM + 'OUTPUT (\n')
+    with pytest.raises(Diagnostics) as raised:
+        emit(tmp_path, 'OUTPUT (\nx <- 1\nOUTPUT 1 2\n', recover=True)
+    assert len(raised.value.errors) == 2
+    assert (tmp_path / 'program.py').read_text() == previous
+    assert sorted(os.listdir(tmp_path)) == ['program.lu', 'program.py']
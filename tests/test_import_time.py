@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+from lu_bench import IMPORT_BASELINE, IMPORT_RATIO, import_time
+
+LU_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lu')
+
+# Modules that only the commands needing them import.
+DEFERRED = ('argparse', 'ast', 'lu_lexer', 'lu_parser', 'lu_optimizer', 'lu_cache', 'lu_profile')
+
+def imported_modules(module: str) -> set:
+    """Return the modules a fresh interpreter loads to import `module`, from `-X importtime`."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True, cwd=LU_DIR)
+    # import time: self [us] | cumulative | imported package
+    return {fields[2].strip() for fields in (line.split('|') for line in result.stderr.splitlines()) if len(fields) == 3}
+
+def test_import_stays_within_budget():
+    seconds, baseline = import_time('lu_compiler'), import_time(IMPORT_BASELINE)
+    assert seconds <= baseline * IMPORT_RATIO, \
+        f"import lu_compiler took {seconds * 1000:.1f} ms, over {IMPORT_RATIO:g}x import {IMPORT_BASELINE} ({baseline * 1000:.1f} ms)"
+
+def test_import_defers_the_compiler():
+    assert not imported_modules('lu_compiler') & set(DEFERRED)
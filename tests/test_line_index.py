@@ -0,0 +1,32 @@
+import pytest
+from lu_compiler import compile_source
+from lu_errors import SyntaxError
+from lu_token import LineIndex
+
+SOURCE = 'a <- 1; b <- 2\n\tOUTPUT a\n\nOUTPUT b'
+
+def test_semicolons_start_lines_and_newlines_restart_columns():
+    index = LineIndex(SOURCE)
+    assert [index.position(offset) for offset in (0, 5, 8, 15, 16, 23, 26)] == \
+           [(1, 1), (1, 6), (2, 9), (3, 1), (3, 2), (3, 9), (5, 1)]
+
+def test_offset_inverts_position():
+    index = LineIndex(SOURCE)
+    for offset in range(len(SOURCE) + 1):
+        assert index.offset(*index.position(offset)) == offset
+
+def test_index_of_a_piece_of_a_larger_source():
+    index = LineIndex('xy\nz', 4, 7)
+    assert [index.position(offset) for offset in (0, 1, 3)] == [(4, 7), (4, 8), (5, 1)]
+    assert (index.offset(4, 8), index.offset(5, 1)) == (1, 3)
+
+def test_excerpt_points_at_the_column():
+    index = LineIndex(SOURCE)
+    assert index.excerpt(3, 9) == '    \tOUTPUT a\n    \t       ^'
+    assert index.excerpt(5, 8) == '    OUTPUT b\n           ^'
+
+def test_errors_show_the_source_line():
+    with pytest.raises(SyntaxError) as raised:
+        compile_source('x <- 1\n\tOUTPUT (x\n')
+    assert raised.value.full_message.endswith('column 9: Unexpected end of file: bracket is never closed\n'
+                                              '    \tOUTPUT (x\n    \t       ^')
@@ -0,0 +1,70 @@
+import contextlib
+import io
+import pytest
+from expr import MAX_LOOP_NESTING
+from lu_compiler import compile_source
+from lu_errors import SyntaxError
+
+def run(text: str) -> str:
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        exec(compile_source(text), {'__name__': '__main__'})
+    return output.getvalue()
+
+def body(header: str) -> str:
+    return f'{header}\n    OUTPUT i\nNEXT i\n'
+
+@pytest.mark.parametrize('header, loop', [
+    ('FOR i <- 1 TO 10', 'for i in range(1, 11):'),
+    ('FOR i <- 0 TO n', 'for i in range(n + 1):'),
+    ('FOR i <- 10 TO 1 STEP -2', 'for i in range(10, 0, -2):'),
+    ('FOR i <- a TO b STEP s', 'for i in range(a, b + (1 if s > 0 else -1), s):'),
+    ('FOR i <- a TO b STEP s + 1', 'for i in range(a, b + (1 if (_lu_step := (s + 1)) > 0 else -1), _lu_step):'),
+])
+def test_for_compiles_to_a_range(header, loop):
+    assert compile_source(body(header), mode='source') == f'{loop}\n    print(i)\n'
+
+def test_while_and_repeat_compile_to_native_loops():
+    assert compile_source('WHILE x < 3 DO\n    x <- x + 1\nENDWHILE\n', mode='source') == 'while x < 3:\n    x = x + 1\n'
+    assert compile_source('REPEAT\n    x <- x + 1\nUNTIL x > 3\n', mode='source') == \
+           'while True:\n    x = x + 1\n    if x > 3:\n        break\n'
+
+def test_loop_semantics():
+    program = '''FOR i <- 1 TO 3
+    OUTPUT i
+NEXT i
+FOR i <- 3 TO 1
+    OUTPUT "never"
+NEXT i
+s <- -1
+FOR i <- 2 TO 1 STEP s
+    OUTPUT i * 10
+NEXT i
+x <- 5
+REPEAT
+    x <- x + 1
+UNTIL x > 0
+WHILE x < 8
+    x <- x + 1
+ENDWHILE
+OUTPUT x
+'''
+    assert run(program) == '1\n2\n3\n20\n10\n8\n'
+
+@pytest.mark.parametrize('text, message', [
+    (body('FOR i <- 1 TO 3 STEP 0'), 'STEP must not be zero'),
+    ('FOR i <- 1 TO 3\n    OUTPUT i\nNEXT j\n', 'NEXT j does not match FOR i'),
+    ('FOR i <- 1 3\n    OUTPUT i\nNEXT i\n', "'TO'"),
+    ('WHILE TRUE\n    OUTPUT 1\nNEXT i\n', 'NEXT inside a WHILE block'),
+    ('REPEAT\n    OUTPUT 1\n', 'REPEAT is never closed'),
+])
+def test_malformed_loops(text, message):
+    with pytest.raises(SyntaxError, match=message):
+        compile_source(text)
+
+def test_loops_nested_deeper_than_python_allows():
+    def nested(depth: int) -> str:
+        return 'WHILE TRUE\n' * depth + 'ENDWHILE\n' * depth
+    compile_source(nested(MAX_LOOP_NESTING))
+    with pytest.raises(SyntaxError, match='nested more than'):
+        compile_source(nested(MAX_LOOP_NESTING + 1))
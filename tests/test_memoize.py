@@ -0,0 +1,46 @@
+import sys
+from lu_compiler import compile_source
+from lu_functions import MEMO_RECURSION_LIMIT, memoize
+
+FIBONACCI = '''FUNCTION Fib(n : INTEGER) RETURNS INTEGER
+    IF n < 2 THEN
+        RETURN n
+    ENDIF
+    RETURN Fib(n - 1) + Fib(n - 2)
+ENDFUNCTION
+'''
+
+PAIR = '''FUNCTION Pair(n : INTEGER)
+    x <- n * 2
+    RETURN [n, x]
+ENDFUNCTION
+'''
+
+def run(text: str) -> dict:
+    namespace = {'__name__': '__main__'}
+    exec(compile_source(text, optimize=3), namespace)
+    return namespace
+
+def test_pure_scalar_functions_are_memoized():
+    assert '@memoize' in compile_source(FIBONACCI, mode='source', optimize=3)
+    assert run(FIBONACCI)['Fib'](80) == 23416728348467685
+
+def test_functions_returning_a_mutable_value_are_not_memoized():
+    assert '@memoize' not in compile_source(PAIR, mode='source', optimize=3)
+    pair = run(PAIR)['Pair']
+    first = pair(1)
+    first.append('changed')
+    assert pair(1) == [1, 2]
+
+def test_memoize_raises_the_recursion_limit_to_a_bound():
+    limit = sys.getrecursionlimit()
+    try:
+        sys.setrecursionlimit(1000)
+        memoize(abs)
+        memoize(abs)
+        assert sys.getrecursionlimit() == MEMO_RECURSION_LIMIT
+        sys.setrecursionlimit(MEMO_RECURSION_LIMIT * 2)
+        memoize(abs)
+        assert sys.getrecursionlimit() == MEMO_RECURSION_LIMIT * 2
+    finally:
+        sys.setrecursionlimit(limit)
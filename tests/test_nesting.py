@@ -0,0 +1,64 @@
+from lu_bench import else_if_chain, nested_if
+from lu_compiler import unparse
+from lu_lexer import tokenize_text
+from lu_parser import parse
+
+# Enough top-level statements after the deep block for it to land in its own chunk.
+TAIL = 'y <- 1\n' * 600
+
+def parse_both(text: str):
+    serial = unparse(parse(tokenize_text(text), workers=1))
+    parallel = unparse(parse(tokenize_text(text), threshold=200, workers=4))
+    return serial, parallel
+
+def test_parallel_parse_of_long_else_if_chain():
+    serial, parallel = parse_both(else_if_chain(1000) + TAIL)
+    assert parallel == serial
+
+def test_parallel_parse_of_deeply_nested_if():
+    serial, parallel = parse_both(nested_if(1500) + TAIL)
+    assert parallel == serial
+
+def test_stream_and_watch_optimize_long_else_if_chain(tmp_path):
+    from lu_compiler import compile_source
+    from lu_emit import emit_stream
+    from lu_lexer import tokenize_file
+    from lu_watch import WatchedFile
+
+    text = else_if_chain(1000)
+    source = tmp_path / 'chain.lu'
+    source.write_text(text)
+    streamed, watched = {}, {}
+    for level in (1, 3):  # before compile_source, which would raise the recursion limit for them
+        output = tmp_path / f'chain{level}.py'
+        emit_stream(tokenize_file(str(source)), str(output), optimize=level)
+        streamed[level] = output.read_text()
+        watched[level] = WatchedFile(str(source), str(output), optimize=level).update(text)
+    for level in (1, 3):
+        expected = compile_source(text, mode='source', optimize=level)
+        assert streamed[level] == expected
+        assert watched[level] == expected
+
+# Block words that do not start a statement must not open or close a block.
+BLOCK_WORDS_MIDLINE = '''ENDTYPE <- 2
+FOR i <- 1 TO 3
+    x <- ENDTYPE + i
+NEXT i
+''' + TAIL + '''OPENFILE "data.txt" FOR READ
+''' + TAIL + '''IF x > 1 THEN
+    y <- 2
+ELSE IF x > 0 THEN
+    y <- (x + ENDTYPE)
+ENDIF
+''' + TAIL
+
+def test_only_statement_starts_open_and_close_blocks():
+    import ast
+    from lu_parser import split_statements
+    from lu_token import TokenBuffer
+
+    module = parse(tokenize_text(BLOCK_WORDS_MIDLINE), workers=1)
+    statements = [node for node in module.body if not isinstance(node, ast.ImportFrom)]
+    assert len(split_statements(TokenBuffer.from_tokens(tokenize_text(BLOCK_WORDS_MIDLINE)))) == len(statements)
+    serial, parallel = parse_both(BLOCK_WORDS_MIDLINE)
+    assert parallel == serial
@@ -0,0 +1,81 @@
+import contextlib
+import io
+import pytest
+from lu_compiler import compile_source
+from lu_optimizer import OPTIMIZE_LEVELS
+
+FOLDING = '''x <- 2 * 3 + 4
+y <- -(7 DIV 2) + 10 MOD 4
+
+OUTPUT x, y, 2 < 3, "ab" + "cd", 1.5 * 2
+'''
+
+DEAD_BRANCHES = '''IF 1 > 2 THEN
+    OUTPUT "no"
+ELSE
+    OUTPUT "yes"
+ENDIF
+WHILE FALSE
+    OUTPUT "never"
+ENDWHILE
+IF TRUE AND 3 = 3 THEN
+    OUTPUT "always"
+ENDIF
+'''
+
+# The first condition's bound is invariant; the second loop changes n, so its bound is not.
+LOOP_INVARIANTS = '''n <- 5
+limit <- 3
+i <- 0
+WHILE i < n * limit - 1
+    i <- i + 1
+ENDWHILE
+j <- 0
+WHILE j < n * 2
+    j <- j + 1
+    n <- n - 1
+ENDWHILE
+OUTPUT i, j, n
+'''
+
+MEMOIZED = '''FUNCTION Fib(n : INTEGER) RETURNS INTEGER
+    IF n < 2 THEN
+        RETURN n
+    ENDIF
+    RETURN Fib(n - 1) + Fib(n - 2)
+ENDFUNCTION
+OUTPUT Fib(20), Fib(1)
+'''
+
+def run(text: str, level: int) -> str:
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        exec(compile_source(text, optimize=level), {'__name__': '__main__'})
+    return output.getvalue()
+
+@pytest.mark.parametrize('text, expected', [
+    (FOLDING, '10 -1 True abcd 3.0\n'),
+    (DEAD_BRANCHES, 'yes\nalways\n'),
+    (LOOP_INVARIANTS, '14 4 1\n'),
+    (MEMOIZED, '6765 1\n'),
+])
+def test_every_level_prints_the_same(text, expected):
+    assert [run(text, level) for level in OPTIMIZE_LEVELS] == [expected] * len(OPTIMIZE_LEVELS)
+
+def test_constants_are_folded():
+    source = compile_source(FOLDING, mode='source', optimize=1)
+    assert 'x = 10\ny = -1\nprint(x, y, True, ' in source
+    assert '#NEWLINE#' not in source
+
+def test_dead_branches_are_removed():
+    assert compile_source(DEAD_BRANCHES, mode='source', optimize=1) == "print('yes')\nprint('always')\n"
+
+def test_only_invariant_loop_bounds_are_hoisted():
+    assert '_lu_invariant_' not in compile_source(LOOP_INVARIANTS, mode='source', optimize=1)
+    source = compile_source(LOOP_INVARIANTS, mode='source', optimize=2)
+    assert source.count('_lu_invariant_') == 2
+    assert 'while j < n * 2:' in source
+
+def test_pure_functions_are_memoized_only_at_level_3():
+    assert '@memoize' not in compile_source(MEMOIZED, mode='source', optimize=2)
+    assert '@memoize' in compile_source(MEMOIZED, mode='source', optimize=3)
@@ -0,0 +1,17 @@
+from lu_compiler import compile_source
+from lu_emit import emit_stream
+from lu_lexer import tokenize_file
+from lu_watch import WatchedFile
+
+# A leading blank line, and an IF whose body is only a blank line.
+TEXT = '\nOUTPUT 1\nIF 1 = 1 THEN\n\nENDIF\n'
+
+def test_blank_line_placeholders_are_not_emitted(tmp_path):
+    expected = 'print(1)\nif 1 == 1:\n    pass\n'
+    assert compile_source(TEXT, mode='source') == expected
+    source = tmp_path / 'blank.lu'
+    source.write_text(TEXT)
+    output = tmp_path / 'blank.py'
+    emit_stream(tokenize_file(str(source)), str(output))
+    assert output.read_text() == expected
+    assert WatchedFile(str(source), str(output)).update(TEXT) == expected
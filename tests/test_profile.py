@@ -0,0 +1,42 @@
+import tracemalloc
+from lu_profile import Profiler
+
+
+def test_memory_is_only_traced_on_request():
+    profiler = Profiler()
+    with profiler.phase('parse'):
+        assert not tracemalloc.is_tracing()
+    assert 'peak_bytes' not in profiler.phases['parse']
+    assert 'tracemalloc' not in profiler.table()
+
+    profiler = Profiler(trace_memory=True)
+    with profiler.phase('parse'):
+        assert tracemalloc.is_tracing()
+    assert 'peak_bytes' in profiler.phases['parse']
+    assert 'tracemalloc overhead' in profiler.table()
+
+def test_cprofile_dump_needs_a_profiled_phase(tmp_path):
+    profiler = Profiler(cprofile_phases=('parse',))
+    with profiler.phase('cache'):
+        pass
+    assert not profiler.dump_cprofile(str(tmp_path / 'cache.prof'))
+    assert not (tmp_path / 'cache.prof').exists()
+    with profiler.phase('parse'):
+        pass
+    assert profiler.dump_cprofile(str(tmp_path / 'parse.prof'))
+    assert (tmp_path / 'parse.prof').exists()
+
+def test_cprofile_bypasses_the_cache(tmp_path):
+    import os
+    import subprocess
+    import sys
+    import lu_compiler
+    (tmp_path / 'main.lu').write_text('OUTPUT 1\n')
+    command = [sys.executable, lu_compiler.__file__, 'main.lu', '--cache-dir', str(tmp_path / 'cache')]
+    environment = {**os.environ, 'LU_LOG_FILE': ''}
+    subprocess.run(command, cwd=tmp_path, env=environment, check=True, capture_output=True)
+    for stream in ([], ['--stream']):
+        subprocess.run(command + stream + ['--cprofile', 'parse.prof'], cwd=tmp_path, env=environment, check=True,
+                       capture_output=True)
+        assert (tmp_path / 'parse.prof').exists()
+        os.remove(tmp_path / 'parse.prof')
@@ -0,0 +1,27 @@
+import pytest
+from lu_compiler import compile_source
+from lu_errors import Diagnostics, SyntaxError, error_list
+
+STRAY_CLOSERS = [
+    'FUNCTION F() RETURNS INTEGER\n RETURN 1\n ENDIF\nENDFUNCTION\n',
+    'PROCEDURE P()\nENDIF\nENDPROCEDURE\n',
+    'PROCEDURE P()\nOUTPUT 1\nNEXT\nUNTIL\nENDPROCEDURE\n',
+]
+
+@pytest.mark.parametrize('text', STRAY_CLOSERS)
+def test_stray_block_closer_in_a_routine_is_an_error(text):
+    with pytest.raises(SyntaxError, match='inside'):
+        compile_source(text)
+
+@pytest.mark.parametrize('text', STRAY_CLOSERS)
+def test_stray_block_closer_in_a_routine_is_recovered_from(text):
+    with pytest.raises(Diagnostics) as raised:
+        compile_source(text + 'OUTPUT 2\nENDIF\n', recover=True)
+    errors = error_list(raised.value)
+    assert all(isinstance(error, SyntaxError) for error in errors)
+    assert len(errors) == text.count('ENDIF') + text.count('NEXT') + text.count('UNTIL') + 1
+
+def test_routine_compiles():
+    source = compile_source('FUNCTION Twice(n : INTEGER) RETURNS INTEGER\nRETURN n * 2\nENDFUNCTION\nOUTPUT Twice(4)\n',
+                            mode='source')
+    assert source == 'def Twice(n: int) -> int:\n    return n * 2\nprint(Twice(4))\n'
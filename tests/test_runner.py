@@ -0,0 +1,31 @@
+import pytest
+from lu_runner import Limits, RunJob, run_jobs
+
+pytest.importorskip('resource')  # the limits need a Unix system
+
+FOREVER = 'WHILE TRUE\n    x <- 1\nENDWHILE\n'
+
+def test_each_job_reports_how_it_ended():
+    jobs = [
+        RunJob('ok', 'INPUT name\nOUTPUT "hi", name\n', 'Ada\n'),
+        RunJob('error', 'x <- 1 / 0\n'),
+        RunJob('compile', 'OUTPUT (\n'),
+        RunJob('cpu', FOREVER),
+        RunJob('output', 'WHILE TRUE\n    OUTPUT "spam"\nENDWHILE\n'),
+        RunJob('memory', 'x <- "ab"\nWHILE TRUE\n    x <- x + x\nENDWHILE\n'),
+    ]
+    results = run_jobs(jobs, workers=2, limits=Limits(cpu=0.5, memory=256 * 1024 * 1024, output=1000))
+    assert [(result.name, result.status) for result in results] == [
+        ('ok', 'ok'), ('error', 'error'), ('compile', 'compile_error'), ('cpu', 'cpu_limit'),
+        ('output', 'output_limit'), ('memory', 'memory_limit')]
+    ok, error, compile_error, cpu, output, _ = results
+    assert (ok.stdout, ok.stderr) == ('hi Ada\n', '')
+    assert error.stderr.rstrip().endswith('ZeroDivisionError: division by zero')
+    assert 'bracket is never closed' in compile_error.stderr
+    assert 0.4 < cpu.cpu_seconds < 5
+    assert len(output.stdout) == 1000
+
+def test_wall_clock_timeout():
+    [result] = run_jobs([RunJob('sleepy', FOREVER)], workers=1, limits=Limits(cpu=None, wall=0.5))
+    assert result.status == 'timeout'
+    assert 0.4 < result.run_seconds < 5
@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+import pytest
+import lu_functions
+from lu_functions import (CLOSEFILE, EOF, OPENFILE, READFILE, ROUND, SUBSTRING, WRITEFILE, LuArray, RecordArray,
+                          reset_runtime)
+
+def array(data_type: str, bounds: list, backend: str) -> LuArray:
+    if backend == 'numpy':
+        pytest.importorskip('numpy')
+    return LuArray(data_type, bounds, backend)
+
+def test_runtime_library_does_not_need_the_compiler():
+    lu = os.path.dirname(lu_functions.__file__)
+    check = "import sys, lu_functions; assert 'lu_errors' not in sys.modules"
+    subprocess.run([sys.executable, '-c', check], cwd=lu, check=True)
+
+def test_runtime_errors_are_python_exceptions():
+    import builtins
+    with pytest.raises(builtins.ValueError):
+        SUBSTRING("abc", 0, 1)
+    with pytest.raises(builtins.TypeError):
+        RecordArray(int, [(1, 2)])
+    with pytest.raises(builtins.ValueError):
+        OPENFILE("data.txt", "EXECUTE")
+
+def test_substring_and_round():
+    assert SUBSTRING("pseudocode", 3, 4) == "eudo"
+    assert SUBSTRING("abc", 2, 10) == "bc"
+    assert (ROUND(2.5), ROUND(-2.5), ROUND(1.005, 1), ROUND(0.4)) == (3, -3, 1.0, 0)
+
+def test_files(tmp_path):
+    name = str(tmp_path / 'lines.txt')
+    try:
+        OPENFILE(name, 'WRITE')
+        WRITEFILE(name, 'first')
+        WRITEFILE(name, 2)
+        CLOSEFILE(name)
+        OPENFILE(name, 'read')
+        assert (READFILE(name), EOF(name), READFILE(name), EOF(name)) == ('first', False, '2', True)
+        with pytest.raises(EOFError):
+            READFILE(name)
+        with pytest.raises(RuntimeError):
+            WRITEFILE(name, 'x')
+        with pytest.raises(RuntimeError):
+            OPENFILE(name, 'READ')
+        CLOSEFILE(name)
+        with pytest.raises(RuntimeError):
+            CLOSEFILE(name)
+    finally:
+        reset_runtime()
+
+@pytest.mark.parametrize('backend', ['array', 'numpy'])
+def test_array_bounds(backend):
+    grid = array('INTEGER', [(1, 2), (0, 2)], backend)
+    grid[2, 0] = 7
+    assert (grid[2, 0], grid[1, 2], len(grid)) == (7, 0, 2)
+    with pytest.raises(IndexError):
+        grid[3, 0]
+    with pytest.raises(IndexError):
+        grid[1]
+
+@pytest.mark.parametrize('backend', ['array', 'numpy'])
+@pytest.mark.parametrize('data_type, good, stored, bad', [
+    ('INTEGER', True, 1, 2.5),
+    ('INTEGER', -4, -4, '3'),
+    ('REAL', 3, 3.0, '1.5'),
+    ('REAL', 0.25, 0.25, None),
+    ('BOOLEAN', True, True, 1),
+    ('BOOLEAN', False, False, 'TRUE'),
+])
+def test_typed_elements_are_checked_the_same_way_by_every_backend(backend, data_type, good, stored, bad):
+    values = array(data_type, [(1, 2)], backend)
+    values[1] = good
+    assert values[1] == stored
+    with pytest.raises(TypeError):
+        values[2] = bad
+    assert values[2] == lu_functions.ARRAY_DEFAULTS[data_type]
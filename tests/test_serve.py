@@ -0,0 +1,36 @@
+import io
+import json
+import time
+from lu_serve import Server, compile_request
+
+def test_compile_request_uses_the_request_options():
+    response = compile_request({'id': 7, 'source': 'x <- 2 * 3\nOUTPUT x', 'optimize': 1}, time.time())
+    assert (response['id'], response['ok'], response['code']) == (7, True, 'x = 6\nprint(x)\n')
+    assert response['diagnostics'] == []
+
+def test_compile_request_reports_compile_errors():
+    response = compile_request({'id': 1, 'source': 'OUTPUT 1 y', 'recover': True}, time.time())
+    assert not response['ok']
+    assert [(item['line'], item['column']) for item in response['diagnostics']] == [(1, 10)]
+
+def test_unknown_array_backend_fails_the_request():
+    response = compile_request({'id': 1, 'source': 'DECLARE A : ARRAY[1:3] OF INTEGER', 'array_backend': 'tape'},
+                               time.time())
+    assert not response['ok']
+    assert response['diagnostics'][0]['type'] == 'ValueError'
+
+def test_request_timeout():
+    source = 'x <- x + 1\n' * 100_000
+    response = compile_request({'id': 1, 'source': source, 'timeout': 0.01}, time.time())
+    assert not response['ok']
+    assert response['diagnostics'][0]['type'] == 'TimeoutError'
+    assert compile_request({'id': 2, 'source': 'OUTPUT 1', 'timeout': 0.01}, time.time())['ok']
+
+def test_server_answers_every_request():
+    requests = io.StringIO('{"id": 1, "source": "OUTPUT 1"}\nnot json\n\n{"id": 2, "source": "OUTPUT 1 y"}\n')
+    responses = io.StringIO()
+    Server(requests, responses, workers=1, defaults={'timeout': 30}).serve()
+    answers = {response['id']: response for response in map(json.loads, responses.getvalue().splitlines())}
+    assert answers[1]['code'] == 'print(1)\n'
+    assert not answers[2]['ok']
+    assert answers[None]['diagnostics'][0]['type'] == 'JSONDecodeError'
@@ -0,0 +1,30 @@
+import pytest
+from lu_compiler import compile_source
+from lu_errors import Diagnostics, SyntaxError, error_list
+
+def position(error) -> tuple:
+    return error.to_dict()['line'], error.to_dict()['column']
+
+@pytest.mark.parametrize('text, at', [
+    ('OUTPUT 1 y\n', (1, 10)),
+    ('x <- 3 OUTPUT x\n', (1, 8)),
+    ('c <- TRUE\nIF c THEN OUTPUT 5\nENDIF\n', (2, 11)),
+    ('IF TRUE THEN\n    OUTPUT 1\nELSE OUTPUT 2\nENDIF\n', (3, 6)),
+    ('FOR i <- 1 TO 2\n    OUTPUT i\nNEXT i j\n', (3, 8)),
+    ('WHILE FALSE\n    x <- 1 2\nENDWHILE\n', (2, 12)),
+    ('PROCEDURE P()\n    OUTPUT 1 2\nENDPROCEDURE\n', (2, 14)),
+    ('TYPE S\n    DECLARE a : INTEGER b\nENDTYPE\n', (2, 25)),
+])
+def test_statement_must_end_at_the_line_end(text, at):
+    with pytest.raises(SyntaxError) as raised:
+        compile_source(text)
+    assert position(raised.value) == at
+
+    with pytest.raises(Diagnostics) as raised:
+        compile_source(text, recover=True)
+    assert [position(item) for item in error_list(raised.value)] == [at]
+
+def test_statements_may_end_at_a_semicolon_or_the_file_end():
+    namespace = {'__name__': '__main__'}
+    exec(compile_source('x <- 1; y <- 2\nz <- x + y'), namespace)
+    assert namespace['z'] == 3
@@ -0,0 +1,47 @@
+import pytest
+from lu_compiler import unparse
+from lu_lexer import Lexer, tokenize_file, tokenize_text
+from lu_parser import parse
+from lu_token import TokenWindow
+
+# Strings, multi-character operators, reals, comments and a non-ASCII arrow,
+# so some token straddles a chunk boundary at every chunk size.
+SOURCE = '''x ← 3.25 // start
+name <- "a string; with // no comment"
+IF x >= 3 AND x <> 4 THEN
+    OUTPUT name, x ** 2, 10 DIV 3
+ENDIF
+y <- x << 1; z <- y'''
+
+def chunked(text: str, size: int):
+    return (text[i:i + size] for i in range(0, len(text), size))
+
+@pytest.mark.parametrize('size', [1, 2, 3, 5, 7, 64])
+def test_chunked_tokens_match_the_whole_text(size):
+    assert list(Lexer().tokenize_chunks(chunked(SOURCE, size))) == list(tokenize_text(SOURCE))
+
+@pytest.mark.parametrize('size', [1, 2, 3, 16])
+def test_file_tokens_match_the_whole_text(tmp_path, size):
+    path = tmp_path / 'source.lu'
+    path.write_text(SOURCE, encoding='utf-8')  # '←' is three bytes, split by the small chunk sizes
+    assert list(tokenize_file(str(path), chunk_size=size)) == list(tokenize_text(SOURCE))
+
+def test_empty_file_has_only_eof(tmp_path):
+    path = tmp_path / 'empty.lu'
+    path.write_text('')
+    assert [token.type for token in tokenize_file(str(path))] == ['EOF']
+
+def test_window_releases_tokens_behind_the_parser():
+    window = TokenWindow(iter(tokenize_text(SOURCE)), behind=2)
+    assert window[10].value == window.value(10)
+    window.release(10)
+    assert window[8].value == tokenize_text(SOURCE).value(8)
+    with pytest.raises(IndexError):
+        window[7]
+    with pytest.raises(IndexError):
+        window[10_000]
+
+def test_parsing_a_token_stream_matches_parsing_the_text(tmp_path):
+    path = tmp_path / 'source.lu'
+    path.write_text(SOURCE, encoding='utf-8')
+    assert unparse(parse(tokenize_file(str(path), chunk_size=4))) == unparse(parse(tokenize_text(SOURCE)))
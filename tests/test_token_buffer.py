@@ -0,0 +1,35 @@
+from lu_lexer import tokenize_text
+from lu_token import EOF, IDENTIFIER, KIND_NAMES, OPERATOR, Token, TokenBuffer
+
+SOURCE = 'total <- 0\nFOR i <- 1 TO 3\n    total <- total + i\nNEXT i\nOUTPUT "sum", total\n'
+
+def test_tokens_are_small_int_kinds_and_offsets_into_the_source():
+    tokens = tokenize_text(SOURCE)
+    assert tokens.text is SOURCE
+    assert tokens.kinds.typecode == 'B' and tokens.starts.typecode == 'i'
+    assert (tokens.kind(0), tokens.value(0), tokens.kind(1), tokens.value(1)) == (IDENTIFIER, 'total', OPERATOR, '<-')
+    assert tokens.kind(len(tokens) - 1) == EOF
+    assert len(tokens.lines) == 0  # positions come from the line index instead
+
+def test_token_view():
+    tokens = tokenize_text(SOURCE)
+    assert tokens[0] == Token('IDENTIFIER', 'total', 1, 1)
+    assert tokens[-2] == Token('WHITESPACE', '\n', 5, 20)
+    assert tokens[4:6] == [Token('KEYWORD', 'FOR', 2, 1), Token('IDENTIFIER', 'i', 2, 5)]
+    assert [token.value for token in tokens] == [tokens.value(i) for i in range(len(tokens))]
+
+def test_buffer_from_tokens_keeps_their_positions():
+    tokens = list(tokenize_text(SOURCE))
+    buffer = TokenBuffer.from_tokens(tokens)
+    assert buffer.line_index is None
+    assert list(buffer) == tokens
+    assert [KIND_NAMES[kind] for kind in buffer.kinds] == [token.type for token in tokens]
+
+def test_chunk_ends_with_eof_and_keeps_positions():
+    for tokens in (tokenize_text(SOURCE), TokenBuffer.from_tokens(tokenize_text(SOURCE))):
+        chunk = tokens.chunk(4, 10)
+        assert list(chunk)[:-1] == tokens[4:10]
+        assert chunk.kind(len(chunk) - 1) == EOF
+        assert len(chunk.text) < len(SOURCE)
+        last = tokens.chunk(10, len(tokens) - 1)  # runs to the end of the source
+        assert list(last) == tokens[10:]
@@ -0,0 +1,18 @@
+import pytest
+from lu_compiler import compile_source
+from lu_errors import Diagnostics, SyntaxError, error_list
+
+def test_record_body_skips_blank_and_comment_lines():
+    text = 'TYPE S\n\n    DECLARE a : INTEGER\n    // note\n    DECLARE b : STRING\nENDTYPE\n'
+    assert 'a: int = 0\n    b: str = ' in compile_source(text, mode='source')
+
+def test_record_body_lines_must_be_declare():
+    text = 'TYPE S\n    DECLARE a : INTEGER\n    b : STRING\n    OUTPUT 2\nENDTYPE\nOUTPUT 1\n'
+    with pytest.raises(SyntaxError) as raised:
+        compile_source(text)
+    assert (raised.value.to_dict()['line'], raised.value.to_dict()['column']) == (3, 5)
+    assert raised.value.to_dict()['expected'] == 'DECLARE'
+
+    with pytest.raises(Diagnostics) as raised:
+        compile_source(text, recover=True)
+    assert [(item.to_dict()['line'], item.to_dict()['column']) for item in error_list(raised.value)] == [(3, 5), (4, 5)]